@@ -0,0 +1,245 @@
+"""
+Espelho analítico de products e orders num DuckDB local (opcional).
+
+refresh_analytics_mirror() copia para ANALYTICS_DB_PATH só as colunas usadas
+nas agregações, lendo do banco as linhas com coalesce(updated_at, created_at)
+depois da marca d'água da última cópia. As linhas copiadas substituem as de
+mesmo anymarket_id no espelho. Pedidos arquivados (app.archive) continuam no
+espelho.
+
+Os endpoints /analytics/* (app.analytics_routes) consultam o espelho em modo
+somente leitura; enquanto o daily_update atualiza o arquivo, eles respondem 503.
+"""
+
+from datetime import datetime, timedelta
+import logging
+import os
+from pathlib import Path
+import time
+
+from sqlalchemy import func, select
+
+from . import models
+from .columnar import require_pyarrow, rows_to_batch, select_arrow_schema
+from .order_state import order_changed_at, order_column, with_order_state
+
+try:
+    import duckdb
+except ImportError:  # duckdb é opcional
+    duckdb = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow é opcional
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DB_PATH = os.getenv("ANALYTICS_DB_PATH", "analytics/anymarket.duckdb")
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "5000"))
+# Relê um intervalo antes da marca d'água: transações longas podem gravar
+# updated_at anterior ao maior valor já copiado. A cópia é idempotente.
+ANALYTICS_WATERMARK_OVERLAP_SECONDS = int(os.getenv("ANALYTICS_WATERMARK_OVERLAP_SECONDS", "300"))
+ANALYTICS_LOCK_RETRIES = int(os.getenv("ANALYTICS_LOCK_RETRIES", "20"))
+
+MIRRORED_TABLES = {
+    "products": (models.Product, (
+        "anymarket_id", "title", "brand_id", "brand_name", "category_id", "category_name",
+        "category_path", "sku_price", "total_skus", "total_stock", "has_stock",
+        "created_at", "updated_at",
+    )),
+    "orders": (models.Order, (
+        "anymarket_id", "marketplace", "status", "created_at_anymarket",
+        "discount", "freight", "gross", "total", "created_at", "updated_at",
+    )),
+}
+
+STATE_TABLE = "_mirror_state"
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """Espelho ausente ou bloqueado por uma atualização em andamento."""
+
+
+def require_duckdb():
+    if duckdb is None:
+        raise RuntimeError("duckdb não está instalado (pip install duckdb)")
+
+
+def _source(model, columns):
+    """(colunas, expressão de última alteração, função que completa o FROM) da tabela de origem."""
+    if model is models.Order:
+        # status vem de order_states
+        return [order_column(c) for c in columns], order_changed_at(), with_order_state
+    changed_at = func.coalesce(model.updated_at, model.created_at)
+    return [getattr(model, c) for c in columns], changed_at, lambda query: query
+
+
+def _ensure_state_table(conn):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} ("
+        "entity VARCHAR PRIMARY KEY, watermark VARCHAR, rows BIGINT, refreshed_at VARCHAR)"
+    )
+
+
+def _ensure_mirror_table(conn, name, schema):
+    conn.register("empty_batch", pa.Table.from_batches([], schema=schema))
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM empty_batch")
+    conn.unregister("empty_batch")
+
+
+def _read_watermark(conn, name):
+    row = conn.execute(f"SELECT watermark FROM {STATE_TABLE} WHERE entity = ?", [name]).fetchone()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+
+def _save_state(conn, name, watermark):
+    rows = conn.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
+    conn.execute(
+        f"INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?, ?, ?)",
+        [name, watermark.isoformat() if watermark else None, rows, datetime.now().isoformat()],
+    )
+    return rows
+
+
+def _refresh_table(conn, db, name, model, columns):
+    source_columns, changed_at, with_from = _source(model, columns)
+    schema = select_arrow_schema(source_columns)
+    _ensure_mirror_table(conn, name, schema)
+
+    since = _read_watermark(conn, name)
+    latest = with_from(db.query(func.max(changed_at))).scalar()
+    if latest is None or (since is not None and latest <= since):
+        logger.info(f"Espelho analítico de {name}: sem alterações")
+        return 0
+
+    conditions = []
+    if since is not None:
+        conditions.append(changed_at > since - timedelta(seconds=ANALYTICS_WATERMARK_OVERLAP_SECONDS))
+    stmt = (
+        with_from(select(*source_columns))
+        .where(*conditions)
+        .order_by(model.id)
+        .execution_options(yield_per=ANALYTICS_BATCH_SIZE)
+    )
+
+    copied = 0
+    for rows in db.execute(stmt).partitions():
+        conn.register("batch", rows_to_batch(rows, schema))
+        conn.execute(f"DELETE FROM {name} WHERE anymarket_id IN (SELECT anymarket_id FROM batch)")
+        conn.execute(f"INSERT INTO {name} SELECT * FROM batch")
+        conn.unregister("batch")
+        copied += len(rows)
+
+    total = _save_state(conn, name, latest)
+    logger.info(f"Espelho analítico de {name}: {copied} linhas copiadas, {total} no espelho")
+    return copied
+
+
+def _connect_for_write(path):
+    # Leituras da API seguram o arquivo por uma consulta: espera elas terminarem
+    for attempt in range(ANALYTICS_LOCK_RETRIES):
+        try:
+            return duckdb.connect(str(path))
+        except duckdb.IOException:
+            if attempt == ANALYTICS_LOCK_RETRIES - 1:
+                raise
+            time.sleep(0.5)
+
+
+def refresh_analytics_mirror(db, path=ANALYTICS_DB_PATH):
+    """Atualiza o espelho DuckDB a partir da marca d'água de cada tabela. Retorna {tabela: linhas copiadas}."""
+    require_duckdb()
+    require_pyarrow()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    summary = {}
+    conn = _connect_for_write(path)
+    try:
+        _ensure_state_table(conn)
+        for name, (model, columns) in MIRRORED_TABLES.items():
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                summary[name] = _refresh_table(conn, db, name, model, columns)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    return summary
+
+
+class AnalyticsMirror:
+    """Consultas somente leitura no espelho DuckDB."""
+
+    def __init__(self, path=ANALYTICS_DB_PATH):
+        self.path = Path(path)
+
+    def available(self):
+        return duckdb is not None and self.path.exists()
+
+    def _connect(self):
+        if duckdb is None:
+            raise AnalyticsUnavailable("duckdb não está instalado")
+        if not self.path.exists():
+            raise AnalyticsUnavailable("Espelho analítico ainda não foi gerado (daily_update --analytics)")
+        try:
+            return duckdb.connect(str(self.path), read_only=True)
+        except duckdb.Error as e:
+            raise AnalyticsUnavailable(f"Espelho analítico em atualização: {e}")
+
+    def query(self, sql, params=()):
+        """Executa a consulta e devolve as linhas como dicts."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, list(params))
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def state(self):
+        return {
+            row["entity"]: {
+                "watermark": row["watermark"],
+                "rows": row["rows"],
+                "refreshed_at": row["refreshed_at"],
+            }
+            for row in self.query(f"SELECT * FROM {STATE_TABLE} ORDER BY entity")
+        }
+
+
+analytics_mirror = AnalyticsMirror()
+
+
+def top_products_by(column, limit, mirror=analytics_mirror):
+    """Produtos por valor de uma coluna de products (brand_name, category_name...), do maior para o menor."""
+    return mirror.query(
+        f"SELECT {column}, count(*) AS count, sum(total_stock) AS total_stock "
+        f"FROM products WHERE {column} IS NOT NULL AND {column} <> '' "
+        f"GROUP BY {column} ORDER BY count DESC, {column} LIMIT ?",
+        [limit],
+    )
+
+
+def revenue_by_marketplace(date_from=None, date_to=None, status=None, mirror=analytics_mirror):
+    """Pedidos, receita bruta, total, desconto e frete por marketplace."""
+    conditions, params = ["true"], []
+    if date_from is not None:
+        conditions.append("created_at_anymarket >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("created_at_anymarket < ?")
+        params.append(date_to)
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    return mirror.query(
+        "SELECT marketplace, count(*) AS orders_count, "
+        "coalesce(sum(gross), 0) AS gross, coalesce(sum(total), 0) AS total, "
+        "coalesce(sum(discount), 0) AS discount, coalesce(sum(freight), 0) AS freight "
+        f"FROM orders WHERE {' AND '.join(conditions)} "
+        "GROUP BY marketplace ORDER BY total DESC",
+        params,
+    )
@@ -0,0 +1,59 @@
+"""
+Endpoints analíticos sobre o espelho DuckDB (app.analytics).
+
+Agrupamentos que varrem products/orders inteiras rodam no espelho colunar em
+vez do Postgres. O espelho é atualizado pelo daily_update --analytics, que
+incrementa a versão "analytics" do cache de respostas.
+"""
+
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from .analytics import AnalyticsUnavailable, analytics_mirror, revenue_by_marketplace, top_products_by
+from .cache import cached
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+def _mirror_query(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except AnalyticsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/top-brands")
+@cached("analytics")
+def get_top_brands(limit: int = Query(10, ge=1, le=1000)):
+    """Marcas com mais produtos (e estoque somado)"""
+    return {"top_brands": _mirror_query(top_products_by, "brand_name", limit)}
+
+
+@router.get("/top-categories")
+@cached("analytics")
+def get_top_categories(limit: int = Query(10, ge=1, le=1000)):
+    """Categorias com mais produtos (e estoque somado)"""
+    return {"top_categories": _mirror_query(top_products_by, "category_name", limit)}
+
+
+@router.get("/revenue-by-marketplace")
+@cached("analytics")
+def get_revenue_by_marketplace(
+    date_from: Optional[date] = Query(None, description="Dia inicial (created_at_anymarket)"),
+    date_to: Optional[date] = Query(None, description="Dia final (exclusivo)"),
+    status: Optional[str] = Query(None, description="Status do pedido"),
+):
+    """Pedidos, receita bruta, total, desconto e frete por marketplace"""
+    rows = _mirror_query(revenue_by_marketplace, date_from=date_from, date_to=date_to, status=status)
+    return {
+        "by_marketplace": rows,
+        "period": {"date_from": date_from, "date_to": date_to},
+    }
+
+
+@router.get("/status")
+def get_analytics_status():
+    """Marca d'água e número de linhas de cada tabela do espelho"""
+    return {"path": str(analytics_mirror.path), "tables": _mirror_query(analytics_mirror.state)}
@@ -5,12 +5,18 @@ from dotenv import load_dotenv
 from typing import List, Dict, Optional
 import logging
 
+from .metrics import api_latency, api_rate_limited, api_responses
+from .sync_logging import SAMPLE
+from .tracing import span
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 class AnymarketClient:
-    def __init__(self):
+    def __init__(self, recorder=None):
+        # recorder: SyncRunRecorder do daily_update (chamadas e bytes por entidade em sync_runs)
+        self.recorder = recorder
         self.base_url = os.getenv("ANYMARKET_API_BASE_URL")
         self.gumgatoken = os.getenv("ANYMARKET_GUMGATOKEN")
         
@@ -34,11 +40,30 @@ class AnymarketClient:
         
         if time_since_last_request < self.request_interval:
             sleep_time = self.request_interval - time_since_last_request
-            logger.info(f"Rate limiting: aguardando {sleep_time:.2f} segundos")
+            logger.info("Rate limiting: aguardando %.2f segundos", sleep_time, extra=SAMPLE)
             time.sleep(sleep_time)
         
         self.last_request_time = time.time()
     
+    def _get(self, endpoint, url, **kwargs):
+        """GET autenticado, registrando latência e status nas métricas e no trace (endpoint: rótulo da rota)"""
+        start = time.perf_counter()
+        with span(f"GET {endpoint}", "fetch", params=kwargs.get("params")) as request_span:
+            try:
+                response = requests.get(url, headers=self.headers, **kwargs)
+            except requests.exceptions.RequestException:
+                api_responses.inc(endpoint=endpoint, status="error")
+                raise
+            finally:
+                api_latency.observe(time.perf_counter() - start, endpoint=endpoint)
+            request_span.set(status=response.status_code)
+        api_responses.inc(endpoint=endpoint, status=response.status_code)
+        if self.recorder is not None:
+            self.recorder.api_call(endpoint, response.status_code, len(response.content))
+        if response.status_code == 429:
+            api_rate_limited.inc(endpoint=endpoint)
+        return response
+
     def get_products(self, limit: int = 50, offset: int = 0) -> Dict:
         """Busca produtos da API Anymarket"""
         try:
@@ -51,12 +76,12 @@ class AnymarketClient:
             }
             
             # CORREÇÃO: Token vai no header
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get("products", url, params=params)
             
             if response.status_code == 429:
                 logger.warning("Rate limit atingido. Aguardando 60 segundos...")
                 time.sleep(60)
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self._get("products", url, params=params)
             
             response.raise_for_status()
             return response.json()
@@ -77,12 +102,12 @@ class AnymarketClient:
             }
             
             # CORREÇÃO: Token vai no header
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get("orders", url, params=params)
             
             if response.status_code == 429:
                 logger.warning("Rate limit atingido. Aguardando 60 segundos...")
                 time.sleep(60)
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self._get("orders", url, params=params)
             
             response.raise_for_status()
             return response.json()
@@ -99,12 +124,12 @@ class AnymarketClient:
             url = f"{self.base_url}/products/{product_id}"
             
             # CORREÇÃO: Token vai no header
-            response = requests.get(url, headers=self.headers)
+            response = self._get("products/{id}", url)
             
             if response.status_code == 429:
                 logger.warning("Rate limit atingido. Aguardando 60 segundos...")
                 time.sleep(60)
-                response = requests.get(url, headers=self.headers)
+                response = self._get("products/{id}", url)
             
             response.raise_for_status()
             return response.json()
@@ -124,12 +149,12 @@ class AnymarketClient:
                 "offset": offset
             }
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get("stocks", url, params=params)
             
             if response.status_code == 429:
                 logger.warning("Rate limit atingido. Aguardando 60 segundos...")
                 time.sleep(60)
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self._get("stocks", url, params=params)
             
             response.raise_for_status()
             return response.json()
@@ -149,12 +174,12 @@ class AnymarketClient:
                 "offset": offset
             }
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get("skus/marketplaces", url, params=params)
             
             if response.status_code == 429:
                 logger.warning("Rate limit atingido. Aguardando 60 segundos...")
                 time.sleep(60)
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self._get("skus/marketplaces", url, params=params)
             
             if response.status_code == 400:
                 logger.warning(f"Bad request para partnerId: {partner_id}")
@@ -178,12 +203,12 @@ class AnymarketClient:
                 "offset": offset
             }
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get("transmissions", url, params=params)
             
             if response.status_code == 429:
                 logger.warning("Rate limit atingido. Aguardando 60 segundos...")
                 time.sleep(60)
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self._get("transmissions", url, params=params)
             
             response.raise_for_status()
             return response.json()
@@ -0,0 +1,274 @@
+"""
+Arquivo de pedidos frios em Parquet, um arquivo por mês.
+
+archive_cold_orders() move os pedidos com created_at_anymarket anterior à
+janela quente (ORDER_HOT_MONTHS meses) para
+ORDER_ARCHIVE_DIR/month=AAAA-MM/orders.parquet, com as colunas JSON como
+texto e os campos de order_states, e remove essas linhas do banco (DROP da
+partição do mês quando orders é particionada). Os agregados
+order_daily_rollup e sku_sales_daily não são alterados.
+
+OrderArchive lê esses arquivos para os endpoints de pedidos quando o período
+consultado passa da janela quente.
+"""
+
+from datetime import datetime
+import logging
+import os
+from pathlib import Path
+
+from sqlalchemy import delete, func, text
+
+from . import models
+from .children import ORDER_CHILD_MODELS
+from .columnar import ParquetFileWriter, pa, pq, require_pyarrow, rows_to_batch, select_arrow_schema
+from .order_state import order_select_columns, select_order_rows
+from .partitions import (
+    month_start, next_month, previous_month, partition_name, order_partitions, list_order_partitions,
+    forget_order_keys, PARENT_TABLE,
+)
+from .serialization import json_select_columns, mapping_to_json
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow é opcional
+    pc = None
+    ds = None
+
+logger = logging.getLogger(__name__)
+
+ORDER_ARCHIVE_DIR = os.getenv("ORDER_ARCHIVE_DIR", "archive/orders")
+ORDER_HOT_MONTHS = int(os.getenv("ORDER_HOT_MONTHS", "12"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "2000"))
+
+ARCHIVE_FILE_NAME = "orders.parquet"
+
+
+def _month_dir(base, month):
+    return Path(base) / f"month={month:%Y-%m}"
+
+
+def hot_window_start(hot_months=ORDER_HOT_MONTHS, now=None):
+    """Primeiro mês que continua no banco."""
+    month = month_start(now or datetime.now())
+    for _ in range(hot_months):
+        month = previous_month(month)
+    return month
+
+
+def _naive(value):
+    # created_at_anymarket é gravado sem fuso
+    return value.replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+
+class OrderArchive:
+    """Leitura dos pedidos arquivados em Parquet."""
+
+    def __init__(self, base_dir=ORDER_ARCHIVE_DIR):
+        self.base_dir = Path(base_dir)
+
+    def months(self):
+        """Meses arquivados, em ordem."""
+        if not self.base_dir.is_dir():
+            return []
+        months = []
+        for path in self.base_dir.glob(f"month=*/{ARCHIVE_FILE_NAME}"):
+            try:
+                months.append(datetime.strptime(path.parent.name[len("month="):], "%Y-%m").date())
+            except ValueError:
+                continue
+        return sorted(months)
+
+    def available(self):
+        return pa is not None and bool(self.months())
+
+    def boundary(self):
+        """Primeiro mês depois do último mês arquivado; None sem arquivo."""
+        months = self.months()
+        return next_month(months[-1]) if months else None
+
+    def reaches(self, date_from):
+        """Se um período que começa em date_from (None = sem início) alcança o arquivo."""
+        if not self.available():
+            return False
+        return date_from is None or _naive(date_from) < datetime.combine(self.boundary(), datetime.min.time())
+
+    def _dataset(self):
+        return ds.dataset(str(self.base_dir), format="parquet", partitioning="hive")
+
+    def _filter(self, marketplace=None, status=None, date_from=None, date_to=None, anymarket_id=None):
+        expression = None
+
+        def add(condition):
+            nonlocal expression
+            expression = condition if expression is None else expression & condition
+
+        if marketplace:
+            add(ds.field("marketplace") == marketplace)
+        if status:
+            add(ds.field("status") == status)
+        if date_from is not None:
+            add(ds.field("month") >= f"{date_from:%Y-%m}")
+            add(ds.field("created_at_anymarket") >= pa.scalar(_naive(date_from), pa.timestamp("us")))
+        if date_to is not None:
+            add(ds.field("month") <= f"{date_to:%Y-%m}")
+            add(ds.field("created_at_anymarket") < pa.scalar(_naive(date_to), pa.timestamp("us")))
+        if anymarket_id is not None:
+            add(ds.field("anymarket_id") == anymarket_id)
+        return expression
+
+    def list_orders(self, columns, marketplace=None, status=None, date_from=None, date_to=None,
+                    offset=0, limit=100):
+        """Pedidos arquivados do mais recente ao mais antigo, só com as colunas pedidas."""
+        if not self.available():
+            return []
+        table = self._dataset().to_table(
+            columns=list(columns),
+            filter=self._filter(marketplace, status, date_from, date_to),
+        )
+        table = table.sort_by([("created_at_anymarket", "descending"), ("id", "descending")])
+        return table.slice(offset, limit).to_pylist()
+
+    def get_order(self, anymarket_id):
+        """Pedido arquivado completo em JSON, ou None."""
+        if not self.available():
+            return None
+        table = self._dataset().to_table(filter=self._filter(anymarket_id=anymarket_id))
+        if not table.num_rows:
+            return None
+        row = table.select([c for c in table.column_names if c != "month"]).slice(0, 1).to_pylist()[0]
+        _, raw_keys = json_select_columns(models.Order)
+        return mapping_to_json(row, raw_keys)
+
+
+order_archive = OrderArchive()
+
+
+def _archive_month(db, month, base_dir):
+    """
+    Grava os pedidos de um mês num Parquet temporário, juntando com o que já estava
+    arquivado. Retorna (IDs arquivados, writer); o arquivo só entra no lugar com
+    writer.publish(), depois que o DELETE dos pedidos foi commitado.
+
+    Os pedidos lidos ficam travados até o commit (a partição inteira, com orders
+    particionada; senão as linhas, com FOR UPDATE), para uma sincronização
+    concorrente não alterar um pedido entre a leitura e o DELETE.
+    """
+    Order = models.Order
+    columns, _ = order_select_columns()
+    schema = select_arrow_schema(columns)
+    path = _month_dir(base_dir, month) / ARCHIVE_FILE_NAME
+    in_month = (
+        Order.created_at_anymarket >= month,
+        Order.created_at_anymarket < next_month(month),
+    )
+
+    partition_locked = _lock_month_partition(db, month)
+    if not db.query(func.count(Order.id)).filter(*in_month).scalar():
+        return [], None
+
+    stmt = select_order_rows(*columns).where(*in_month).order_by(Order.id)
+    if not partition_locked:
+        stmt = stmt.with_for_update(of=Order)
+    stmt = stmt.execution_options(yield_per=ARCHIVE_BATCH_SIZE)
+
+    archived_ids = []
+    writer = ParquetFileWriter(path, schema)
+    try:
+        for rows in db.execute(stmt).partitions():
+            writer.write_batch(rows_to_batch(rows, schema))
+            archived_ids.extend(row.anymarket_id for row in rows)
+
+        # Pedidos que chegaram atrasados para um mês já arquivado: mantém os antigos
+        if path.exists():
+            previous = pq.read_table(str(path), schema=schema)
+            if archived_ids:
+                keep = pc.invert(pc.is_in(previous["anymarket_id"], value_set=pa.array(archived_ids)))
+                previous = previous.filter(keep)
+            writer.write_table(previous)
+        writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+    return archived_ids, writer
+
+
+def _lock_month_partition(db, month):
+    """Trava contra escrita a partição do mês, se existir (até o commit). Retorna se travou."""
+    name = partition_name(month)
+    if not (order_partitions.enabled(db) and name in list_order_partitions(db)):
+        return False
+    db.execute(text(f"LOCK TABLE {name} IN SHARE ROW EXCLUSIVE MODE"))
+    return True
+
+
+def _drop_month_from_db(db, month, archived_ids):
+    """Remove do banco só os pedidos gravados no Parquet (archived_ids) e as linhas ligadas a eles."""
+    Order = models.Order
+    for model in (*ORDER_CHILD_MODELS, models.OrderState):
+        for start in range(0, len(archived_ids), ARCHIVE_BATCH_SIZE):
+            chunk = archived_ids[start:start + ARCHIVE_BATCH_SIZE]
+            db.execute(delete(model).where(model.order_anymarket_id.in_(chunk)))
+
+    name = partition_name(month)
+    if order_partitions.enabled(db) and name in list_order_partitions(db):
+        rows = db.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        if rows == len(archived_ids):
+            # Partição travada e só com os pedidos arquivados: DETACH + DROP em vez de DELETE linha a linha
+            db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            forget_order_keys(db, name)
+            db.execute(text(f"DROP TABLE {name}"))
+            order_partitions.reset()
+            return
+        logger.warning(f"Partição {name} tem {rows} pedidos e {len(archived_ids)} foram arquivados; removendo por ID")
+
+    for start in range(0, len(archived_ids), ARCHIVE_BATCH_SIZE):
+        chunk = archived_ids[start:start + ARCHIVE_BATCH_SIZE]
+        db.execute(delete(Order).where(Order.anymarket_id.in_(chunk)))
+
+
+def archive_cold_orders(db, hot_months=ORDER_HOT_MONTHS, base_dir=ORDER_ARCHIVE_DIR):
+    """
+    Arquiva em Parquet os meses anteriores à janela quente e remove esses
+    pedidos do banco, um mês por transação. Retorna {mês: pedidos arquivados}.
+
+    O Parquet de cada mês só substitui o anterior depois do commit do DELETE:
+    se o DELETE ou o commit falhar, o arquivo antigo continua valendo e os
+    pedidos continuam só no banco (a leitura nunca os vê duas vezes).
+    """
+    require_pyarrow()
+    Order = models.Order
+    cutoff = hot_window_start(hot_months)
+
+    oldest = db.query(Order.created_at_anymarket).filter(
+        Order.created_at_anymarket.isnot(None)
+    ).order_by(Order.created_at_anymarket).limit(1).scalar()
+    if oldest is None or month_start(oldest) >= cutoff:
+        logger.info("Nenhum pedido fora da janela quente para arquivar")
+        return {}
+
+    archived = {}
+    month = month_start(oldest)
+    while month < cutoff:
+        ids, writer = _archive_month(db, month, base_dir)
+        if ids:
+            try:
+                _drop_month_from_db(db, month, ids)
+                db.commit()
+            except BaseException:
+                db.rollback()
+                writer.abort()
+                raise
+            try:
+                writer.publish()
+            except OSError:
+                # Pedidos já removidos do banco: o temporário é a única cópia
+                logger.critical(f"Pedidos de {month:%Y-%m} removidos do banco, mas o Parquet ficou em {writer.tmp_path}")
+                raise
+            archived[f"{month:%Y-%m}"] = len(ids)
+            logger.info(f"Pedidos de {month:%Y-%m} arquivados: {len(ids)}")
+        month = next_month(month)
+
+    return archived
@@ -0,0 +1,173 @@
+"""
+Versões async def dos endpoints de consulta de produtos.
+
+Usam o engine assíncrono (psycopg async) de app.database e não ocupam o
+threadpool do Starlette, permitindo muito mais requisições simultâneas
+do que os endpoints síncronos equivalentes em app.main.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .cache import cached
+from .database import get_async_db
+from .filters import (
+    product_search_conditions, products_with_sku, products_with_characteristic,
+    products_with_brand, products_with_category,
+)
+from .serialization import json_select_columns, rows_to_json
+
+router = APIRouter(prefix="/async", tags=["async"])
+
+
+async def _list_products(db: AsyncSession, *conditions, skip: int = 0, limit: int = 100):
+    """Executa um SELECT de produtos com os filtros informados e paginação, já em JSON"""
+    columns, raw_keys = json_select_columns(models.Product)
+    stmt = select(*columns).where(*conditions).offset(skip).limit(limit)
+    result = await db.execute(stmt)
+    return rows_to_json(result.all(), raw_keys)
+
+
+@router.get("/products/sku/{sku_partner_id}")
+@cached("products")
+async def get_products_by_sku_partner_id(sku_partner_id: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos que têm um SKU com o Partner ID (async)"""
+    return await _list_products(db, products_with_sku(models.ProductSku.partner_id == sku_partner_id), skip=skip, limit=limit)
+
+@router.get("/products/ean/{ean_code}")
+@cached("products")
+async def get_products_by_ean(ean_code: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos que têm um SKU com o código EAN (async)"""
+    return await _list_products(db, products_with_sku(models.ProductSku.ean == ean_code), skip=skip, limit=limit)
+
+@router.get("/products/price-range")
+@cached("products")
+async def get_products_by_price_range(
+    min_price: float = Query(..., description="Preço mínimo"),
+    max_price: float = Query(..., description="Preço máximo"),
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Retorna produtos em uma faixa de preços (async)"""
+    return await _list_products(db, models.Product.sku_price.between(min_price, max_price), skip=skip, limit=limit)
+
+@router.get("/products/with-stock")
+@cached("products")
+async def get_products_with_stock(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos com estoque disponível (async)"""
+    return await _list_products(db, models.Product.has_stock == True, skip=skip, limit=limit)
+
+@router.get("/products/with-images")
+@cached("products")
+async def get_products_with_images(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos que têm imagens (async)"""
+    return await _list_products(db, models.Product.has_main_image == True, skip=skip, limit=limit)
+
+@router.get("/products/image-status/{status}")
+@cached("products")
+async def get_products_by_image_status(status: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos por status da imagem (async)"""
+    return await _list_products(db, models.Product.image_status == status, skip=skip, limit=limit)
+
+@router.get("/products/characteristic/{name}/{value}")
+@cached("products")
+async def get_products_by_characteristic(name: str, value: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos por característica específica (async)"""
+    return await _list_products(
+        db,
+        products_with_characteristic(
+            models.ProductCharacteristic.name.ilike(f"%{name}%"),
+            models.ProductCharacteristic.value.ilike(f"%{value}%"),
+        ),
+        skip=skip,
+        limit=limit,
+    )
+
+@router.get("/products/stock-location/{stock_local_id}")
+@cached("products")
+async def get_products_by_stock_location(stock_local_id: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos de um local de estoque específico (async)"""
+    return await _list_products(db, models.Product.sku_stock_local_id == stock_local_id, skip=skip, limit=limit)
+
+@router.get("/products/brand/{brand_name}")
+@cached("products")
+async def get_products_by_brand_name(brand_name: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos por nome da marca (async)"""
+    return await _list_products(db, products_with_brand(brand_name), skip=skip, limit=limit)
+
+@router.get("/products/category/{category_name}")
+@cached("products")
+async def get_products_by_category_name(category_name: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos por nome da categoria (async)"""
+    return await _list_products(db, products_with_category(category_name), skip=skip, limit=limit)
+
+@router.get("/products/variations")
+@cached("products")
+async def get_products_with_variations(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos que têm variações (async)"""
+    return await _list_products(db, models.Product.has_variations == True, skip=skip, limit=limit)
+
+@router.get("/products/multiple-skus")
+@cached("products")
+async def get_products_with_multiple_skus(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """Retorna produtos com múltiplos SKUs (async)"""
+    return await _list_products(db, models.Product.total_skus > 1, skip=skip, limit=limit)
+
+@router.get("/products/advanced-search")
+@cached("products")
+async def advanced_search_products(
+    title: Optional[str] = Query(None, description="Buscar no título"),
+    brand: Optional[str] = Query(None, description="Buscar na marca"),
+    category: Optional[str] = Query(None, description="Buscar na categoria"),
+    min_price: Optional[float] = Query(None, description="Preço mínimo"),
+    max_price: Optional[float] = Query(None, description="Preço máximo"),
+    with_stock: Optional[bool] = Query(None, description="Apenas com estoque"),
+    with_images: Optional[bool] = Query(None, description="Apenas com imagens"),
+    sku_partner_id: Optional[str] = Query(None, description="SKU Partner ID"),
+    ean: Optional[str] = Query(None, description="Código EAN"),
+    characteristic_name: Optional[str] = Query(None, description="Nome da característica"),
+    characteristic_value: Optional[str] = Query(None, description="Valor da característica"),
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Busca avançada combinando múltiplos campos expandidos (async)"""
+    conditions = product_search_conditions(
+        title=title,
+        brand=brand,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        with_stock=with_stock,
+        with_images=with_images,
+        sku_partner_id=sku_partner_id,
+        ean=ean,
+        characteristic_name=characteristic_name,
+        characteristic_value=characteristic_value,
+    )
+
+    products = await _list_products(db, *conditions, skip=skip, limit=limit)
+    total_found = await db.scalar(select(func.count()).select_from(models.Product).where(*conditions))
+
+    return {
+        "total_found": total_found,
+        "products": products,
+        "search_params": {
+            "title": title,
+            "brand": brand,
+            "category": category,
+            "min_price": min_price,
+            "max_price": max_price,
+            "with_stock": with_stock,
+            "with_images": with_images,
+            "sku_partner_id": sku_partner_id,
+            "ean": ean,
+            "characteristic_name": characteristic_name,
+            "characteristic_value": characteristic_value
+        }
+    }
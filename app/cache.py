@@ -0,0 +1,320 @@
+"""
+Cache em memória e ETags para as respostas dos endpoints GET.
+
+Os dados só mudam quando a sincronização (daily_update.py ou /sync/products)
+faz commit. Cada entidade tem um contador de versão na tabela data_versions,
+incrementado na mesma transação da sincronização; entradas de cache gravadas
+com uma versão antiga são descartadas assim que a nova versão é observada.
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import logging
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, read_router
+from .serialization import to_json_bytes
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+DATA_VERSION_POLL_SECONDS = float(os.getenv("DATA_VERSION_POLL_SECONDS", "5"))
+
+
+class ResponseCache:
+    """Cache LRU com TTL, limitado em número de entradas."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, expires_at, entities, versions)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.not_modified = 0
+
+    def get(self, key, versions):
+        """Retorna (hit, valor). Entradas expiradas ou de versão antiga contam como miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            value, expires_at, _, entry_versions = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            if entry_versions != versions:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value, entities, versions):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, entities, versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, entity):
+        """Remove todas as entradas que dependem da entidade."""
+        with self._lock:
+            stale = [k for k, entry in self._entries.items() if entity in entry[2]]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def record_not_modified(self):
+        """Conta uma resposta 304 servida só com o ETag."""
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "not_modified": self.not_modified,
+            }
+
+
+class DataVersionTracker:
+    """
+    Mantém em memória as versões da tabela data_versions.
+    A tabela é relida (no primário) no máximo a cada DATA_VERSION_POLL_SECONDS,
+    para que a sincronização feita por outro processo (cron) seja percebida sem
+    consultar o banco a cada request.
+    """
+
+    def __init__(self, cache, poll_seconds=DATA_VERSION_POLL_SECONDS):
+        self.cache = cache
+        self.poll_seconds = poll_seconds
+        self._versions = {}
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def _apply(self, versions):
+        """Atualiza as versões conhecidas e invalida as entidades que mudaram."""
+        with self._lock:
+            changed = [e for e, v in versions.items() if self._versions.get(e) != v]
+            synced = any(e in self._versions for e in changed)
+            self._versions.update(versions)
+        if synced:
+            # Houve uma sincronização: as réplicas podem ainda não ter os dados
+            # novos, e o cache seria preenchido com respostas antigas na versão nova
+            read_router.stick_to_primary()
+        for entity in changed:
+            removed = self.cache.invalidate(entity)
+            logger.info(f"Versão de {entity} mudou para {versions[entity]}, {removed} entradas de cache removidas")
+
+    def refresh(self):
+        """Relê a tabela data_versions."""
+        self._last_poll = time.monotonic()
+        db = SessionLocal()
+        try:
+            rows = db.query(models.DataVersion.entity, models.DataVersion.version).all()
+            self._apply({entity: version for entity, version in rows})
+        except Exception as e:
+            logger.error(f"Erro ao ler data_versions: {e}")
+        finally:
+            db.close()
+
+    def needs_refresh(self):
+        return time.monotonic() - self._last_poll >= self.poll_seconds
+
+    def snapshot(self, entities):
+        """Versões atuais das entidades, relendo o banco se o intervalo de polling venceu."""
+        if self.needs_refresh():
+            self.refresh()
+        with self._lock:
+            return tuple(self._versions.get(e, 0) for e in entities)
+
+    def mark_changed(self, entity, version):
+        """Registra uma nova versão produzida neste processo (ex: /sync/products)."""
+        self._apply({entity: version})
+
+    def current(self):
+        with self._lock:
+            return dict(self._versions)
+
+
+response_cache = ResponseCache()
+data_versions = DataVersionTracker(response_cache)
+
+
+def bump_data_version(db: Session, entity: str) -> int:
+    """
+    Incrementa a versão da entidade na sessão atual.
+    Deve ser chamada antes do db.commit() da sincronização, para que a nova
+    versão fique visível junto com os dados.
+    """
+    updated = db.query(models.DataVersion).filter(
+        models.DataVersion.entity == entity
+    ).update(
+        {
+            models.DataVersion.version: models.DataVersion.version + 1,
+            models.DataVersion.updated_at: datetime.now(),
+        },
+        synchronize_session=False,
+    )
+    if not updated:
+        db.add(models.DataVersion(entity=entity, version=1, updated_at=datetime.now()))
+        db.flush()
+
+    return db.query(models.DataVersion.version).filter(
+        models.DataVersion.entity == entity
+    ).scalar()
+
+
+def _normalize(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    return value
+
+
+def make_cache_key(func, kwargs):
+    """Chave = rota + parâmetros normalizados (sessão do banco é ignorada)."""
+    params = tuple(sorted(
+        (k, _normalize(v)) for k, v in kwargs.items() if not isinstance(v, (Session, AsyncSession))
+    ))
+    return (func.__module__, func.__name__, params)
+
+
+def make_etag(key, versions):
+    """ETag derivado da chave (rota + parâmetros) e das versões das entidades."""
+    digest = hashlib.sha1(repr((key, versions)).encode("utf-8")).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Comparação fraca do If-None-Match (aceita lista e '*')."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+_REQUEST_PARAM = "_cache_request"
+
+
+def _with_request_param(func):
+    """
+    Assinatura do endpoint acrescida do Request, para que o decorator
+    leia o If-None-Match.
+    """
+    signature = inspect.signature(func)
+    extra = inspect.Parameter(_REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+    return signature.replace(parameters=[*signature.parameters.values(), extra])
+
+
+def _json_response(body, etag):
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
+
+
+def cached(*entities):
+    """
+    Decorator para endpoints GET cujo resultado depende apenas das entidades informadas.
+    O resultado é guardado já serializado em JSON (bytes): um hit devolve os bytes
+    direto, sem nova serialização.
+    Toda resposta leva um ETag; um If-None-Match igual devolve 304 sem consultar o banco.
+    Funciona tanto com endpoints def quanto async def.
+    """
+    def decorator(func):
+        def lookup(kwargs):
+            request = kwargs.pop(_REQUEST_PARAM)
+            key = make_cache_key(func, kwargs)
+            versions = data_versions.snapshot(entities)
+            etag = make_etag(key, versions)
+
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                response_cache.record_not_modified()
+                return key, versions, etag, Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+            hit, body = response_cache.get(key, versions)
+            if hit:
+                return key, versions, etag, _json_response(body, etag)
+            return key, versions, etag, None
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # A releitura de data_versions é síncrona: não bloquear o event loop
+                if data_versions.needs_refresh():
+                    await run_in_threadpool(data_versions.refresh)
+
+                key, versions, etag, response = lookup(kwargs)
+                if response is not None:
+                    return response
+
+                body = to_json_bytes(await func(*args, **kwargs))
+                response_cache.set(key, body, entities, versions)
+                return _json_response(body, etag)
+
+            async_wrapper.__signature__ = _with_request_param(func)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key, versions, etag, response = lookup(kwargs)
+            if response is not None:
+                return response
+
+            body = to_json_bytes(func(*args, **kwargs))
+            response_cache.set(key, body, entities, versions)
+            return _json_response(body, etag)
+
+        wrapper.__signature__ = _with_request_param(func)
+        return wrapper
+
+    return decorator
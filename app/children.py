@@ -0,0 +1,239 @@
+"""
+Tabelas filhas normalizadas de products e orders.
+
+Os models expandem em colunas só o primeiro elemento de skus, images,
+characteristics, items e payments. Aqui cada elemento vira uma linha em
+product_skus, product_images, product_characteristics, order_items e
+order_payments, indexadas por EAN, partner ID e SKU ID.
+
+ChildRowsWriter acumula as linhas de uma página e, no fim dela, apaga as
+linhas antigas dos pais da página e grava as novas com bulk insert, na mesma
+transação do save_*.
+"""
+
+from collections import defaultdict
+import logging
+import os
+
+from sqlalchemy import delete, select
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+CHILD_REBUILD_BATCH_SIZE = int(os.getenv("CHILD_REBUILD_BATCH_SIZE", "500"))
+
+PRODUCT_CHILD_MODELS = (models.ProductSku, models.ProductImage, models.ProductCharacteristic)
+ORDER_CHILD_MODELS = (models.OrderItem, models.OrderPayment)
+
+
+def _str(data, key):
+    value = data.get(key)
+    return str(value) if value is not None else None
+
+
+def _int(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _float(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def product_child_rows(product_anymarket_id, product_data):
+    """Linhas de product_skus, product_images e product_characteristics de um produto da API."""
+    skus = [
+        {
+            "product_anymarket_id": product_anymarket_id,
+            "position": position,
+            "sku_id": _str(sku, "id"),
+            "partner_id": _str(sku, "partnerId"),
+            "ean": _str(sku, "ean"),
+            "title": sku.get("title"),
+            "price": _float(sku.get("price")),
+            "amount": _int(sku.get("amount")),
+            "additional_time": _int(sku.get("additionalTime")),
+            "stock_local_id": _str(sku, "stockLocalId"),
+            "variations": sku.get("variations"),
+        }
+        for position, sku in enumerate(product_data.get("skus") or [])
+    ]
+    images = [
+        {
+            "product_anymarket_id": product_anymarket_id,
+            "position": position,
+            "image_id": _str(image, "id"),
+            "index": _int(image.get("index")),
+            "main": bool(image.get("main", False)),
+            "url": image.get("url"),
+            "thumbnail_url": image.get("thumbnailUrl"),
+            "low_resolution_url": image.get("lowResolutionUrl"),
+            "standard_url": image.get("standardUrl"),
+            "original_image": image.get("originalImage"),
+            "status": image.get("status"),
+            "standard_width": _int(image.get("standardWidth")),
+            "standard_height": _int(image.get("standardHeight")),
+            "original_width": _int(image.get("originalWidth")),
+            "original_height": _int(image.get("originalHeight")),
+        }
+        for position, image in enumerate(product_data.get("images") or [])
+    ]
+    characteristics = [
+        {
+            "product_anymarket_id": product_anymarket_id,
+            "position": position,
+            "index": _int(char.get("index")),
+            "name": char.get("name"),
+            "value": _str(char, "value"),
+        }
+        for position, char in enumerate(product_data.get("characteristics") or [])
+    ]
+    return {
+        models.ProductSku: skus,
+        models.ProductImage: images,
+        models.ProductCharacteristic: characteristics,
+    }
+
+
+def order_child_rows(order_anymarket_id, order_data):
+    """Linhas de order_items e order_payments de um pedido da API."""
+    items = []
+    for position, item in enumerate(order_data.get("items") or []):
+        product = item.get("product") or {}
+        sku = item.get("sku") or {}
+        items.append({
+            "order_anymarket_id": order_anymarket_id,
+            "position": position,
+            "product_id": _str(product, "id"),
+            "product_title": product.get("title"),
+            "sku_id": _str(sku, "id"),
+            "sku_title": sku.get("title"),
+            "sku_partner_id": _str(sku, "partnerId"),
+            "sku_ean": _str(sku, "ean"),
+            "amount": _float(item.get("amount")),
+            "unit": _float(item.get("unit")),
+            "gross": _float(item.get("gross")),
+            "total": _float(item.get("total")),
+            "discount": _float(item.get("discount")),
+            "id_in_marketplace": _str(item, "idInMarketPlace"),
+            "order_item_id": _str(item, "orderItemId"),
+            "free_shipping": bool(item.get("freeShipping", False)),
+            "is_catalog": bool(item.get("isCatalog", False)),
+        })
+    payments = [
+        {
+            "order_anymarket_id": order_anymarket_id,
+            "position": position,
+            "method": payment.get("method"),
+            "status": payment.get("status"),
+            "value": _float(payment.get("value")),
+            "installments": _int(payment.get("installments")),
+            "marketplace_id": _str(payment, "marketplaceId"),
+            "payment_method_normalized": payment.get("paymentMethodNormalized"),
+            "payment_detail_normalized": payment.get("paymentDetailNormalized"),
+        }
+        for position, payment in enumerate(order_data.get("payments") or [])
+    ]
+    return {
+        models.OrderItem: items,
+        models.OrderPayment: payments,
+    }
+
+
+def _parent_column(model):
+    if hasattr(model, "product_anymarket_id"):
+        return model.product_anymarket_id
+    return model.order_anymarket_id
+
+
+class ChildRowsWriter:
+    """Acumula as linhas filhas de uma página e grava tudo de uma vez em flush()."""
+
+    def __init__(self, child_models):
+        self.child_models = child_models
+        self._parents = set()
+        self._rows = defaultdict(dict)
+
+    def add(self, parent_id, rows_by_model):
+        # Um pai repetido na mesma página fica só com a última versão
+        self._parents.add(parent_id)
+        for model in self.child_models:
+            self._rows[model][parent_id] = rows_by_model.get(model, [])
+
+    def add_product(self, product_anymarket_id, product_data):
+        self.add(product_anymarket_id, product_child_rows(product_anymarket_id, product_data))
+
+    def add_order(self, order_anymarket_id, order_data):
+        self.add(order_anymarket_id, order_child_rows(order_anymarket_id, order_data))
+
+    def flush(self, db):
+        """Substitui as linhas filhas dos pais acumulados (sem commit). Retorna linhas gravadas."""
+        if not self._parents:
+            return 0
+
+        parent_ids = list(self._parents)
+        written = 0
+        for model in self.child_models:
+            db.execute(delete(model).where(_parent_column(model).in_(parent_ids)))
+            rows = [row for parent_rows in self._rows[model].values() for row in parent_rows]
+            if rows:
+                db.bulk_insert_mappings(model, rows)
+                written += len(rows)
+
+        self._parents.clear()
+        self._rows.clear()
+        return written
+
+
+def _rebuild(db, source_columns, child_models, build_rows):
+    for model in child_models:
+        db.execute(delete(model))
+
+    stmt = select(*source_columns).execution_options(yield_per=CHILD_REBUILD_BATCH_SIZE)
+    total = 0
+    for rows in db.execute(stmt).partitions():
+        writer = ChildRowsWriter(child_models)
+        for row in rows:
+            writer.add(row[0], build_rows(row))
+        total += writer.flush(db)
+    return total
+
+
+def rebuild_product_children(db):
+    """Recria as tabelas filhas de products a partir das colunas JSON (backfill)."""
+    Product = models.Product
+    total = _rebuild(
+        db,
+        (Product.anymarket_id, Product.skus, Product.images, Product.characteristics),
+        PRODUCT_CHILD_MODELS,
+        lambda row: product_child_rows(row.anymarket_id, {
+            "skus": row.skus, "images": row.images, "characteristics": row.characteristics,
+        }),
+    )
+    logger.info(f"Tabelas filhas de products recriadas: {total} linhas")
+    return total
+
+
+def rebuild_order_children(db):
+    """Recria as tabelas filhas de orders a partir das colunas JSON (backfill)."""
+    Order = models.Order
+    total = _rebuild(
+        db,
+        (Order.anymarket_id, Order.items_data, Order.payments_data),
+        ORDER_CHILD_MODELS,
+        lambda row: order_child_rows(row.anymarket_id, {
+            "items": row.items_data, "payments": row.payments_data,
+        }),
+    )
+    logger.info(f"Tabelas filhas de orders recriadas: {total} linhas")
+    return total
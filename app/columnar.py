@@ -0,0 +1,111 @@
+"""
+Escrita de tabelas do banco em Parquet (pyarrow, opcional).
+
+O schema Arrow é derivado das colunas do model; colunas JSON/JSONB são
+gravadas como texto JSON, lido do banco já como texto (json_select_columns),
+sem decodificar os arrays.
+"""
+
+import os
+from pathlib import Path
+
+from sqlalchemy import JSON, Boolean, Date, DateTime, Float, Integer, Numeric
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional
+    pa = None
+    pq = None
+
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow não está instalado (pip install pyarrow)")
+
+
+def _arrow_type(column):
+    column_type = column.type
+    if isinstance(column_type, JSON):
+        return pa.string()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, (Float, Numeric)):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC" if column_type.timezone else None)
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_schema(model):
+    """Schema Arrow com as colunas do model, na ordem da tabela."""
+    return select_arrow_schema(model.__table__.columns)
+
+
+def select_arrow_schema(columns):
+    """Schema Arrow das colunas de um SELECT (colunas JSON já convertidas em texto viram string)."""
+    require_pyarrow()
+    return pa.schema([pa.field(c.name, _arrow_type(c)) for c in columns])
+
+
+def rows_to_batch(rows, schema):
+    """RecordBatch a partir de linhas de um SELECT com as colunas do schema."""
+    return pa.RecordBatch.from_pylist([dict(row._mapping) for row in rows], schema=schema)
+
+
+class ParquetFileWriter:
+    """
+    Escreve um arquivo Parquet em lotes num arquivo temporário e só o move
+    para o destino em close(), para que leitores nunca vejam um arquivo pela metade.
+    """
+
+    def __init__(self, path, schema):
+        require_pyarrow()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.schema = schema
+        self.rows = 0
+        self._writer = pq.ParquetWriter(str(self.tmp_path), schema, compression=PARQUET_COMPRESSION)
+
+    def write_batch(self, batch):
+        if batch.num_rows:
+            self._writer.write_batch(batch)
+            self.rows += batch.num_rows
+
+    def write_table(self, table):
+        if table.num_rows:
+            self._writer.write_table(table.cast(self.schema))
+            self.rows += table.num_rows
+
+    def finish(self):
+        """Fecha o arquivo temporário sem publicá-lo; publish() o move para o destino."""
+        self._writer.close()
+        return self.rows
+
+    def publish(self):
+        os.replace(self.tmp_path, self.path)
+
+    def close(self):
+        self.finish()
+        self.publish()
+        return self.rows
+
+    def abort(self):
+        self._writer.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
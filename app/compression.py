@@ -0,0 +1,164 @@
+"""
+Middleware ASGI de compressão com negociação de Accept-Encoding.
+
+Usa brotli quando o cliente aceita "br" e o pacote brotli está instalado;
+caso contrário usa gzip. Respostas pequenas, já comprimidas (ex: exportação
+com compress=true) ou de tipos não textuais passam sem alteração.
+"""
+
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def parse_accept_encoding(header):
+    """Retorna {encoding: q} a partir do header Accept-Encoding."""
+    accepted = {}
+    for part in header.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """Escolhe br ou gzip conforme o Accept-Encoding; None se nenhum for aceito."""
+    accepted = parse_accept_encoding(header or "")
+    candidates = []
+    if brotli is not None and accepted.get("br", 0) > 0:
+        candidates.append(("br", accepted["br"]))
+    gzip_q = accepted.get("gzip", accepted.get("*", 0))
+    if gzip_q > 0:
+        candidates.append(("gzip", gzip_q))
+    if not candidates:
+        return None
+    # Em empate de q, a ordem da lista (br antes de gzip) decide
+    return max(candidates, key=lambda c: c[1])[0]
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def compress_all(self, data):
+        """Comprime uma resposta inteira de uma vez, sem flushes intermediários."""
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.finish()
+        return self._obj.compress(data) + self._obj.flush()
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app, encoding, minimum_size):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _compressible(self, headers):
+        names = {k.lower() for k, _ in headers}
+        if b"content-encoding" in names:
+            return False
+        content_type = next((v.decode("latin-1") for k, v in headers if k.lower() == b"content-type"), "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send_wrapper(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._compressible(message.get("headers", []))
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                # Resposta pequena e completa: não vale comprimir
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            headers = [
+                (k, v) for k, v in self.start_message.get("headers", [])
+                if k.lower() != b"content-length"
+            ]
+            headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+            headers.append((b"vary", b"Accept-Encoding"))
+            if not more_body:
+                data = self.compressor.compress_all(body)
+                headers.append((b"content-length", str(len(data)).encode("latin-1")))
+                await self.send({**self.start_message, "headers": headers})
+                await self.send({"type": "http.response.body", "body": data, "more_body": False})
+                return
+            await self.send({**self.start_message, "headers": headers})
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
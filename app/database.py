@@ -1,10 +1,15 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import logging
 
+from .db_pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, pool_metrics
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -14,39 +19,361 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL não encontrada nas variáveis de ambiente")
 
-# Configurações específicas para diferentes tipos de banco
-if DATABASE_URL.startswith("sqlite"):
-    # Para SQLite local (desenvolvimento)
-    engine = create_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False}
-    )
-elif DATABASE_URL.startswith("postgresql://"):
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim", "on")
+
+def _env_threshold(name, default):
+    """Inteiro, ou None para 'none'/'off' (ex: prepare_threshold do psycopg)."""
+    value = os.getenv(name, default).strip().lower()
+    return None if value in ("", "none", "off") else int(value)
+
+# Pool das conexões de escrita (sincronização) e de leitura (API: réplicas e leituras no primário)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+# Segundos esperando uma conexão livre antes de erro
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Conexões mais velhas que isso são reabertas (abaixo do timeout de ociosidade do servidor/Neon)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+# SELECT 1 a cada checkout; com DB_POOL_RECYCLE menor que o timeout do servidor, pode ser desligado
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# statement_timeout por papel, em ms (0 = sem limite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_READ_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_READ_STATEMENT_TIMEOUT_MS", "0"))
+# Execuções de uma mesma query antes de o psycopg prepará-la no servidor ('none' desliga)
+DB_PREPARE_THRESHOLD = _env_threshold("DB_PREPARE_THRESHOLD", "5")
+# Conexão via PgBouncer em modo transaction: sem prepared statements e sem
+# parâmetros de sessão (o statement_timeout vira SET LOCAL em cada transação)
+DB_PGBOUNCER = _env_bool("DB_PGBOUNCER", False)
+DB_ECHO = _env_bool("DB_ECHO", False)
+
+ROLE_SETTINGS = {
+    "write": {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS},
+    "read": {"pool_size": DB_READ_POOL_SIZE, "max_overflow": DB_READ_MAX_OVERFLOW, "statement_timeout_ms": DB_READ_STATEMENT_TIMEOUT_MS},
+}
+
+def _postgres_url(url):
     # Para PostgreSQL/Neon - corrigir URL se necessário
-    corrected_url = DATABASE_URL.replace("postgresql://", "postgresql+psycopg://", 1)
-    
-    # Configurações otimizadas para Neon
-    engine = create_engine(
-        corrected_url,
-        pool_size=5,
-        max_overflow=10,
-        pool_pre_ping=True,
-        pool_recycle=300,
-        echo=False  # Mude para True se quiser ver as queries SQL
-    )
-else:
-    # Para URLs já formatadas corretamente
-    engine = create_engine(
-        DATABASE_URL,
-        pool_size=5,
-        max_overflow=10,
-        pool_pre_ping=True,
-        pool_recycle=300,
-        echo=False
-    )
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+psycopg://", 1)
+    return url
+
+def _connect_args(url, role):
+    """Parâmetros de conexão do psycopg: prepared statements e statement_timeout do papel."""
+    connect_args = {}
+    if make_url(url).get_driver_name() == "psycopg":
+        connect_args["prepare_threshold"] = None if DB_PGBOUNCER else DB_PREPARE_THRESHOLD
+    timeout_ms = ROLE_SETTINGS[role]["statement_timeout_ms"]
+    if timeout_ms and not DB_PGBOUNCER:
+        connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+    return connect_args
+
+def _set_local_statement_timeout(sync_engine, timeout_ms):
+    """PgBouncer (transaction): o timeout vale só para a transação que começa."""
+    @event.listens_for(sync_engine, "begin")
+    def _set_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+def _pool_kwargs(role, pool_size=None, max_overflow=None):
+    settings = ROLE_SETTINGS[role]
+    return {
+        "pool_size": settings["pool_size"] if pool_size is None else pool_size,
+        "max_overflow": settings["max_overflow"] if max_overflow is None else max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+def _make_engine(url, role="write", name="primary"):
+    """Engine síncrono com as configurações do papel (write/read) e pool instrumentado"""
+    if url.startswith("sqlite"):
+        # Para SQLite local (desenvolvimento)
+        file_db = ":memory:" not in url and url != "sqlite://"
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            echo=DB_ECHO,
+            **({"poolclass": InstrumentedQueuePool, **_pool_kwargs(role)} if file_db else {}),
+        )
+    else:
+        url = _postgres_url(url)
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            connect_args=_connect_args(url, role),
+            echo=DB_ECHO,
+            **_pool_kwargs(role),
+        )
+        timeout_ms = ROLE_SETTINGS[role]["statement_timeout_ms"]
+        if DB_PGBOUNCER and timeout_ms:
+            _set_local_statement_timeout(engine, timeout_ms)
+
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        pool_metrics.register(name, engine.pool)
+    return engine
+
+# Primário: recebe as escritas da sincronização
+engine = _make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplicas de leitura (URLs separadas por vírgula) para os endpoints GET.
+# Sem réplicas configuradas, as leituras usam o primário.
+DATABASE_READ_URLS = [u.strip() for u in os.getenv("DATABASE_READ_URLS", "").split(",") if u.strip()]
+# Réplica com atraso maior que isso não recebe leituras
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# Intervalo entre medições de atraso de cada réplica
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+# Medição mais velha que isso (probe preso num connect lento) conta como réplica indisponível
+REPLICA_LAG_STALE_SECONDS = float(os.getenv("REPLICA_LAG_STALE_SECONDS", "10"))
+# Depois de uma sincronização, as leituras ficam no primário por esse tempo
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "30"))
+
+# Atraso de replay da réplica em segundos; 0 se a conexão é o próprio primário
+# ou se a réplica está recebendo WAL e já aplicou tudo o que recebeu (primário
+# sem escritas). NULL se o WAL receiver não está em streaming: com a replicação
+# parada, receive = replay não quer dizer que a réplica está em dia. Ler o status
+# de pg_stat_wal_receiver exige pg_read_all_stats (ou pg_monitor).
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReadRouter:
+    """
+    Escolhe o engine das leituras: as réplicas em rodízio, pulando as que
+    estão atrasadas ou fora do ar, e o primário quando nenhuma serve ou logo
+    depois de uma sincronização (stick_to_primary), enquanto as réplicas
+    ainda podem não ter os dados novos.
+
+    O atraso é medido por uma thread por réplica, a cada check_seconds; a
+    escolha só lê o último valor medido e nunca abre conexão. Até a primeira
+    medição, ou com a medição velha demais, a réplica não recebe leituras.
+    """
+
+    def __init__(self, primary, replicas=(), max_lag=REPLICA_MAX_LAG_SECONDS,
+                 check_seconds=REPLICA_LAG_CHECK_SECONDS, sticky_seconds=REPLICA_STICKY_SECONDS,
+                 stale_seconds=REPLICA_LAG_STALE_SECONDS):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_seconds = check_seconds
+        self.sticky_seconds = sticky_seconds
+        self.stale_seconds = max(stale_seconds, check_seconds)
+        self._lock = threading.Lock()
+        self._monitors = []
+        self.reset()
+
+    def reset(self):
+        self._next = 0
+        self._lag = {}  # índice -> (atraso em segundos ou None se indisponível, medido em)
+        self._sticky_until = 0.0
+        self.reads = {"primary": 0, "replica": 0}
+        self.fallbacks = 0
+
+    def _measure_lag(self, replica):
+        if replica.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with replica.connect() as conn:
+                lag = conn.execute(REPLICA_LAG_SQL).scalar()
+        except Exception as e:
+            logger.warning(f"Réplica {replica.url.host} indisponível: {e}")
+            return None
+        if lag is None:
+            logger.warning(f"Réplica {replica.url.host} sem WAL receiver em streaming")
+            return None
+        return float(lag)
+
+    def check_lag(self, index):
+        """Mede agora o atraso de uma réplica (bloqueia até o connect terminar)."""
+        lag = self._measure_lag(self.replicas[index])
+        self._lag[index] = (lag, time.monotonic())
+        return lag
+
+    def _monitor(self, index):
+        while True:
+            self.check_lag(index)
+            time.sleep(self.check_seconds)
+
+    def start_monitor(self):
+        """Inicia as threads de medição, se ainda não estão rodando (também depois de um fork)."""
+        if not self.replicas or (self._monitors and all(t.is_alive() for t in self._monitors)):
+            return
+        with self._lock:
+            if self._monitors and all(t.is_alive() for t in self._monitors):
+                return
+            self._monitors = [
+                threading.Thread(target=self._monitor, args=(index,), name=f"replica-lag-{index + 1}", daemon=True)
+                for index in range(len(self.replicas))
+            ]
+            for thread in self._monitors:
+                thread.start()
+
+    def lag(self, index):
+        """Último atraso medido da réplica; None se indisponível, ainda não medido ou medido há mais de stale_seconds."""
+        self.start_monitor()
+        lag, checked_at = self._lag.get(index, (None, None))
+        if checked_at is None or time.monotonic() - checked_at > self.stale_seconds:
+            return None
+        return lag
+
+    def stick_to_primary(self, seconds=None):
+        """Manda as leituras para o primário pelos próximos `seconds` segundos."""
+        if not self.replicas:
+            return
+        until = time.monotonic() + (self.sticky_seconds if seconds is None else seconds)
+        with self._lock:
+            self._sticky_until = max(self._sticky_until, until)
+
+    def is_sticky(self):
+        return time.monotonic() < self._sticky_until
+
+    def choose_index(self):
+        """Índice da réplica para a próxima leitura, ou None para o primário."""
+        if not self.replicas or self.is_sticky():
+            with self._lock:
+                self.reads["primary"] += 1
+            return None
+
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            lag = self.lag(index)
+            if lag is not None and lag <= self.max_lag:
+                with self._lock:
+                    self.reads["replica"] += 1
+                return index
+
+        with self._lock:
+            self.fallbacks += 1
+            self.reads["primary"] += 1
+        return None
+
+    def choose(self):
+        """Engine para a próxima leitura."""
+        index = self.choose_index()
+        return self.primary if index is None else self.replicas[index]
+
+    def status(self):
+        remaining = max(0.0, self._sticky_until - time.monotonic())
+        return {
+            "replicas": [
+                {
+                    "url": replica.url.render_as_string(hide_password=True),
+                    "lag_seconds": self._lag.get(index, (None, None))[0],
+                }
+                for index, replica in enumerate(self.replicas)
+            ],
+            "max_lag_seconds": self.max_lag,
+            "sticky_primary_seconds": round(remaining, 1),
+            "reads": dict(self.reads),
+            "fallbacks": self.fallbacks,
+        }
+
+
+# Leituras no primário (fallback e sticky) usam o papel read, com pool
+# próprio só quando o statement_timeout de leitura é diferente
+_read_primary = engine if DB_READ_STATEMENT_TIMEOUT_MS == DB_STATEMENT_TIMEOUT_MS else _make_engine(DATABASE_URL, "read", "read_primary")
+
+read_router = ReadRouter(_read_primary, [
+    _make_engine(url, "read", f"replica{number}") for number, url in enumerate(DATABASE_READ_URLS, start=1)
+])
+
+class RoutedReadSession(Session):
+    """
+    Sessão somente leitura que escolhe o engine (réplica ou primário) na
+    primeira consulta, e não ao ser criada: a dependency do FastAPI é
+    resolvida antes de o cache reler data_versions, que é quando uma
+    sincronização recente é percebida.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.bind is None:
+            self.bind = read_router.choose()
+        return self.bind
+
+
+ReadSessionLocal = sessionmaker(class_=RoutedReadSession, autocommit=False, autoflush=False)
+
+
+def read_session():
+    """Sessão para consultas somente leitura (réplica ou primário)."""
+    return ReadSessionLocal()
+
+# Engine assíncrono (psycopg async) para os endpoints async def.
+# Não usa o threadpool do Starlette, então o pool pode ser maior que o síncrono.
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "30"))
+
+def _async_database_url(url):
+    """Converte a URL para o driver assíncrono correspondente"""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+psycopg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+def _make_async_engine(url, name):
+    """Engine assíncrono: usado só pelos endpoints de leitura (papel read)"""
+    if url.startswith("sqlite"):
+        return create_async_engine(_async_database_url(url))
+    url = _async_database_url(url)
+    async_engine = create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncQueuePool,
+        connect_args=_connect_args(url, "read"),
+        echo=DB_ECHO,
+        **_pool_kwargs("read", ASYNC_DB_POOL_SIZE, ASYNC_DB_MAX_OVERFLOW),
+    )
+    if DB_PGBOUNCER and DB_READ_STATEMENT_TIMEOUT_MS:
+        _set_local_statement_timeout(async_engine.sync_engine, DB_READ_STATEMENT_TIMEOUT_MS)
+    pool_metrics.register(name, async_engine.pool)
+    return async_engine
+
+class RoutedAsyncReadSession(Session):
+    """
+    Como RoutedReadSession, para o AsyncSession (engines em async_read_engines).
+    A escolha só lê o atraso medido pelas threads do read_router, então não
+    bloqueia o event loop mesmo com uma réplica lenta ou fora do ar.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.bind is None:
+            index = read_router.choose_index()
+            self.bind = (async_engine if index is None else async_read_engines[index]).sync_engine
+        return self.bind
+
+try:
+    async_engine = _make_async_engine(DATABASE_URL, "async_primary")
+    # Mesma ordem de read_router.replicas
+    async_read_engines = [
+        _make_async_engine(url, f"async_replica{number}") for number, url in enumerate(DATABASE_READ_URLS, start=1)
+    ]
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(
+        class_=AsyncSession, sync_session_class=RoutedAsyncReadSession, autoflush=False, expire_on_commit=False
+    )
+except ImportError as e:
+    # Driver assíncrono não instalado (ex: aiosqlite em desenvolvimento)
+    logger.warning(f"Engine assíncrono indisponível: {e}")
+    async_engine = None
+    async_read_engines = []
+    AsyncSessionLocal = None
+    AsyncReadSessionLocal = None
+
 Base = declarative_base()
 
 def get_db():
@@ -57,6 +384,21 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Dependency para endpoints somente leitura: sessão numa réplica ou no primário"""
+    db = read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """Dependency para obter sessão assíncrona do banco (leituras: réplica ou primário)"""
+    if AsyncReadSessionLocal is None:
+        raise RuntimeError("Engine assíncrono não configurado para esta DATABASE_URL")
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
 def test_connection():
     """Testa a conexão com o banco de dados"""
     try:
@@ -0,0 +1,134 @@
+"""
+Métricas dos pools de conexão (síncronos e assíncronos).
+
+Os engines de app.database usam InstrumentedQueuePool (ou a versão async),
+que mede quanto tempo cada checkout esperou por uma conexão livre. Junto com
+as conexões em uso, o overflow e os timeouts do pool, isso mostra se o
+pool_size está pequeno (esperas e overflow frequentes) ou grande demais
+(conexões sempre ociosas).
+"""
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Limites (em ms) do histograma de espera por conexão
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolStats:
+    """Contadores de um pool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS_MS)
+        self.connects = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            for i, limit in enumerate(WAIT_BUCKETS_MS):
+                if seconds * 1000 <= limit:
+                    self.wait_buckets[i] += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+            # A conexão nova passou do pool_size: o pool entrou em overflow
+            if isinstance(self.pool, QueuePool) and self.pool.overflow() > 0:
+                self.overflow_events += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        pool = self.pool
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "checkouts": self.checkouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_avg_ms": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_buckets_ms": dict(zip(WAIT_BUCKETS_MS, self.wait_buckets)),
+                "connects": self.connects,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+            }
+
+
+class PoolMetrics:
+    """Registro dos pools instrumentados, por nome (primary, read_primary, replica1, async...)."""
+
+    def __init__(self):
+        self._pools = {}
+
+    def register(self, name, pool):
+        stats = PoolStats(pool)
+        pool._metrics = stats
+        event.listen(pool, "connect", lambda *args: stats.record_connect())
+        self._pools[name] = stats
+        return stats
+
+    def snapshot(self):
+        return {name: stats.snapshot() for name, stats in self._pools.items()}
+
+    def reset(self):
+        for stats in self._pools.values():
+            stats.reset()
+
+
+pool_metrics = PoolMetrics()
+
+
+class _WaitTimingMixin:
+    """Mede o tempo de cada checkout (inclui a espera por conexão livre e a criação de conexões)."""
+
+    _metrics = None
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self._metrics is not None:
+                self._metrics.record_timeout()
+            raise
+        if self._metrics is not None:
+            self._metrics.record_wait(time.perf_counter() - t0)
+        return connection
+
+    def recreate(self):
+        # dispose() recria o pool: os contadores passam para o novo
+        pool = super().recreate()
+        pool._metrics = self._metrics
+        if self._metrics is not None:
+            self._metrics.pool = pool
+        return pool
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
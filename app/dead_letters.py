@@ -0,0 +1,102 @@
+"""
+Dead letters da sincronização (sync_dead_letters).
+
+Quando o banco recusa uma página por causa de um registro (IntegrityError,
+valor grande demais para a coluna, tipo inválido), o daily_update.py divide
+a página ao meio até isolar os registros com erro e grava o resto. Os
+registros recusados, e os que falharam na transformação, ficam aqui com o
+payload original da API e o erro.
+
+Um registro que volta a falhar em outra execução atualiza a mesma linha
+(attempts, erro e last_failed_at). daily_update.py --retry-dead-letters
+reprocessa as linhas pendentes em lotes de DEAD_LETTER_RETRY_BATCH e marca
+resolved_at nas que forem gravadas.
+"""
+
+import os
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+
+from . import models
+
+DEAD_LETTER_RETRY_BATCH = int(os.getenv("DEAD_LETTER_RETRY_BATCH", "50"))
+DEAD_LETTER_ERROR_CHARS = 2000
+
+
+def is_record_error(error):
+    """True se o erro vem dos dados de um registro (constraint, tamanho, tipo), não do banco ou da conexão."""
+    if isinstance(error, (IntegrityError, DataError)):
+        return True
+    # Erro ao converter um parâmetro antes de chegar ao driver (ex: JSON não serializável)
+    return isinstance(error, StatementError) and not isinstance(error, DBAPIError)
+
+
+def error_text(error):
+    """Mensagem do erro sem o SQL e os parâmetros que o SQLAlchemy anexa."""
+    original = getattr(error, "orig", None)
+    return str(original if original is not None else error).strip()[:DEAD_LETTER_ERROR_CHARS]
+
+
+def _error_type(error):
+    original = getattr(error, "orig", None)
+    return type(original if original is not None else error).__name__
+
+
+def store_dead_letter(db, entity, record, error):
+    """Grava (sem commit) um registro recusado; se já há uma linha pendente do mesmo ID, atualiza essa."""
+    anymarket_id = str(record.get("id") or "") or None
+    now = datetime.now()
+
+    letter = None
+    if anymarket_id:
+        letter = db.query(models.SyncDeadLetter).filter(
+            models.SyncDeadLetter.entity == entity,
+            models.SyncDeadLetter.anymarket_id == anymarket_id,
+            models.SyncDeadLetter.resolved_at.is_(None),
+        ).first()
+    if letter is None:
+        letter = models.SyncDeadLetter(entity=entity, anymarket_id=anymarket_id, attempts=0, first_failed_at=now)
+        db.add(letter)
+
+    letter.payload = record
+    mark_failed(letter, error, now)
+    return letter
+
+
+def mark_failed(letter, error, now=None):
+    letter.attempts = (letter.attempts or 0) + 1
+    letter.error = error_text(error)
+    letter.error_type = _error_type(error)
+    letter.last_failed_at = now or datetime.now()
+
+
+def mark_resolved(letter):
+    letter.resolved_at = datetime.now()
+
+
+def pending_dead_letters(db, entity, after_id=0, limit=DEAD_LETTER_RETRY_BATCH):
+    """Próximo lote de dead letters pendentes da entidade, em ordem de id (paginação por id > after_id)."""
+    return (
+        db.query(models.SyncDeadLetter)
+        .filter(
+            models.SyncDeadLetter.entity == entity,
+            models.SyncDeadLetter.resolved_at.is_(None),
+            models.SyncDeadLetter.id > after_id,
+        )
+        .order_by(models.SyncDeadLetter.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def pending_counts(db):
+    """{entidade: dead letters pendentes}"""
+    rows = (
+        db.query(models.SyncDeadLetter.entity, func.count(models.SyncDeadLetter.id))
+        .filter(models.SyncDeadLetter.resolved_at.is_(None))
+        .group_by(models.SyncDeadLetter.entity)
+        .all()
+    )
+    return {entity: count for entity, count in rows}
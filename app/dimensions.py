@@ -0,0 +1,185 @@
+"""
+Tabelas de dimensão (brands, categories, nbms, origins) pelo ID da Anymarket.
+
+products e transmissions guardam o ID de cada dimensão (brand_id,
+category_id, nbm_id, origin_id); nomes, caminhos e descrições ficam uma vez
+na tabela da dimensão. As estatísticas agrupam pelos IDs e as buscas por
+nome filtram a dimensão, que é pequena.
+
+DimensionCache guarda em memória, durante a sincronização, os valores já
+gravados de cada ID: uma página só consulta o banco pelos IDs que ainda não
+estão no cache (uma única consulta para as quatro dimensões) e só grava as
+dimensões novas ou alteradas.
+"""
+
+import logging
+
+from sqlalchemy import func, literal, null, select, union_all, update
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# dimensão -> (model, coluna de ID em products/transmissions, {coluna da dimensão: campo em products/transmissions})
+DIMENSIONS = {
+    "brand": (models.Brand, "brand_id", {
+        "name": "brand_name",
+        "reduced_name": "brand_reduced_name",
+        "partner_id": "brand_partner_id",
+    }),
+    "category": (models.Category, "category_id", {
+        "name": "category_name",
+        "path": "category_path",
+    }),
+    "nbm": (models.Nbm, "nbm_id", {
+        "description": "nbm_description",
+    }),
+    "origin": (models.Origin, "origin_id", {
+        "description": "origin_description",
+    }),
+}
+
+_VALUE_SLOTS = max(len(columns) for _, _, columns in DIMENSIONS.values())
+
+
+def _dimension_rows(records):
+    """{dimensão: {id: {coluna: valor}}} a partir dos campos de produtos/transmissions."""
+    found = {name: {} for name in DIMENSIONS}
+    for fields in records:
+        for name, (_, id_field, columns) in DIMENSIONS.items():
+            dimension_id = fields.get(id_field)
+            if not dimension_id:
+                continue
+            # transmissions não trazem todos os campos (ex: brand_reduced_name)
+            values = {column: fields[field] for column, field in columns.items() if field in fields}
+            found[name].setdefault(str(dimension_id), {}).update(values)
+    return found
+
+
+def _lookup(db, missing):
+    """Valores gravados dos IDs que faltam no cache, numa consulta só (UNION ALL das dimensões)."""
+    selects = []
+    for name, ids in missing.items():
+        if not ids:
+            continue
+        model, _, columns = DIMENSIONS[name]
+        values = [getattr(model, c) for c in columns] + [null()] * (_VALUE_SLOTS - len(columns))
+        selects.append(
+            select(
+                literal(name).label("dimension"),
+                model.anymarket_id,
+                *(value.label(f"v{i}") for i, value in enumerate(values)),
+            ).where(model.anymarket_id.in_(ids))
+        )
+    if not selects:
+        return {}
+
+    stored = {}
+    for row in db.execute(union_all(*selects)):
+        columns = DIMENSIONS[row.dimension][2]
+        stored[(row.dimension, row.anymarket_id)] = dict(zip(columns, row[2:]))
+    return stored
+
+
+class DimensionCache:
+    """
+    ID -> valores gravados de cada dimensão, mantido em memória entre as
+    páginas. As mudanças de uma página só entram no cache depois do commit
+    (confirm()), para um rollback não deixar IDs que não existem no banco.
+    """
+
+    def __init__(self):
+        self._rows = {name: {} for name in DIMENSIONS}
+        self._pending = {}
+        self.lookups = 0
+
+    def reset(self):
+        self._rows = {name: {} for name in DIMENSIONS}
+        self._pending = {}
+
+    def sync(self, db, records):
+        """
+        Grava na sessão (sem commit) as dimensões novas ou alteradas referenciadas
+        pelos campos de uma página de produtos/transmissions. Retorna quantas linhas
+        de dimensão foram criadas ou alteradas.
+        """
+        self._pending = {}
+        found = _dimension_rows(records)
+
+        missing = {name: [i for i in rows if i not in self._rows[name]] for name, rows in found.items()}
+        stored = _lookup(db, missing)
+        if stored or any(missing.values()):
+            self.lookups += 1
+
+        written = 0
+        for name, rows in found.items():
+            model = DIMENSIONS[name][0]
+            for dimension_id, values in rows.items():
+                current = self._rows[name].get(dimension_id)
+                if current is None:
+                    current = stored.get((name, dimension_id))
+
+                if current is None:
+                    db.add(model(anymarket_id=dimension_id, **values))
+                    current = {}
+                    written += 1
+                elif any(current.get(k) != v for k, v in values.items()):
+                    db.execute(update(model).where(model.anymarket_id == dimension_id).values(**values))
+                    written += 1
+
+                self._pending[(name, dimension_id)] = {**current, **values}
+
+        if written:
+            logger.info("Dimensões gravadas: %d", written)
+        return written
+
+    def confirm(self):
+        """Leva para o cache o que a última sync() gravou (chamar após o commit)."""
+        for (name, dimension_id), values in self._pending.items():
+            self._rows[name][dimension_id] = values
+        self._pending = {}
+
+
+dimension_cache = DimensionCache()
+
+
+def top_by_dimension(db, id_column, model, limit=10):
+    """Produtos por ID de dimensão (mais produtos primeiro), com o nome da dimensão: linhas (id, name, count)."""
+    counts = db.query(
+        id_column.label("id"),
+        func.count().label("count"),
+    ).filter(
+        id_column.isnot(None),
+        id_column != "",
+    ).group_by(id_column).subquery()
+
+    return db.query(
+        counts.c.id, model.name, counts.c.count
+    ).outerjoin(
+        model, model.anymarket_id == counts.c.id
+    ).order_by(counts.c.count.desc(), counts.c.id).limit(limit).all()
+
+
+def rebuild_dimensions(db):
+    """Popula as dimensões a partir dos valores já gravados em products e transmissions (backfill, sem commit)."""
+    counts = {}
+    for name, (model, id_field, columns) in DIMENSIONS.items():
+        rows = {}
+        for source in (models.Transmission, models.Product):
+            # products por último: tem todos os campos de brand
+            source_columns = [getattr(source, f) for f in columns.values() if hasattr(source, f)]
+            id_column = getattr(source, id_field)
+            query = db.query(id_column, *source_columns).filter(id_column.isnot(None), id_column != "").distinct()
+            for row in query:
+                values = {c: v for c, v in zip(
+                    [c for c, f in columns.items() if hasattr(source, f)], row[1:]
+                )}
+                rows.setdefault(str(row[0]), {}).update(values)
+
+        db.query(model).delete(synchronize_session=False)
+        db.bulk_insert_mappings(model, [{"anymarket_id": i, **values} for i, values in rows.items()])
+        counts[name] = len(rows)
+        logger.info(f"Dimensão {model.__tablename__} recalculada: {len(rows)} linhas")
+
+    dimension_cache.reset()
+    return counts
@@ -0,0 +1,211 @@
+"""
+Endpoints de exportação em streaming (NDJSON ou CSV).
+
+Cada exportação lê a tabela inteira com um cursor do lado do servidor
+(yield_per), então a memória usada é constante independentemente do número
+de linhas. Substituem o loop de skip/limit sobre os endpoints de listagem.
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from . import models
+from .database import read_session
+from .filters import product_search_conditions, order_search_conditions
+from .order_state import order_state_columns, with_order_state
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _encode_ndjson(columns, rows):
+    lines = [
+        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default)
+        for row in rows
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _encode_csv(columns, rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _stream_table(model, conditions, fmt, compress):
+    """
+    Gera os bytes da exportação em blocos de EXPORT_BATCH_SIZE linhas.
+    A sessão é aberta dentro do gerador para viver enquanto o stream durar.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    db = read_session()
+    try:
+        table = model.__table__
+        stmt = select(table)
+        if model is models.Order:
+            # Pedido completo: inclui status e tracking de order_states
+            stmt = with_order_state(select(table, *order_state_columns()))
+        stmt = (
+            stmt
+            .where(*conditions)
+            .order_by(table.c.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        result = db.execute(stmt)
+        columns = list(result.keys())
+
+        if fmt == "csv":
+            chunk = _encode_csv(columns, [], header=True)
+            yield compressor.compress(chunk) if compressor else chunk
+
+        for rows in result.partitions():
+            if fmt == "csv":
+                chunk = _encode_csv(columns, rows)
+            else:
+                chunk = _encode_ndjson(columns, rows)
+
+            if compressor:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+
+        if compressor:
+            yield compressor.flush()
+    finally:
+        db.close()
+
+
+def _export_response(model, conditions, fmt, compress, name):
+    headers = {
+        "Content-Disposition": f'attachment; filename="{name}.{fmt}"'
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _stream_table(model, conditions, fmt, compress),
+        media_type=MEDIA_TYPES[fmt],
+        headers=headers,
+    )
+
+
+@router.get("/products")
+def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson ou csv"),
+    compress: bool = Query(False, description="Comprimir com gzip"),
+    title: Optional[str] = Query(None, description="Buscar no título"),
+    brand: Optional[str] = Query(None, description="Buscar na marca"),
+    category: Optional[str] = Query(None, description="Buscar na categoria"),
+    min_price: Optional[float] = Query(None, description="Preço mínimo"),
+    max_price: Optional[float] = Query(None, description="Preço máximo"),
+    with_stock: Optional[bool] = Query(None, description="Apenas com estoque"),
+    with_images: Optional[bool] = Query(None, description="Apenas com imagens"),
+    sku_partner_id: Optional[str] = Query(None, description="SKU Partner ID"),
+    ean: Optional[str] = Query(None, description="Código EAN"),
+    characteristic_name: Optional[str] = Query(None, description="Nome da característica"),
+    characteristic_value: Optional[str] = Query(None, description="Valor da característica"),
+):
+    """Exporta produtos em streaming, com os mesmos filtros de /products/advanced-search"""
+    conditions = product_search_conditions(
+        title=title,
+        brand=brand,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        with_stock=with_stock,
+        with_images=with_images,
+        sku_partner_id=sku_partner_id,
+        ean=ean,
+        characteristic_name=characteristic_name,
+        characteristic_value=characteristic_value,
+    )
+    return _export_response(models.Product, conditions, format, compress, "products")
+
+
+@router.get("/orders")
+def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson ou csv"),
+    compress: bool = Query(False, description="Comprimir com gzip"),
+    marketplace: Optional[str] = Query(None, description="Marketplace"),
+    status: Optional[str] = Query(None, description="Status do pedido"),
+    date_from: Optional[datetime] = Query(None, description="Criado a partir de (created_at_anymarket)"),
+    date_to: Optional[datetime] = Query(None, description="Criado antes de (created_at_anymarket, exclusivo)"),
+):
+    """Exporta pedidos em streaming, filtrando por marketplace, status e período"""
+    conditions = order_search_conditions(
+        marketplace=marketplace,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+    )
+    return _export_response(models.Order, conditions, format, compress, "orders")
+
+
+@router.get("/sku-marketplaces")
+def export_sku_marketplaces(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson ou csv"),
+    compress: bool = Query(False, description="Comprimir com gzip"),
+    marketplace: Optional[str] = Query(None, description="Marketplace"),
+    publication_status: Optional[str] = Query(None, description="Status de publicação"),
+):
+    """Exporta SKU marketplaces em streaming"""
+    conditions = []
+    if marketplace:
+        conditions.append(models.SkuMarketplace.marketplace == marketplace)
+    if publication_status:
+        conditions.append(models.SkuMarketplace.publication_status == publication_status)
+    return _export_response(models.SkuMarketplace, conditions, format, compress, "sku_marketplaces")
+
+
+@router.get("/transmissions")
+def export_transmissions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson ou csv"),
+    compress: bool = Query(False, description="Comprimir com gzip"),
+    status: Optional[str] = Query(None, description="Status da transmissão"),
+    publication_status: Optional[str] = Query(None, description="Status de publicação"),
+):
+    """Exporta transmissions em streaming"""
+    conditions = []
+    if status:
+        conditions.append(models.Transmission.status == status)
+    if publication_status:
+        conditions.append(models.Transmission.publication_status == publication_status)
+    return _export_response(models.Transmission, conditions, format, compress, "transmissions")
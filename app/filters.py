@@ -0,0 +1,149 @@
+"""
+Filtros reutilizados entre os endpoints de listagem, a busca avançada
+e os endpoints de exportação.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+
+from . import models
+
+
+def products_with_sku(*conditions):
+    """Produtos com algum SKU em product_skus (qualquer variação) que satisfaz as condições"""
+    return models.Product.anymarket_id.in_(
+        select(models.ProductSku.product_anymarket_id).where(*conditions)
+    )
+
+
+def products_with_characteristic(*conditions):
+    """Produtos com alguma característica em product_characteristics que satisfaz as condições"""
+    return models.Product.anymarket_id.in_(
+        select(models.ProductCharacteristic.product_anymarket_id).where(*conditions)
+    )
+
+
+def orders_with_state(*conditions):
+    """Pedidos cuja linha em order_states satisfaz as condições (status, tracking)"""
+    return models.Order.anymarket_id.in_(
+        select(models.OrderState.order_anymarket_id).where(*conditions)
+    )
+
+
+def products_with_brand(name):
+    """Produtos cuja marca (tabela brands) tem o nome parecido com `name`"""
+    return models.Product.brand_id.in_(
+        select(models.Brand.anymarket_id).where(models.Brand.name.ilike(f"%{name}%"))
+    )
+
+
+def products_with_category(name):
+    """Produtos cuja categoria (tabela categories) tem o nome parecido com `name`"""
+    return models.Product.category_id.in_(
+        select(models.Category.anymarket_id).where(models.Category.name.ilike(f"%{name}%"))
+    )
+
+
+def sku_element(partner_id=None, ean=None, sku_id=None):
+    """Elemento de SKU com os campos informados, para busca por containment (@>)"""
+    element = {}
+    if partner_id:
+        element["partnerId"] = partner_id
+    if ean:
+        element["ean"] = ean
+    if sku_id is not None:
+        element["id"] = sku_id
+    return element
+
+
+def products_containing_sku(partner_id=None, ean=None, sku_id=None):
+    """Produtos cujo array skus (JSONB) tem um SKU com todos os campos informados; usa o índice GIN"""
+    return models.Product.skus.contains([sku_element(partner_id, ean, sku_id)])
+
+
+def orders_containing_sku(partner_id=None, ean=None, sku_id=None):
+    """Pedidos cujo items_data (JSONB) tem um item com esse SKU; usa o índice GIN"""
+    return models.Order.items_data.contains([{"sku": sku_element(partner_id, ean, sku_id)}])
+
+
+def product_search_conditions(
+    title: Optional[str] = None,
+    brand: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    with_stock: Optional[bool] = None,
+    with_images: Optional[bool] = None,
+    sku_partner_id: Optional[str] = None,
+    ean: Optional[str] = None,
+    characteristic_name: Optional[str] = None,
+    characteristic_value: Optional[str] = None,
+):
+    """Condições da busca avançada de produtos (/products/advanced-search)"""
+    conditions = []
+
+    if title:
+        conditions.append(models.Product.title.ilike(f"%{title}%"))
+
+    if brand:
+        conditions.append(products_with_brand(brand))
+
+    if category:
+        conditions.append(products_with_category(category))
+
+    if min_price is not None:
+        conditions.append(models.Product.sku_price >= min_price)
+
+    if max_price is not None:
+        conditions.append(models.Product.sku_price <= max_price)
+
+    if with_stock is not None:
+        conditions.append(models.Product.has_stock == with_stock)
+
+    if with_images is not None:
+        conditions.append(models.Product.has_main_image == with_images)
+
+    if sku_partner_id:
+        conditions.append(products_with_sku(models.ProductSku.partner_id.ilike(f"%{sku_partner_id}%")))
+
+    if ean:
+        conditions.append(products_with_sku(models.ProductSku.ean == ean))
+
+    # Nome e valor precisam casar na mesma característica
+    characteristic_conditions = []
+    if characteristic_name:
+        characteristic_conditions.append(models.ProductCharacteristic.name.ilike(f"%{characteristic_name}%"))
+
+    if characteristic_value:
+        characteristic_conditions.append(models.ProductCharacteristic.value.ilike(f"%{characteristic_value}%"))
+
+    if characteristic_conditions:
+        conditions.append(products_with_characteristic(*characteristic_conditions))
+
+    return conditions
+
+
+def order_search_conditions(
+    marketplace: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Condições de filtro de pedidos por marketplace, status e período (created_at_anymarket)"""
+    conditions = []
+
+    if marketplace:
+        conditions.append(models.Order.marketplace == marketplace)
+
+    if status:
+        conditions.append(orders_with_state(models.OrderState.status == status))
+
+    if date_from is not None:
+        conditions.append(models.Order.created_at_anymarket >= date_from)
+
+    if date_to is not None:
+        conditions.append(models.Order.created_at_anymarket < date_to)
+
+    return conditions
@@ -1,11 +1,73 @@
-# ADICIONAR ESTAS FUNÇÕES E ENDPOINTS NO MAIN.PY EXISTENTE
+from datetime import datetime
+from typing import List, Dict, Optional
+import logging
+
+from fastapi import FastAPI, Depends, Query, BackgroundTasks, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import engine, get_db, get_read_db, read_router
+from .db_pool import pool_metrics
+from .anymarket_client import AnymarketClient
+from .cache import cached, bump_data_version, data_versions, response_cache
+from .children import ChildRowsWriter, PRODUCT_CHILD_MODELS
+from .filters import (
+    product_search_conditions, products_with_sku, products_with_characteristic, products_containing_sku,
+    products_with_brand, products_with_category,
+)
+from .dimensions import DimensionCache, top_by_dimension
+from .serialization import query_to_json
+from .async_routes import router as async_router
+from .export_routes import router as export_router
+from .order_routes import router as order_router
+from .sales_routes import router as sales_router
+from .analytics_routes import router as analytics_router
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware, collect_runtime, registry
+from .sql_profiler import SqlProfilerMiddleware, instrument_engines, recent_profiles
+from .tracing import TracingMiddleware, tracer, TRACE_FILE
+from .sync_runs import run_history, SYNC_BASELINE_RUNS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+models.Base.metadata.create_all(bind=engine)
+
+app = FastAPI(title="Anymarket Backend")
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(SqlProfilerMiddleware)
+# Dentro do MetricsMiddleware: o span do request lê o perfil SQL que ele inicia
+app.add_middleware(TracingMiddleware)
+# Por último = mais externo: a latência inclui a compressão
+app.add_middleware(MetricsMiddleware)
+instrument_engines()
+tracer.configure(TRACE_FILE, "api")
+registry.add_collector(lambda: collect_runtime(response_cache, pool_metrics))
+app.include_router(async_router)
+app.include_router(export_router)
+app.include_router(order_router)
+app.include_router(sales_router)
+app.include_router(analytics_router)
+
+anymarket_client = AnymarketClient()
+
+
+def safe_get_value(data: Dict, key: str, default=None):
+    """Extrai valor de dict de forma segura"""
+    value = data.get(key, default)
+    return value if value is not None else default
 
 # Função completa de salvamento de products com campos expandidos
 def save_products_to_db_ultra_complete(products_data: List[Dict], db: Session):
     """
     Salva produtos no banco de dados com TODOS os campos expandidos
     Incluindo images, skus e characteristics expandidos em colunas individuais
+    e gravados um por linha nas tabelas filhas
     """
+    children = ChildRowsWriter(PRODUCT_CHILD_MODELS)
+    page_fields = []
+
     for product_data in products_data:
         try:
             anymarket_id = str(safe_get_value(product_data, "id", ""))
@@ -229,6 +291,8 @@ def save_products_to_db_ultra_complete(products_data: List[Dict], db: Session):
                 "last_sync_date": datetime.now(),
             }
             
+            page_fields.append(product_fields)
+
             if existing_product:
                 # Atualizar produto existente
                 for field, value in product_fields.items():
@@ -241,12 +305,20 @@ def save_products_to_db_ultra_complete(products_data: List[Dict], db: Session):
                 new_product = models.Product(**product_fields)
                 db.add(new_product)
                 logger.info(f"✨ Product criado: {anymarket_id} - Images: {total_images}, SKUs: {total_skus}, Chars: {total_characteristics}")
+            
+            children.add_product(anymarket_id, product_data)
                 
         except (ValueError, TypeError) as e:
             logger.error(f"❌ Erro ao processar product {product_data.get('id')}: {e}")
             continue
     
+    children.flush(db)
+    # Cache novo a cada chamada: o da sincronização (dimension_cache) vive no
+    # processo do daily_update e aqui ficaria desatualizado entre requests
+    DimensionCache().sync(db, page_fields)
+    version = bump_data_version(db, "products")
     db.commit()
+    data_versions.mark_changed("products", version)
 
 # =============================================================================
 # ATUALIZAR ENDPOINT DE SINCRONIZAÇÃO DE PRODUTOS
@@ -284,119 +356,162 @@ def sync_products(background_tasks: BackgroundTasks, db: Session = Depends(get_d
     background_tasks.add_task(sync_task)
     return {"message": "Sincronização ULTRA COMPLETA de produtos iniciada (com images, skus e characteristics expandidos)"}
 
+@app.get("/sync/runs")
+def get_sync_runs(
+    limit: int = Query(30, ge=1, le=365),
+    entity: Optional[str] = None,
+    baseline_runs: int = Query(SYNC_BASELINE_RUNS, ge=1, le=90),
+    db: Session = Depends(get_read_db),
+):
+    """Execuções do daily_update.py com números por entidade, tendência de throughput e regressões contra a mediana das anteriores"""
+    return run_history(db, limit=limit, entity=entity, baseline_runs=baseline_runs)
+
 # =============================================================================
 # NOVOS ENDPOINTS ESPECIALIZADOS PARA PRODUCTS COM CAMPOS EXPANDIDOS
 # =============================================================================
 
 @app.get("/products/sku/{sku_partner_id}")
-def get_products_by_sku_partner_id(sku_partner_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Retorna produtos por SKU Partner ID (campo expandido)"""
-    products = db.query(models.Product).filter(
-        models.Product.sku_partner_id == sku_partner_id
-    ).offset(skip).limit(limit).all()
-    return products
+@cached("products")
+def get_products_by_sku_partner_id(sku_partner_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    """Retorna produtos que têm um SKU (qualquer variação) com o Partner ID"""
+    query = db.query(models.Product).filter(
+        products_with_sku(models.ProductSku.partner_id == sku_partner_id)
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/ean/{ean_code}")
-def get_products_by_ean(ean_code: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Retorna produtos por código EAN (campo expandido)"""
-    products = db.query(models.Product).filter(
-        models.Product.sku_ean == ean_code
-    ).offset(skip).limit(limit).all()
-    return products
+@cached("products")
+def get_products_by_ean(ean_code: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    """Retorna produtos que têm um SKU (qualquer variação) com o código EAN"""
+    query = db.query(models.Product).filter(
+        products_with_sku(models.ProductSku.ean == ean_code)
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
+
+@app.get("/products/containing-sku")
+@cached("products")
+def get_products_containing_sku(
+    ean: Optional[str] = Query(None, description="EAN do SKU"),
+    partner_id: Optional[str] = Query(None, description="Partner ID do SKU"),
+    sku_id: Optional[int] = Query(None, description="ID do SKU na Anymarket"),
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """Retorna produtos com um SKU que tem todos os campos informados (containment JSONB, índice GIN)"""
+    if not ean and not partner_id and sku_id is None:
+        raise HTTPException(status_code=400, detail="Informe ean, partner_id ou sku_id")
+    query = db.query(models.Product).filter(
+        products_containing_sku(partner_id=partner_id, ean=ean, sku_id=sku_id)
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/price-range")
+@cached("products")
 def get_products_by_price_range(
     min_price: float = Query(..., description="Preço mínimo"),
     max_price: float = Query(..., description="Preço máximo"),
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Retorna produtos em uma faixa de preços (campo expandido)"""
-    products = db.query(models.Product).filter(
+    query = db.query(models.Product).filter(
         models.Product.sku_price.between(min_price, max_price)
-    ).offset(skip).limit(limit).all()
-    return products
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/with-stock")
-def get_products_with_stock(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_with_stock(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos com estoque disponível (campo expandido)"""
-    products = db.query(models.Product).filter(
+    query = db.query(models.Product).filter(
         models.Product.has_stock == True
-    ).offset(skip).limit(limit).all()
-    return products
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/with-images")
-def get_products_with_images(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_with_images(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos que têm imagens (campo expandido)"""
-    products = db.query(models.Product).filter(
+    query = db.query(models.Product).filter(
         models.Product.has_main_image == True
-    ).offset(skip).limit(limit).all()
-    return products
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/image-status/{status}")
-def get_products_by_image_status(status: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_by_image_status(status: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos por status da imagem (campo expandido)"""
-    products = db.query(models.Product).filter(
+    query = db.query(models.Product).filter(
         models.Product.image_status == status
-    ).offset(skip).limit(limit).all()
-    return products
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/characteristic/{name}/{value}")
-def get_products_by_characteristic(name: str, value: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Retorna produtos por característica específica (campo expandido)"""
-    products = db.query(models.Product).filter(
-        models.Product.characteristic_name.ilike(f"%{name}%"),
-        models.Product.characteristic_value.ilike(f"%{value}%")
-    ).offset(skip).limit(limit).all()
-    return products
+@cached("products")
+def get_products_by_characteristic(name: str, value: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    """Retorna produtos por característica específica (qualquer característica do produto)"""
+    query = db.query(models.Product).filter(
+        products_with_characteristic(
+            models.ProductCharacteristic.name.ilike(f"%{name}%"),
+            models.ProductCharacteristic.value.ilike(f"%{value}%"),
+        )
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/stock-location/{stock_local_id}")
-def get_products_by_stock_location(stock_local_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_by_stock_location(stock_local_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos de um local de estoque específico (campo expandido)"""
-    products = db.query(models.Product).filter(
+    query = db.query(models.Product).filter(
         models.Product.sku_stock_local_id == stock_local_id
-    ).offset(skip).limit(limit).all()
-    return products
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/brand/{brand_name}")
-def get_products_by_brand_name(brand_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_by_brand_name(brand_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos por nome da marca (campo expandido)"""
-    products = db.query(models.Product).filter(
-        models.Product.brand_name.ilike(f"%{brand_name}%")
-    ).offset(skip).limit(limit).all()
-    return products
+    query = db.query(models.Product).filter(
+        products_with_brand(brand_name)
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/category/{category_name}")
-def get_products_by_category_name(category_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_by_category_name(category_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos por nome da categoria (campo expandido)"""
-    products = db.query(models.Product).filter(
-        models.Product.category_name.ilike(f"%{category_name}%")
-    ).offset(skip).limit(limit).all()
-    return products
+    query = db.query(models.Product).filter(
+        products_with_category(category_name)
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/variations")
-def get_products_with_variations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_with_variations(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos que têm variações (campo expandido)"""
-    products = db.query(models.Product).filter(
+    query = db.query(models.Product).filter(
         models.Product.has_variations == True
-    ).offset(skip).limit(limit).all()
-    return products
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 @app.get("/products/multiple-skus")
-def get_products_with_multiple_skus(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@cached("products")
+def get_products_with_multiple_skus(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Retorna produtos com múltiplos SKUs (campo expandido)"""
-    products = db.query(models.Product).filter(
+    query = db.query(models.Product).filter(
         models.Product.total_skus > 1
-    ).offset(skip).limit(limit).all()
-    return products
+    ).offset(skip).limit(limit)
+    return query_to_json(query)
 
 # =============================================================================
 # ENDPOINT DE ESTATÍSTICAS ULTRA DETALHADAS PARA PRODUCTS
 # =============================================================================
 
 @app.get("/stats/products/ultra-detailed")
-def get_products_statistics_ultra_detailed(db: Session = Depends(get_db)):
+@cached("products")
+def get_products_statistics_ultra_detailed(db: Session = Depends(get_read_db)):
     """Estatísticas ultra detalhadas incluindo images, skus e characteristics expandidos"""
     from sqlalchemy import func
     
@@ -424,27 +539,9 @@ def get_products_statistics_ultra_detailed(db: Session = Depends(get_db)):
     max_price = db.query(func.max(models.Product.sku_price)).scalar() or 0
     avg_price = db.query(func.avg(models.Product.sku_price)).scalar() or 0
     
-    # Top marcas
-    top_brands = db.query(
-        models.Product.brand_name,
-        func.count(models.Product.id).label('count')
-    ).filter(
-        models.Product.brand_name.isnot(None),
-        models.Product.brand_name != ""
-    ).group_by(
-        models.Product.brand_name
-    ).order_by(func.count(models.Product.id).desc()).limit(10).all()
-    
-    # Top categorias
-    top_categories = db.query(
-        models.Product.category_name,
-        func.count(models.Product.id).label('count')
-    ).filter(
-        models.Product.category_name.isnot(None),
-        models.Product.category_name != ""
-    ).group_by(
-        models.Product.category_name
-    ).order_by(func.count(models.Product.id).desc()).limit(10).all()
+    # Top marcas e categorias: agrupa pelo ID e busca o nome na dimensão
+    top_brands = top_by_dimension(db, models.Product.brand_id, models.Brand)
+    top_categories = top_by_dimension(db, models.Product.category_id, models.Category)
     
     # Status das imagens
     image_statuses = db.query(
@@ -509,14 +606,16 @@ def get_products_statistics_ultra_detailed(db: Session = Depends(get_db)):
         },
         "top_brands": [
             {
-                "brand_name": stat.brand_name,
+                "brand_id": stat.id,
+                "brand_name": stat.name,
                 "count": stat.count
             }
             for stat in top_brands
         ],
         "top_categories": [
             {
-                "category_name": stat.category_name,
+                "category_id": stat.id,
+                "category_name": stat.name,
                 "count": stat.count
             }
             for stat in top_categories
@@ -551,7 +650,7 @@ def get_products_statistics_ultra_detailed(db: Session = Depends(get_db)):
 # =============================================================================
 
 @app.get("/examples/product-ultra-complete")
-def get_product_ultra_complete_example(db: Session = Depends(get_db)):
+def get_product_ultra_complete_example(db: Session = Depends(get_read_db)):
     """Exemplo de produto com TODOS os campos ULTRA expandidos"""
     product = db.query(models.Product).first()
     
@@ -679,7 +778,7 @@ def get_structure_products_ultra_comparison():
 # =============================================================================
 
 @app.get("/health-products")
-def health_check_products(db: Session = Depends(get_db)):
+def health_check_products(db: Session = Depends(get_read_db)):
     """Health check específico para produtos com campos expandidos"""
     try:
         # Testar conexão com banco
@@ -738,6 +837,7 @@ def health_check_products(db: Session = Depends(get_db)):
 # =============================================================================
 
 @app.get("/products/advanced-search")
+@cached("products")
 def advanced_search_products(
     title: Optional[str] = Query(None, description="Buscar no título"),
     brand: Optional[str] = Query(None, description="Buscar na marca"),
@@ -752,46 +852,25 @@ def advanced_search_products(
     characteristic_value: Optional[str] = Query(None, description="Valor da característica"),
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Busca avançada combinando múltiplos campos expandidos"""
     
-    query = db.query(models.Product)
-    
-    if title:
-        query = query.filter(models.Product.title.ilike(f"%{title}%"))
-    
-    if brand:
-        query = query.filter(models.Product.brand_name.ilike(f"%{brand}%"))
-    
-    if category:
-        query = query.filter(models.Product.category_name.ilike(f"%{category}%"))
-    
-    if min_price is not None:
-        query = query.filter(models.Product.sku_price >= min_price)
-    
-    if max_price is not None:
-        query = query.filter(models.Product.sku_price <= max_price)
-    
-    if with_stock is not None:
-        query = query.filter(models.Product.has_stock == with_stock)
-    
-    if with_images is not None:
-        query = query.filter(models.Product.has_main_image == with_images)
-    
-    if sku_partner_id:
-        query = query.filter(models.Product.sku_partner_id.ilike(f"%{sku_partner_id}%"))
-    
-    if ean:
-        query = query.filter(models.Product.sku_ean == ean)
-    
-    if characteristic_name:
-        query = query.filter(models.Product.characteristic_name.ilike(f"%{characteristic_name}%"))
+    query = db.query(models.Product).filter(*product_search_conditions(
+        title=title,
+        brand=brand,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        with_stock=with_stock,
+        with_images=with_images,
+        sku_partner_id=sku_partner_id,
+        ean=ean,
+        characteristic_name=characteristic_name,
+        characteristic_value=characteristic_value,
+    ))
     
-    if characteristic_value:
-        query = query.filter(models.Product.characteristic_value.ilike(f"%{characteristic_value}%"))
-    
-    products = query.offset(skip).limit(limit).all()
+    products = query_to_json(query.offset(skip).limit(limit))
     
     return {
         "total_found": query.count(),
@@ -809,4 +888,39 @@ def advanced_search_products(
             "characteristic_name": characteristic_name,
             "characteristic_value": characteristic_value
         }
-    }
\ No newline at end of file
+    }
+
+# =============================================================================
+# CACHE DE RESPOSTAS
+# =============================================================================
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Contadores de hit/miss do cache de respostas e versões conhecidas das entidades"""
+    return {
+        **response_cache.stats(),
+        "data_versions": data_versions.current(),
+    }
+
+@app.get("/database/routing")
+def get_database_routing():
+    """Réplicas de leitura configuradas, atraso medido e leituras por destino"""
+    return read_router.status()
+
+@app.get("/database/pools")
+def get_database_pools():
+    """Conexões em uso, espera por conexão (histograma em ms), overflow e timeouts de cada pool"""
+    return pool_metrics.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas no formato de texto do Prometheus"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/sql/profiles")
+def get_sql_profiles(only_flagged: bool = False, limit: int = 50):
+    """Perfil SQL dos últimos requests: consultas, tempo de banco, comandos mais lentos e N+1"""
+    profiles = list(recent_profiles)
+    if only_flagged:
+        profiles = [p for p in profiles if p["n_plus_one"] or p["slow_queries"]]
+    return {"profiles": profiles[-limit:][::-1]}
@@ -0,0 +1,320 @@
+"""
+Métricas no formato de texto do Prometheus.
+
+A API expõe o registro em GET /metrics: latência por rota, requests em
+andamento, consultas e tempo de banco por request, cache de respostas e
+pools de conexão. O daily_update.py grava o mesmo registro num arquivo para
+o textfile collector do node_exporter (--metrics-file ou METRICS_TEXTFILE),
+com registros buscados/gravados/ignorados por entidade, latência da API
+Anymarket, respostas 429 e duração das etapas.
+"""
+
+import os
+import threading
+import time
+
+from .sql_profiler import route_label, begin_profile, end_profile
+from .tracing import span
+
+METRICS_PREFIX = "anymarket"
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """[(sufixo, valores dos labels, labels extras, valor)]"""
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Espelha um contador mantido em outro lugar (ex: hits do cache)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, limit in enumerate(self.buckets):
+                if value <= limit:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for limit, count in zip(self.buckets, counts):
+                    result.append(("_bucket", key, (("le", _format_value(limit)),), count))
+                result.append(("_sum", key, (), total))
+                result.append(("_count", key, (), counts[-1]))
+        return result
+
+
+class MetricsRegistry:
+    """Famílias registradas por nome, mais coletores chamados a cada exposição."""
+
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = []
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        name = f"{self.prefix}_{name}"
+        if name not in self._metrics:
+            self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collect):
+        """collect() é chamada antes de cada exposição para atualizar gauges (ex: tamanho do cache)."""
+        self._collectors.append(collect)
+
+    def render(self, names=None):
+        for collect in self._collectors:
+            collect()
+        metrics = [m for n, m in sorted(self._metrics.items()) if names is None or n in names]
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def write_textfile(self, path, names=None):
+        """Grava no formato do textfile collector (escrita atômica: arquivo temporário + rename)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render(names))
+        os.replace(tmp, path)
+
+
+def read_textfile_value(path, metric):
+    """Valor de uma métrica sem labels num arquivo gravado por write_textfile; None se não estiver lá."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.strip().partition(" ")
+                if name == metric.name:
+                    return float(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+registry = MetricsRegistry()
+
+# --- API -------------------------------------------------------------------
+
+http_requests = registry.counter("http_requests_total", "Requests HTTP por rota, método e status", ("method", "route", "status"))
+http_latency = registry.histogram("http_request_duration_seconds", "Latência dos requests HTTP por rota", ("method", "route"))
+http_in_flight = registry.gauge("http_requests_in_flight", "Requests HTTP em andamento")
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request", "Consultas SQL por request", ("route",), buckets=QUERY_COUNT_BUCKETS
+)
+db_seconds_per_request = registry.histogram("db_seconds_per_request", "Tempo em consultas SQL por request", ("route",))
+sql_n_plus_one = registry.counter("sql_n_plus_one_requests_total", "Requests com comando SQL repetido (possível N+1)", ("route",))
+sql_slow_queries = registry.counter("sql_slow_queries_total", "Consultas SQL acima de SQL_SLOW_QUERY_MS", ("route",))
+
+# --- Sincronização (daily_update.py) ---------------------------------------
+
+sync_records_fetched = registry.counter("sync_records_fetched_total", "Registros recebidos da API Anymarket", ("entity",))
+sync_records_written = registry.counter("sync_records_written_total", "Registros gravados no banco", ("entity",))
+sync_records_skipped = registry.counter("sync_records_skipped_total", "Registros ignorados", ("entity", "reason"))
+api_latency = registry.histogram("api_request_duration_seconds", "Latência das chamadas à API Anymarket", ("endpoint",))
+api_responses = registry.counter("api_responses_total", "Respostas da API Anymarket por status", ("endpoint", "status"))
+api_rate_limited = registry.counter("api_rate_limited_total", "Respostas 429 da API Anymarket", ("endpoint",))
+sync_stage_seconds = registry.gauge("sync_stage_duration_seconds", "Duração da etapa na última sincronização", ("stage",))
+sync_last_success = registry.gauge("sync_last_success_timestamp_seconds", "Fim da última sincronização bem-sucedida (epoch)")
+sync_last_run_ok = registry.gauge("sync_last_run_success", "1 se a última sincronização terminou sem erro")
+sync_peak_rss = registry.gauge("sync_peak_rss_bytes", "Maior RSS do processo medido nas páginas da entidade", ("entity",))
+
+SYNC_FAMILIES = {m.name for m in (
+    sync_records_fetched, sync_records_written, sync_records_skipped, api_latency, api_responses,
+    api_rate_limited, sync_stage_seconds, sync_last_success, sync_last_run_ok, sync_peak_rss,
+)}
+
+
+class stage_timer:
+    """Context manager que grava a duração de uma etapa em sync_stage_duration_seconds (e abre um span da etapa)."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._span = span(stage, "stage")
+
+    def __enter__(self):
+        self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        sync_stage_seconds.set(round(time.perf_counter() - self._start, 3), stage=self.stage)
+        self._span.__exit__(*exc)
+        return False
+
+
+# --- Cache de respostas e pools (lidos a cada exposição) --------------------
+
+cache_requests = registry.counter("response_cache_requests_total", "Consultas ao cache de respostas", ("result",))
+cache_entries = registry.gauge("response_cache_entries", "Entradas no cache de respostas")
+cache_hit_ratio = registry.gauge("response_cache_hit_ratio", "Fração de hits do cache de respostas desde o início")
+pool_connections = registry.gauge("db_pool_connections", "Conexões do pool por estado", ("pool", "state"))
+pool_checkouts = registry.counter("db_pool_checkouts_total", "Checkouts de conexão", ("pool",))
+pool_wait_seconds = registry.counter("db_pool_wait_seconds_total", "Tempo total de espera por conexão", ("pool",))
+pool_overflow_events = registry.counter("db_pool_overflow_events_total", "Conexões abertas além do pool_size", ("pool",))
+pool_timeouts = registry.counter("db_pool_timeouts_total", "Checkouts que estouraram o pool_timeout", ("pool",))
+
+
+def collect_runtime(response_cache, pool_metrics):
+    """Copia os contadores do cache de respostas e dos pools para o registro."""
+    stats = response_cache.stats()
+    for result in ("hits", "misses", "not_modified", "evictions", "expirations", "invalidations"):
+        cache_requests.set_total(stats[result], result=result)
+    cache_entries.set(stats["size"])
+    cache_hit_ratio.set(round(stats["hit_rate"], 4))
+
+    for name, pool in pool_metrics.snapshot().items():
+        pool_connections.set(pool["checked_out"], pool=name, state="checked_out")
+        pool_connections.set(pool["idle"], pool=name, state="idle")
+        pool_connections.set(pool["overflow"], pool=name, state="overflow")
+        pool_checkouts.set_total(pool["checkouts"], pool=name)
+        pool_wait_seconds.set_total(pool["wait_seconds_total"], pool=name)
+        pool_overflow_events.set_total(pool["overflow_events"], pool=name)
+        pool_timeouts.set_total(pool["timeouts"], pool=name)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: latência, status, requests em andamento e uso do banco
+    por rota. O perfil SQL do request (app.sql_profiler) começa aqui, para
+    incluir tudo o que roda dentro.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        profile, token = begin_profile()
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            end_profile(token)
+
+            route = route_label(scope)
+            method = scope.get("method", "")
+            http_requests.inc(method=method, route=route, status=status["code"])
+            http_latency.observe(elapsed, method=method, route=route)
+            db_queries_per_request.observe(profile.queries, route=route)
+            db_seconds_per_request.observe(profile.seconds, route=route)
+            if profile.n_plus_one():
+                sql_n_plus_one.inc(route=route)
+            if profile.slow:
+                sql_slow_queries.inc(len(profile.slow), route=route)
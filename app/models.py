@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, JSON
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, Date, Text, Boolean, JSON, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
 from sqlalchemy.dialects.postgresql import JSONB
@@ -6,6 +7,11 @@ from sqlalchemy.dialects.postgresql import JSONB
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Busca por containment (@>) nos arrays JSONB
+        Index("ix_products_skus_gin", "skus", postgresql_using="gin", postgresql_ops={"skus": "jsonb_path_ops"}),
+        Index("ix_products_characteristics_gin", "characteristics", postgresql_using="gin", postgresql_ops={"characteristics": "jsonb_path_ops"}),
+    )
     
     # Campos básicos
     id = Column(Integer, primary_key=True, index=True)
@@ -15,12 +21,13 @@ class Product(Base):
     external_id_product = Column(String)
     
     # Category expandida (objeto category → colunas individuais)
-    category_id = Column(String)
+    # Os IDs referenciam as tabelas de dimensão (categories, brands, nbms, origins)
+    category_id = Column(String, index=True)
     category_name = Column(String)
     category_path = Column(String)
     
     # Brand expandida (objeto brand → colunas individuais)
-    brand_id = Column(String)
+    brand_id = Column(String, index=True)
     brand_name = Column(String)
     brand_reduced_name = Column(String)
     brand_partner_id = Column(String)
@@ -132,9 +139,9 @@ class Product(Base):
     # ========================================================================
     # DADOS JSON COMPLETOS (para referência completa)
     # ========================================================================
-    characteristics = Column(JSON)  # Array completo de características
-    images = Column(JSON)  # Array completo de imagens
-    skus = Column(JSON)  # Array completo de SKUs
+    characteristics = Column(JSONB)  # Array completo de características
+    images = Column(JSONB)  # Array completo de imagens
+    skus = Column(JSONB)  # Array completo de SKUs
     
     # Status de sincronização
     sync_status = Column(String, default="pending")
@@ -152,6 +159,13 @@ class Product(Base):
 # Manter a classe Order inalterada (já está completa)
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Listagens e filtros por marketplace dentro de um período
+        Index("ix_orders_marketplace_created", "marketplace", "created_at_anymarket"),
+        # Busca por containment (@>) nos itens e pagamentos
+        Index("ix_orders_items_data_gin", "items_data", postgresql_using="gin", postgresql_ops={"items_data": "jsonb_path_ops"}),
+        Index("ix_orders_payments_data_gin", "payments_data", postgresql_using="gin", postgresql_ops={"payments_data": "jsonb_path_ops"}),
+    )
     
     # Campos básicos
     id = Column(Integer, primary_key=True, index=True)
@@ -160,22 +174,19 @@ class Order(Base):
     market_place_id = Column(String)
     market_place_number = Column(String)
     partner_id = Column(String)
-    marketplace = Column(String)
+    marketplace = Column(String, index=True)
     sub_channel = Column(String)
     sub_channel_normalized = Column(String)
     
     # Datas importantes
-    created_at_anymarket = Column(DateTime)
+    created_at_anymarket = Column(DateTime, index=True)
     payment_date = Column(DateTime)
     cancel_date = Column(DateTime)
     
     # Status e informações do pedido
+    # (status, market_place_*_status e tracking_* ficam em order_states)
     shipping_option_id = Column(String)
     transmission_status = Column(String)
-    status = Column(String)
-    market_place_status = Column(String)
-    market_place_status_complement = Column(String)
-    market_place_shipment_status = Column(String)
     
     # Documentos e intermediários
     document_intermediator = Column(String)
@@ -272,18 +283,6 @@ class Order(Base):
     buyer_date_of_birth = Column(DateTime)
     buyer_company_state_tax_id = Column(String)
     
-    # Tracking (rastreamento) - expandido
-    tracking_carrier = Column(String)
-    tracking_date = Column(DateTime)
-    tracking_delivered_date = Column(DateTime)
-    tracking_estimate_date = Column(DateTime)
-    tracking_number = Column(String)
-    tracking_shipped_date = Column(DateTime)
-    tracking_url = Column(String)
-    tracking_carrier_document = Column(String)
-    tracking_buffering_date = Column(DateTime)
-    tracking_delivery_status = Column(String)
-    
     # Pickup (retirada) - expandido
     pickup_id = Column(Integer)
     pickup_description = Column(String)
@@ -350,8 +349,8 @@ class Order(Base):
     total_payments_value = Column(Float, default=0)
     
     # DADOS JSON COMPLETOS
-    items_data = Column(JSON)
-    payments_data = Column(JSON)
+    items_data = Column(JSONB)
+    payments_data = Column(JSONB)
     shippings_data = Column(JSON)
     stocks_data = Column(JSON)
     metadata_extra = Column(JSON)
@@ -359,10 +358,46 @@ class Order(Base):
     # Metadados do sistema
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Status e tracking (order_states), carregados junto com o pedido
+    state = relationship(
+        "OrderState",
+        primaryjoin="foreign(OrderState.order_anymarket_id) == Order.anymarket_id",
+        uselist=False,
+        lazy="joined",
+    )
     
     def __repr__(self):
         return f"<Order(anymarket_id='{self.anymarket_id}', status='{self.status}', total={self.total})>"
 
+# Campos de Order que mudam a cada etapa do pedido e ficam em order_states
+ORDER_STATE_FIELDS = (
+    "status",
+    "market_place_status",
+    "market_place_status_complement",
+    "market_place_shipment_status",
+    "tracking_carrier",
+    "tracking_date",
+    "tracking_delivered_date",
+    "tracking_estimate_date",
+    "tracking_number",
+    "tracking_shipped_date",
+    "tracking_url",
+    "tracking_carrier_document",
+    "tracking_buffering_date",
+    "tracking_delivery_status",
+)
+
+
+def _order_state_attribute(name):
+    def getter(self):
+        return getattr(self.state, name) if self.state is not None else None
+    return property(getter)
+
+
+for _name in ORDER_STATE_FIELDS:
+    setattr(Order, _name, _order_state_attribute(_name))
+
 class Stock(Base):
     __tablename__ = "stocks"
     
@@ -515,6 +550,9 @@ class Transmission(Base):
     Endpoint: /transmissions
     """
     __tablename__ = "transmissions"
+    __table_args__ = (
+        Index("ix_transmissions_sku_data_gin", "sku_data", postgresql_using="gin", postgresql_ops={"sku_data": "jsonb_path_ops"}),
+    )
     
     # Chave primária interna
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -599,14 +637,14 @@ class Transmission(Base):
     main_image_url = Column(Text, nullable=True)
     
     # Dados JSON completos
-    category_data = Column(JSON, nullable=True)
-    brand_data = Column(JSON, nullable=True)
-    product_data = Column(JSON, nullable=True)
-    nbm_data = Column(JSON, nullable=True)
-    origin_data = Column(JSON, nullable=True)
-    sku_data = Column(JSON, nullable=True)
-    characteristics_data = Column(JSON, nullable=True)
-    images_data = Column(JSON, nullable=True)
+    category_data = Column(JSONB, nullable=True)
+    brand_data = Column(JSONB, nullable=True)
+    product_data = Column(JSONB, nullable=True)
+    nbm_data = Column(JSONB, nullable=True)
+    origin_data = Column(JSONB, nullable=True)
+    sku_data = Column(JSONB, nullable=True)
+    characteristics_data = Column(JSONB, nullable=True)
+    images_data = Column(JSONB, nullable=True)
     
     # Campos de controle
     sync_status = Column(String(50), nullable=True, default='synced')
@@ -615,4 +653,329 @@ class Transmission(Base):
     updated_at = Column(DateTime, nullable=True, onupdate=func.now())
     
     def __repr__(self):
-        return f"<Transmission(id={self.id}, anymarket_id={self.anymarket_id}, status={self.status})>"
\ No newline at end of file
+        return f"<Transmission(id={self.id}, anymarket_id={self.anymarket_id}, status={self.status})>"
+
+class ProductSku(Base):
+    """Um SKU (variação) de produto por linha, a partir de products.skus."""
+    __tablename__ = "product_skus"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_anymarket_id = Column(String, nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+
+    sku_id = Column(String, index=True)
+    partner_id = Column(String, index=True)
+    ean = Column(String, index=True)
+    title = Column(String)
+    price = Column(Float)
+    amount = Column(Integer)
+    additional_time = Column(Integer)
+    stock_local_id = Column(String)
+    variations = Column(JSON)
+
+    def __repr__(self):
+        return f"<ProductSku(product={self.product_anymarket_id}, partner_id='{self.partner_id}', ean='{self.ean}')>"
+
+class ProductImage(Base):
+    """Uma imagem de produto por linha, a partir de products.images."""
+    __tablename__ = "product_images"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_anymarket_id = Column(String, nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+
+    image_id = Column(String)
+    index = Column(Integer)
+    main = Column(Boolean, default=False)
+    url = Column(String)
+    thumbnail_url = Column(String)
+    low_resolution_url = Column(String)
+    standard_url = Column(String)
+    original_image = Column(String)
+    status = Column(String, index=True)
+    standard_width = Column(Integer)
+    standard_height = Column(Integer)
+    original_width = Column(Integer)
+    original_height = Column(Integer)
+
+    def __repr__(self):
+        return f"<ProductImage(product={self.product_anymarket_id}, index={self.index}, main={self.main})>"
+
+class ProductCharacteristic(Base):
+    """Uma característica de produto por linha, a partir de products.characteristics."""
+    __tablename__ = "product_characteristics"
+    __table_args__ = (
+        Index("ix_product_characteristics_name_value", "name", "value"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_anymarket_id = Column(String, nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+
+    index = Column(Integer)
+    name = Column(String)
+    value = Column(String)
+
+    def __repr__(self):
+        return f"<ProductCharacteristic(product={self.product_anymarket_id}, name='{self.name}', value='{self.value}')>"
+
+class OrderItem(Base):
+    """Um item de pedido por linha, a partir de orders.items_data."""
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_anymarket_id = Column(String, nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+
+    product_id = Column(String)
+    product_title = Column(String)
+    sku_id = Column(String, index=True)
+    sku_title = Column(String)
+    sku_partner_id = Column(String, index=True)
+    sku_ean = Column(String, index=True)
+
+    amount = Column(Float)
+    unit = Column(Float)
+    gross = Column(Float)
+    total = Column(Float)
+    discount = Column(Float)
+
+    id_in_marketplace = Column(String)
+    order_item_id = Column(String)
+    free_shipping = Column(Boolean, default=False)
+    is_catalog = Column(Boolean, default=False)
+
+    def __repr__(self):
+        return f"<OrderItem(order={self.order_anymarket_id}, sku_partner_id='{self.sku_partner_id}', amount={self.amount})>"
+
+class OrderPayment(Base):
+    """Um pagamento de pedido por linha, a partir de orders.payments_data."""
+    __tablename__ = "order_payments"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_anymarket_id = Column(String, nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+
+    method = Column(String)
+    status = Column(String)
+    value = Column(Float)
+    installments = Column(Integer)
+    marketplace_id = Column(String)
+    payment_method_normalized = Column(String, index=True)
+    payment_detail_normalized = Column(String)
+
+    def __repr__(self):
+        return f"<OrderPayment(order={self.order_anymarket_id}, method='{self.method}', value={self.value})>"
+
+class OrderState(Base):
+    """
+    Status e tracking de um pedido, separados da linha larga de orders.
+    A sincronização atualiza esta linha estreita quando só o andamento do
+    pedido muda; o fillfactor deixa espaço para updates HOT.
+    """
+    __tablename__ = "order_states"
+    __table_args__ = {"postgresql_with": {"fillfactor": 70}}
+
+    order_anymarket_id = Column(String, primary_key=True)
+
+    status = Column(String, index=True)
+    market_place_status = Column(String)
+    market_place_status_complement = Column(String)
+    market_place_shipment_status = Column(String)
+
+    tracking_carrier = Column(String)
+    tracking_date = Column(DateTime)
+    tracking_delivered_date = Column(DateTime)
+    tracking_estimate_date = Column(DateTime)
+    tracking_number = Column(String)
+    tracking_shipped_date = Column(DateTime)
+    tracking_url = Column(String)
+    tracking_carrier_document = Column(String)
+    tracking_buffering_date = Column(DateTime)
+    tracking_delivery_status = Column(String)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<OrderState(order={self.order_anymarket_id}, status='{self.status}')>"
+
+class OrderDailyRollup(Base):
+    """
+    Agregado diário de pedidos por marketplace e status.
+    Mantido incrementalmente por save_orders; os dashboards de receita leem
+    daqui em vez de varrer a tabela orders.
+    """
+    __tablename__ = "order_daily_rollup"
+    __table_args__ = (
+        UniqueConstraint("marketplace", "status", "day", name="uq_order_daily_rollup_key"),
+        Index("ix_order_daily_rollup_day", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    marketplace = Column(String, nullable=False, default="")
+    status = Column(String, nullable=False, default="")
+    day = Column(Date, nullable=False)
+
+    orders_count = Column(Integer, nullable=False, default=0)
+    gross = Column(Float, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0)
+    freight = Column(Float, nullable=False, default=0)
+
+    updated_at = Column(DateTime, nullable=True, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<OrderDailyRollup(marketplace={self.marketplace}, status={self.status}, day={self.day}, orders={self.orders_count})>"
+
+class SkuSalesDaily(Base):
+    """
+    Vendas diárias por SKU (partner ID) e marketplace, a partir de todos os
+    itens de items_data. Mantida incrementalmente por save_orders.
+    """
+    __tablename__ = "sku_sales_daily"
+    __table_args__ = (
+        UniqueConstraint("sku_partner_id", "marketplace", "day", name="uq_sku_sales_daily_key"),
+        Index("ix_sku_sales_daily_day", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sku_partner_id = Column(String, nullable=False)
+    marketplace = Column(String, nullable=False, default="")
+    day = Column(Date, nullable=False)
+
+    units = Column(Float, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    discount = Column(Float, nullable=False, default=0)
+
+    updated_at = Column(DateTime, nullable=True, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SkuSalesDaily(sku={self.sku_partner_id}, marketplace={self.marketplace}, day={self.day}, units={self.units})>"
+
+class DataVersion(Base):
+    """
+    Contador de versão por entidade, incrementado a cada commit da sincronização.
+    Usado pela API para invalidar o cache de respostas.
+    """
+    __tablename__ = "data_versions"
+
+    entity = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True, server_default=func.now())
+
+    def __repr__(self):
+        return f"<DataVersion(entity={self.entity}, version={self.version})>"
+
+class Brand(Base):
+    """Dimensão de marcas, pelo ID da Anymarket (products.brand_id)."""
+    __tablename__ = "brands"
+
+    anymarket_id = Column(String, primary_key=True)
+    name = Column(String, index=True)
+    reduced_name = Column(String)
+    partner_id = Column(String)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Brand(anymarket_id={self.anymarket_id}, name='{self.name}')>"
+
+class Category(Base):
+    """Dimensão de categorias, pelo ID da Anymarket (products.category_id)."""
+    __tablename__ = "categories"
+
+    anymarket_id = Column(String, primary_key=True)
+    name = Column(String, index=True)
+    path = Column(String)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Category(anymarket_id={self.anymarket_id}, name='{self.name}')>"
+
+class Nbm(Base):
+    """Dimensão de NBM, pelo ID da Anymarket (products.nbm_id)."""
+    __tablename__ = "nbms"
+
+    anymarket_id = Column(String, primary_key=True)
+    description = Column(Text)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Nbm(anymarket_id={self.anymarket_id})>"
+
+class Origin(Base):
+    """Dimensão de origem, pelo ID da Anymarket (products.origin_id)."""
+    __tablename__ = "origins"
+
+    anymarket_id = Column(String, primary_key=True)
+    description = Column(String)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Origin(anymarket_id={self.anymarket_id})>"
+
+class SyncRun(Base):
+    """Uma execução do daily_update.py: status, duração e tempo de cada etapa."""
+    __tablename__ = "sync_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime)
+    status = Column(String(20), nullable=False)
+    error = Column(Text)
+    duration_seconds = Column(Float)
+    total_records = Column(Integer, nullable=False, default=0)
+    stage_seconds = Column(JSON)  # {etapa: segundos} (products, orders, snapshot...)
+
+    def __repr__(self):
+        return f"<SyncRun(id={self.id}, started_at={self.started_at}, status='{self.status}')>"
+
+class SyncRunEntity(Base):
+    """Números de uma entidade numa execução (sync_runs.id): páginas, chamadas à API, registros e tempos."""
+    __tablename__ = "sync_run_entities"
+    __table_args__ = (
+        UniqueConstraint("run_id", "entity", name="uq_sync_run_entities_key"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(Integer, nullable=False, index=True)
+    entity = Column(String(50), nullable=False)
+
+    pages = Column(Integer, nullable=False, default=0)
+    api_calls = Column(Integer, nullable=False, default=0)
+    api_bytes = Column(BigInteger, nullable=False, default=0)
+    rate_limited = Column(Integer, nullable=False, default=0)
+    fetched = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+
+    fetch_seconds = Column(Float, nullable=False, default=0)
+    transform_seconds = Column(Float, nullable=False, default=0)
+    write_seconds = Column(Float, nullable=False, default=0)
+    duration_seconds = Column(Float)
+    records_per_second = Column(Float)
+    peak_rss_bytes = Column(BigInteger)
+
+    def __repr__(self):
+        return f"<SyncRunEntity(run={self.run_id}, entity='{self.entity}', fetched={self.fetched})>"
+
+class SyncDeadLetter(Base):
+    """Registro da API que não pôde ser gravado: payload original e o erro, para --retry-dead-letters."""
+    __tablename__ = "sync_dead_letters"
+    __table_args__ = (
+        Index("ix_sync_dead_letters_pending", "entity", "resolved_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(50), nullable=False)
+    anymarket_id = Column(String, index=True)
+    payload = Column(JSON, nullable=False)  # registro como veio da API
+    error = Column(Text)
+    error_type = Column(String(100))
+    attempts = Column(Integer, nullable=False, default=0)
+    first_failed_at = Column(DateTime, nullable=False)
+    last_failed_at = Column(DateTime, nullable=False)
+    resolved_at = Column(DateTime)  # preenchido quando o reprocessamento grava o registro
+
+    def __repr__(self):
+        return f"<SyncDeadLetter(entity='{self.entity}', anymarket_id='{self.anymarket_id}', attempts={self.attempts})>"
@@ -0,0 +1,200 @@
+"""
+Endpoints de consulta de pedidos.
+
+A listagem usa os índices de orders (marketplace, created_at_anymarket) e de
+order_states (status) e seleciona só as colunas de OrderSummary. Quando o
+período passa da janela quente, completa a página com os pedidos arquivados
+em Parquet (app.archive).
+As estatísticas leem de order_daily_rollup, mantida incrementalmente por
+save_orders, sem varrer orders.
+"""
+
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .archive import order_archive
+from .cache import cached
+from .database import get_read_db
+from .filters import order_search_conditions, orders_containing_sku
+from .order_state import order_column, order_select_columns, with_order_state
+from .schemas import OrderSummary
+from .serialization import mapping_to_json, rows_to_json
+
+router = APIRouter(tags=["orders"])
+
+ORDER_SUMMARY_COLUMNS = tuple(order_column(name) for name in OrderSummary.model_fields)
+
+
+def rollup_conditions(
+    marketplace: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """Mesmos filtros de order_search_conditions, aplicados sobre order_daily_rollup"""
+    Rollup = models.OrderDailyRollup
+    conditions = []
+    if marketplace:
+        conditions.append(Rollup.marketplace == marketplace)
+    if status:
+        conditions.append(Rollup.status == status)
+    if date_from is not None:
+        conditions.append(Rollup.day >= date_from)
+    if date_to is not None:
+        conditions.append(Rollup.day < date_to)
+    return conditions
+
+
+def _rollup_totals():
+    Rollup = models.OrderDailyRollup
+    return (
+        func.sum(Rollup.orders_count).label("orders_count"),
+        func.sum(Rollup.gross).label("gross"),
+        func.sum(Rollup.total).label("total"),
+        func.sum(Rollup.freight).label("freight"),
+    )
+
+
+def _totals_dict(row):
+    return {
+        "orders_count": int(row.orders_count or 0),
+        "gross": float(row.gross or 0),
+        "total": float(row.total or 0),
+        "freight": float(row.freight or 0),
+    }
+
+
+@router.get("/orders")
+@cached("orders")
+def list_orders(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    marketplace: Optional[str] = Query(None, description="Marketplace"),
+    status: Optional[str] = Query(None, description="Status do pedido"),
+    date_from: Optional[datetime] = Query(None, description="Criado a partir de (created_at_anymarket)"),
+    date_to: Optional[datetime] = Query(None, description="Criado antes de (created_at_anymarket, exclusivo)"),
+    db: Session = Depends(get_read_db),
+):
+    """Lista pedidos (resumo) filtrando por marketplace, status e período, do mais recente ao mais antigo"""
+    query = with_order_state(db.query(*ORDER_SUMMARY_COLUMNS)).filter(*order_search_conditions(
+        marketplace=marketplace,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+    ))
+    rows = query.order_by(
+        models.Order.created_at_anymarket.desc(), models.Order.id.desc()
+    ).offset(skip).limit(limit).all()
+
+    if len(rows) == limit or not order_archive.reaches(date_from):
+        return rows_to_json(rows, ())
+
+    # Os arquivados são todos mais antigos que os do banco: continuam a ordenação
+    archived = order_archive.list_orders(
+        OrderSummary.model_fields,
+        marketplace=marketplace,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+        offset=max(0, skip - query.count()),
+        limit=limit - len(rows),
+    )
+    return [row._asdict() for row in rows] + archived
+
+
+@router.get("/orders/containing-sku")
+@cached("orders")
+def list_orders_containing_sku(
+    sku_partner_id: Optional[str] = Query(None, description="Partner ID do SKU"),
+    ean: Optional[str] = Query(None, description="EAN do SKU"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+):
+    """Pedidos com algum item desse SKU (containment JSONB em items_data, índice GIN)"""
+    if not sku_partner_id and not ean:
+        raise HTTPException(status_code=400, detail="Informe sku_partner_id ou ean")
+    rows = with_order_state(db.query(*ORDER_SUMMARY_COLUMNS)).filter(
+        orders_containing_sku(partner_id=sku_partner_id, ean=ean)
+    ).order_by(
+        models.Order.created_at_anymarket.desc(), models.Order.id.desc()
+    ).offset(skip).limit(limit).all()
+    return rows_to_json(rows, ())
+
+
+@router.get("/orders/{anymarket_id}")
+@cached("orders")
+def get_order(anymarket_id: str, db: Session = Depends(get_read_db)):
+    """Pedido completo pelo ID da Anymarket (procura também no arquivo de pedidos frios)"""
+    columns, raw_keys = order_select_columns()
+    row = with_order_state(db.query(*columns)).filter(models.Order.anymarket_id == anymarket_id).first()
+    order = mapping_to_json(row._mapping, raw_keys) if row is not None else None
+    if order is None:
+        order = order_archive.get_order(anymarket_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Pedido não encontrado")
+    return order
+
+
+@router.get("/stats/orders/daily")
+@cached("orders")
+def get_orders_daily(
+    marketplace: Optional[str] = Query(None, description="Marketplace"),
+    status: Optional[str] = Query(None, description="Status do pedido"),
+    date_from: Optional[date] = Query(None, description="Dia inicial"),
+    date_to: Optional[date] = Query(None, description="Dia final (exclusivo)"),
+    by_marketplace: bool = Query(False, description="Separar por marketplace"),
+    db: Session = Depends(get_read_db),
+):
+    """Pedidos, receita bruta, total e frete por dia (order_daily_rollup)"""
+    Rollup = models.OrderDailyRollup
+    group_by = [Rollup.day, Rollup.marketplace] if by_marketplace else [Rollup.day]
+
+    rows = db.query(*group_by, *_rollup_totals()).filter(*rollup_conditions(
+        marketplace=marketplace,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+    )).group_by(*group_by).order_by(*group_by).all()
+
+    days = []
+    for row in rows:
+        item = {"day": row.day}
+        if by_marketplace:
+            item["marketplace"] = row.marketplace
+        item.update(_totals_dict(row))
+        days.append(item)
+
+    return {"days": days}
+
+
+@router.get("/stats/orders/summary")
+@cached("orders")
+def get_orders_summary(
+    date_from: Optional[date] = Query(None, description="Dia inicial"),
+    date_to: Optional[date] = Query(None, description="Dia final (exclusivo)"),
+    db: Session = Depends(get_read_db),
+):
+    """Totais de pedidos no período, por marketplace e por status (order_daily_rollup)"""
+    Rollup = models.OrderDailyRollup
+    conditions = rollup_conditions(date_from=date_from, date_to=date_to)
+
+    overall = db.query(*_rollup_totals()).filter(*conditions).one()
+    by_marketplace = db.query(Rollup.marketplace, *_rollup_totals()).filter(
+        *conditions
+    ).group_by(Rollup.marketplace).order_by(func.sum(Rollup.total).desc()).all()
+    by_status = db.query(Rollup.status, *_rollup_totals()).filter(
+        *conditions
+    ).group_by(Rollup.status).order_by(func.sum(Rollup.orders_count).desc()).all()
+
+    return {
+        "totals": _totals_dict(overall),
+        "by_marketplace": {row.marketplace: _totals_dict(row) for row in by_marketplace},
+        "by_status": {row.status: _totals_dict(row) for row in by_status},
+        "period": {"date_from": date_from, "date_to": date_to},
+    }
@@ -0,0 +1,109 @@
+"""
+Status e tracking de pedidos em order_states (tabela estreita ao lado de orders).
+
+O status e o tracking de um pedido mudam a cada etapa, o resto da linha de
+orders (cerca de 200 colunas e os JSON) quase nunca. Separados, a
+sincronização só reescreve a linha larga quando algum campo dela mudou; o
+andamento do pedido é atualizado em order_states.
+
+Leituras que precisam do pedido lógico inteiro usam with_order_state() (LEFT
+JOIN) e order_column(); objetos Order carregam o estado pela relação
+Order.state, e order.status etc. continuam funcionando.
+"""
+
+from datetime import datetime, timezone
+import functools
+
+from sqlalchemy import case, func, select
+
+from . import models
+from .models import ORDER_STATE_FIELDS
+from .serialization import json_select_columns
+
+
+def order_state_join():
+    return models.OrderState.order_anymarket_id == models.Order.anymarket_id
+
+
+def with_order_state(query):
+    """LEFT JOIN de orders com order_states numa Query ou Select que parte de orders."""
+    return query.select_from(models.Order).outerjoin(models.OrderState, order_state_join())
+
+
+def order_column(name):
+    """Coluna do pedido lógico pelo nome, em orders ou em order_states."""
+    model = models.OrderState if name in ORDER_STATE_FIELDS else models.Order
+    return getattr(model, name)
+
+
+def order_state_columns():
+    return tuple(getattr(models.OrderState, name) for name in ORDER_STATE_FIELDS)
+
+
+@functools.lru_cache(maxsize=None)
+def order_select_columns():
+    """Como json_select_columns(Order), com os campos de order_states no fim."""
+    columns, raw_keys = json_select_columns(models.Order)
+    return columns + order_state_columns(), raw_keys
+
+
+def select_order_rows(*columns):
+    """SELECT das colunas informadas (padrão: pedido completo) a partir de orders + order_states."""
+    columns = columns or order_select_columns()[0]
+    return with_order_state(select(*columns))
+
+
+def order_changed_at():
+    """Última alteração do pedido lógico: a mais recente entre orders e order_states."""
+    order_at = func.coalesce(models.Order.updated_at, models.Order.created_at)
+    state_at = models.OrderState.updated_at
+    return case((state_at > order_at, state_at), else_=order_at)
+
+
+def split_order_fields(fields):
+    """Separa os campos de _build_order_fields em (campos de orders, campos de order_states)."""
+    order_fields = {k: v for k, v in fields.items() if k not in ORDER_STATE_FIELDS}
+    state_fields = {k: v for k, v in fields.items() if k in ORDER_STATE_FIELDS}
+    return order_fields, state_fields
+
+
+def _stored_value(value):
+    """Valor como fica numa coluna DateTime sem fuso: datetime com fuso vira UTC sem tzinfo."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _same_value(current, new):
+    return _stored_value(current) == _stored_value(new)
+
+
+def assign_changed(obj, fields):
+    """
+    Atribui só os campos com valor diferente do atual. Retorna se algo mudou.
+    Datetimes com fuso são gravados em UTC sem tzinfo, a mesma convenção da comparação.
+    """
+    changed = False
+    for key, value in fields.items():
+        if not _same_value(getattr(obj, key), value):
+            setattr(obj, key, _stored_value(value))
+            changed = True
+    return changed
+
+
+def save_order_state(db, order, anymarket_id, state_fields):
+    """
+    Grava os campos de order_states do pedido, atualizando a linha existente
+    só quando algo mudou (sem commit). `order` é o Order já carregado ou None
+    para pedido novo. Retorna se a linha foi criada ou alterada.
+    """
+    state = order.state if order is not None else None
+    if state is None:
+        state = db.get(models.OrderState, anymarket_id)
+    if state is None:
+        db.add(models.OrderState(order_anymarket_id=anymarket_id, updated_at=datetime.now(), **state_fields))
+        return True
+    if assign_changed(state, state_fields):
+        state.updated_at = datetime.now()
+        return True
+    return False
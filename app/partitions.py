@@ -0,0 +1,308 @@
+"""
+Particionamento mensal da tabela orders por created_at_anymarket (PostgreSQL).
+
+- partition_orders_table(): conversão única da tabela orders comum para uma
+  tabela particionada por RANGE, copiando os dados.
+- order_partitions.ensure_for(): cria sob demanda as partições dos meses de
+  uma página antes do save_orders inserir, então o INSERT/UPDATE pela tabela
+  pai sempre encontra a partição certa. Pedidos sem data ficam em orders_default.
+- detach_order_partitions(): desanexa partições antigas (operação só de
+  metadados); a tabela desanexada continua existindo para arquivo ou DROP.
+
+Índices únicos numa tabela particionada precisam incluir a chave de
+partição, então id e anymarket_id só são únicos por partição. Para manter
+anymarket_id único na tabela toda, triggers em orders mantêm order_keys
+(anymarket_id como chave primária): um mesmo anymarket_id em duas partições
+falha com violação de unicidade, como na tabela comum. id vem da sequência
+e não é repetido pela aplicação.
+
+Em bancos que não são PostgreSQL ou com orders ainda não particionada, as
+funções de manutenção não fazem nada.
+"""
+
+from datetime import date, datetime, timedelta
+import logging
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+ORDER_PARTITION_MONTHS_AHEAD = int(os.getenv("ORDER_PARTITION_MONTHS_AHEAD", "3"))
+
+PARENT_TABLE = "orders"
+DEFAULT_PARTITION = "orders_default"
+ORDER_KEYS_TABLE = "order_keys"
+_PARTITION_NAME = re.compile(r"^orders_y(\d{4})m(\d{2})$")
+
+
+def month_start(value):
+    """Primeiro dia do mês de uma data/datetime."""
+    return date(value.year, value.month, 1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def previous_month(month):
+    return date(month.year - 1, 12, 1) if month.month == 1 else date(month.year, month.month - 1, 1)
+
+
+def partition_name(month):
+    return f"orders_y{month.year:04d}m{month.month:02d}"
+
+
+def parse_partition_name(name):
+    """Mês de uma partição mensal pelo nome; None para orders_default e outras tabelas."""
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _is_postgres(db):
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def is_orders_partitioned(db):
+    if not _is_postgres(db):
+        return False
+    relkind = db.execute(text(
+        "SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalar()
+    return relkind == "p"
+
+
+def list_order_partitions(db):
+    """Nomes das partições anexadas a orders."""
+    return [row[0] for row in db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+    ), {"table": PARENT_TABLE})]
+
+
+def _partition_local_indexes(db, name):
+    # Unicidade de id e anymarket_id é garantida por partição: índices únicos
+    # na tabela pai teriam que incluir created_at_anymarket
+    db.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_id_key ON {name} (id)"))
+    db.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_anymarket_id_key ON {name} (anymarket_id)"))
+
+
+def create_order_partition(db, month):
+    """Cria a partição de um mês, se ainda não existir (sem commit)."""
+    name = partition_name(month)
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    ))
+    _partition_local_indexes(db, name)
+    return name
+
+
+def ensure_order_keys(db):
+    """Cria (ou recria) order_keys, preenchida com os anymarket_id atuais, e os triggers que a mantêm (sem commit)."""
+    db.execute(text(f"CREATE TABLE IF NOT EXISTS {ORDER_KEYS_TABLE} (anymarket_id VARCHAR PRIMARY KEY)"))
+    duplicated = db.execute(text(
+        f"SELECT count(*) FROM (SELECT anymarket_id FROM {PARENT_TABLE} "
+        f"WHERE anymarket_id IS NOT NULL GROUP BY anymarket_id HAVING count(*) > 1) d"
+    )).scalar()
+    if duplicated:
+        logger.warning(f"orders tem {duplicated} anymarket_id repetidos entre partições; order_keys guarda uma vez cada")
+    db.execute(text(
+        f"INSERT INTO {ORDER_KEYS_TABLE} (anymarket_id) SELECT anymarket_id FROM {PARENT_TABLE} "
+        f"WHERE anymarket_id IS NOT NULL ON CONFLICT DO NOTHING"
+    ))
+    # Um UPDATE que muda a partição vira DELETE + INSERT e dispara os dois triggers
+    db.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {ORDER_KEYS_TABLE}_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.anymarket_id IS NOT NULL THEN
+                DELETE FROM {ORDER_KEYS_TABLE} WHERE anymarket_id = OLD.anymarket_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.anymarket_id IS NOT NULL THEN
+                INSERT INTO {ORDER_KEYS_TABLE} (anymarket_id) VALUES (NEW.anymarket_id);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    db.execute(text(f"DROP TRIGGER IF EXISTS {PARENT_TABLE}_keys_insert_delete ON {PARENT_TABLE}"))
+    db.execute(text(f"DROP TRIGGER IF EXISTS {PARENT_TABLE}_keys_update ON {PARENT_TABLE}"))
+    db.execute(text(
+        f"CREATE TRIGGER {PARENT_TABLE}_keys_insert_delete AFTER INSERT OR DELETE ON {PARENT_TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {ORDER_KEYS_TABLE}_sync()"
+    ))
+    db.execute(text(
+        f"CREATE TRIGGER {PARENT_TABLE}_keys_update AFTER UPDATE OF anymarket_id ON {PARENT_TABLE} "
+        f"FOR EACH ROW WHEN (OLD.anymarket_id IS DISTINCT FROM NEW.anymarket_id) EXECUTE FUNCTION {ORDER_KEYS_TABLE}_sync()"
+    ))
+
+
+def forget_order_keys(db, table):
+    """Remove de order_keys os pedidos de uma partição desanexada (DETACH não dispara os triggers)."""
+    if db.execute(text("SELECT to_regclass(:table)"), {"table": ORDER_KEYS_TABLE}).scalar() is None:
+        return
+    db.execute(text(
+        f"DELETE FROM {ORDER_KEYS_TABLE} k USING {table} p WHERE k.anymarket_id = p.anymarket_id"
+    ))
+
+
+def _create_parent_indexes(db):
+    dialect = db.get_bind().dialect
+    for index in models.Order.__table__.indexes:
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+        db.execute(text(ddl.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1)))
+
+
+class OrderPartitionManager:
+    """Guarda em memória os meses que já têm partição para não consultar o catálogo a cada página."""
+
+    def __init__(self):
+        self._enabled = None
+        self._months = set()
+
+    def reset(self):
+        self._enabled = None
+        self._months = set()
+
+    def enabled(self, db):
+        if self._enabled is None:
+            self._enabled = is_orders_partitioned(db)
+            if self._enabled:
+                self._months = {
+                    m for m in map(parse_partition_name, list_order_partitions(db)) if m
+                }
+        return self._enabled
+
+    def ensure_months(self, db, months):
+        """Cria as partições que faltam para os meses informados (sem commit)."""
+        if not self.enabled(db):
+            return []
+        created = []
+        for month in sorted(set(months) - self._months):
+            created.append(create_order_partition(db, month))
+            self._months.add(month)
+        if created:
+            logger.info(f"Partições de orders criadas: {', '.join(created)}")
+        return created
+
+    def ensure_for(self, db, datetimes):
+        """
+        Garante partição para cada created_at_anymarket da página. Inclui os meses
+        vizinhos de datas perto da virada, porque a data gravada depende do fuso
+        da sessão.
+        """
+        months = set()
+        for value in datetimes:
+            if value is None:
+                continue
+            for shifted in (value - timedelta(days=1), value, value + timedelta(days=1)):
+                months.add(month_start(shifted))
+        return self.ensure_months(db, months)
+
+    def ensure_ahead(self, db, months_ahead=ORDER_PARTITION_MONTHS_AHEAD):
+        """Cria as partições do mês atual e dos próximos meses."""
+        month = month_start(datetime.now())
+        months = []
+        for _ in range(months_ahead + 1):
+            months.append(month)
+            month = next_month(month)
+        return self.ensure_months(db, months)
+
+
+order_partitions = OrderPartitionManager()
+
+
+def partition_orders_table(db, months_ahead=ORDER_PARTITION_MONTHS_AHEAD):
+    """
+    Converte orders em tabela particionada por mês de created_at_anymarket,
+    copiando os dados, numa única transação. Retorna as partições criadas.
+    """
+    if not _is_postgres(db):
+        raise RuntimeError("Particionamento de orders só é suportado no PostgreSQL")
+    if is_orders_partitioned(db):
+        # Bancos particionados antes de order_keys existir ganham a unicidade global aqui
+        ensure_order_keys(db)
+        db.commit()
+        logger.info("orders já está particionada; order_keys verificada")
+        return []
+
+    old_table = f"{PARENT_TABLE}_unpartitioned"
+    db.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {old_table}"))
+
+    # Nomes de índice são globais no schema: libera os nomes para a tabela nova
+    for (index_name,) in db.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": old_table}).all():
+        db.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_old"'))
+
+    sequence = db.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": old_table}).scalar()
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+    db.execute(text(
+        f"CREATE TABLE {PARENT_TABLE} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE (created_at_anymarket)"
+    ))
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id"))
+
+    db.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+    _partition_local_indexes(db, DEFAULT_PARTITION)
+
+    first, last = db.execute(text(
+        f"SELECT min(created_at_anymarket), max(created_at_anymarket) FROM {old_table}"
+    )).one()
+    month = month_start(first or datetime.now())
+    until = month_start(datetime.now())
+    for _ in range(months_ahead):
+        until = next_month(until)
+    if last is not None:
+        until = max(until, month_start(last))
+
+    created = []
+    while month <= until:
+        created.append(create_order_partition(db, month))
+        month = next_month(month)
+
+    _create_parent_indexes(db)
+
+    copied = db.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {old_table}")).rowcount
+    db.execute(text(f"DROP TABLE {old_table}"))
+    ensure_order_keys(db)
+    db.commit()
+
+    order_partitions.reset()
+    logger.info(f"orders particionada: {len(created)} partições mensais, {copied} pedidos copiados")
+    return created
+
+
+def detach_order_partitions(db, before):
+    """
+    Desanexa as partições mensais anteriores ao mês de `before`. As tabelas
+    continuam no banco com o mesmo nome. Retorna os nomes desanexados.
+    """
+    if not is_orders_partitioned(db):
+        logger.warning("orders não está particionada; nada a desanexar")
+        return []
+
+    limit = month_start(before)
+    detached = []
+    for name in list_order_partitions(db):
+        month = parse_partition_name(name)
+        if month is None or month >= limit:
+            continue
+        db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        forget_order_keys(db, name)
+        detached.append(name)
+
+    db.commit()
+    order_partitions.reset()
+    if detached:
+        logger.info(f"Partições de orders desanexadas: {', '.join(detached)}")
+    return detached
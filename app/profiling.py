@@ -0,0 +1,201 @@
+"""
+Modo de profiling da sincronização (daily_update.py --profile).
+
+CPU: um cProfile por etapa (fetch, transform, write). As etapas podem se
+aninhar (o transform roda dentro do save de uma página): entrar numa etapa
+pausa o profiler da etapa de fora, e cada função é contada só na etapa em
+que rodou.
+
+Memória: tracemalloc ligado durante a sincronização, com um snapshot a cada
+página gravada. O relatório mostra a memória rastreada por página, as linhas
+que mais alocaram no fim da sincronização e o que cresceu desde a primeira
+página.
+
+SyncProfiler.write(prefixo) grava:
+    <prefixo>_<etapa>.pstats      (python -m pstats, snakeviz)
+    <prefixo>_<etapa>.collapsed   (flamegraph.pl, speedscope)
+    <prefixo>_memory.txt
+"""
+
+import cProfile
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILE_STAGES = ("fetch", "transform", "write")
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "25"))
+PROFILE_MEMORY_FRAMES = int(os.getenv("PROFILE_MEMORY_FRAMES", "1"))
+# Ramos abaixo disso (em segundos) não entram no collapsed
+COLLAPSED_MIN_SECONDS = 1e-6
+COLLAPSED_MAX_DEPTH = 128
+
+# Frames do próprio tracemalloc/importlib não interessam no relatório
+_MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _label(func):
+    filename, lineno, name = func
+    if filename == "~":
+        return name  # built-ins: "<built-in method ...>"
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def collapsed_stacks(stats):
+    """
+    Pilhas no formato "a;b;c microssegundos" a partir de um pstats.Stats.
+    O cProfile só guarda pares chamador -> chamado, então o tempo de cada
+    função é dividido entre os caminhos na proporção do tempo recebido de cada
+    chamador (aproximação usual para flamegraphs de cProfile).
+    """
+    raw = stats.stats
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, (_, _, _, ct) in callers.items():
+            callees[caller][func] = ct
+
+    lines = defaultdict(float)
+
+    def walk(func, stack, on_path, share):
+        _, _, tt, ct, _ = raw[func]
+        fraction = share / ct if ct else 0.0
+        lines[";".join(stack)] += tt * fraction
+        if len(stack) >= COLLAPSED_MAX_DEPTH:
+            return
+        for callee, callee_ct in callees[func].items():
+            callee_share = callee_ct * fraction
+            if callee in on_path or callee_share < COLLAPSED_MIN_SECONDS:
+                continue
+            on_path.add(callee)
+            walk(callee, stack + [_label(callee)], on_path, callee_share)
+            on_path.discard(callee)
+
+    for func, (_, _, _, ct, callers) in raw.items():
+        if not callers:
+            walk(func, [_label(func)], {func}, ct)
+
+    return [f"{stack} {round(seconds * 1_000_000)}" for stack, seconds in sorted(lines.items()) if seconds >= COLLAPSED_MIN_SECONDS]
+
+
+class SyncProfiler:
+    """Profilers de CPU por etapa e snapshots de memória por página; inativo até start()."""
+
+    def __init__(self):
+        self.active = False
+        self._profiles = {}
+        self._stack = []
+        self._thread = None
+        self._pages = []
+        self._page_numbers = defaultdict(int)
+        self._first = None
+        self._last = None
+
+    def start(self):
+        self.active = True
+        self._profiles = {stage: cProfile.Profile() for stage in PROFILE_STAGES}
+        self._stack = []
+        self._thread = threading.get_ident()
+        self._pages = []
+        self._page_numbers = defaultdict(int)
+        self._first = self._last = None
+        tracemalloc.start(PROFILE_MEMORY_FRAMES)
+        logger.info("Profiling ativo (cProfile por etapa + tracemalloc)")
+
+    @contextmanager
+    def stage(self, name):
+        """Conta o bloco na etapa `name` (fetch, transform ou write)."""
+        # Só a thread que iniciou o profiling: um cProfile ativo por vez
+        if not self.active or threading.get_ident() != self._thread:
+            yield
+            return
+        if self._stack:
+            self._profiles[self._stack[-1]].disable()
+        self._stack.append(name)
+        self._profiles[name].enable()
+        try:
+            yield
+        finally:
+            self._profiles[name].disable()
+            self._stack.pop()
+            if self._stack:
+                self._profiles[self._stack[-1]].enable()
+
+    def page(self, entity):
+        """Snapshot de memória ao fim de uma página gravada."""
+        if not self.active:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+        if self._first is None:
+            self._first = snapshot
+        self._last = snapshot
+        self._page_numbers[entity] += 1
+        self._pages.append((entity, self._page_numbers[entity], current, peak))
+
+    def stop(self):
+        if not self.active:
+            return
+        for profile in self._profiles.values():
+            profile.disable()
+        self._stack = []
+        if self._last is None and tracemalloc.is_tracing():
+            self._first = self._last = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+        tracemalloc.stop()
+        self.active = False
+
+    def write(self, prefix):
+        """Grava pstats, collapsed e o relatório de memória. Retorna os arquivos gravados."""
+        self.stop()
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        files = []
+        for stage, profile in self._profiles.items():
+            try:
+                stats = pstats.Stats(profile)
+            except TypeError:
+                continue  # etapa que não rodou
+            stats.dump_stats(f"{prefix}_{stage}.pstats")
+            with open(f"{prefix}_{stage}.collapsed", "w", encoding="utf-8") as f:
+                f.write("\n".join(collapsed_stacks(stats)) + "\n")
+            files += [f"{prefix}_{stage}.pstats", f"{prefix}_{stage}.collapsed"]
+
+        with open(f"{prefix}_memory.txt", "w", encoding="utf-8") as f:
+            f.write(self.memory_report())
+        files.append(f"{prefix}_memory.txt")
+
+        for filename in files:
+            logger.info(f"Profile gravado: {filename}")
+        return files
+
+    def memory_report(self, top=PROFILE_TOP_ALLOCATIONS):
+        lines = ["Memoria rastreada por pagina (tracemalloc)", ""]
+        lines.append(f"{'entidade':<20} {'pagina':>6} {'atual (KiB)':>12} {'pico (KiB)':>12}")
+        for entity, number, current, peak in self._pages:
+            lines.append(f"{entity:<20} {number:>6} {current / 1024:>12.1f} {peak / 1024:>12.1f}")
+
+        if self._last is not None:
+            lines += ["", f"Top {top} alocacoes no fim da sincronizacao", ""]
+            for stat in self._last.statistics("lineno")[:top]:
+                lines.append(f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} blocos  {stat.traceback}")
+
+        if self._first is not None and self._last is not self._first:
+            lines += ["", f"Top {top} crescimentos desde a primeira pagina", ""]
+            for stat in self._last.compare_to(self._first, "lineno")[:top]:
+                lines.append(f"{stat.size_diff / 1024:>+10.1f} KiB {stat.count_diff:>+8} blocos  {stat.traceback}")
+
+        return "\n".join(lines) + "\n"
+
+
+sync_profiler = SyncProfiler()
@@ -0,0 +1,216 @@
+"""
+Manutenção incremental das tabelas agregadas de pedidos:
+
+- order_daily_rollup: marketplace × status × dia
+- sku_sales_daily: SKU (partner ID) × marketplace × dia, a partir de todos os
+  itens de items_data
+
+save_orders acumula, para cada pedido da página, a contribuição antiga
+(com sinal negativo, se o pedido já existia) e a nova, relida do banco após
+o flush para usar a mesma data gravada que o recálculo completo usa. No fim
+da página os deltas são aplicados na mesma transação dos pedidos.
+"""
+
+from collections import defaultdict
+import logging
+import os
+
+from sqlalchemy import Date, func, select, tuple_
+
+from . import models
+from .order_state import order_column, with_order_state
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_METRICS = ("orders_count", "gross", "total", "freight")
+SKU_SALES_METRICS = ("units", "revenue", "discount")
+
+# Pedidos nesses status não contam como venda em sku_sales_daily
+SKU_SALES_EXCLUDED_STATUSES = frozenset(
+    s.strip() for s in os.getenv("SKU_SALES_EXCLUDED_STATUSES", "CANCELED").split(",") if s.strip()
+)
+
+ROLLUP_BATCH_SIZE = 1000
+
+
+def _as_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class OrderRollupDeltas:
+    """Acumula deltas por (marketplace, status, dia)."""
+
+    def __init__(self):
+        self._deltas = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+
+    def add(self, marketplace, status, created_at, gross, total, freight, sign=1):
+        if created_at is None:
+            return
+        key = (marketplace or "", status or "", created_at.date())
+        delta = self._deltas[key]
+        delta[0] += sign
+        delta[1] += sign * (gross or 0)
+        delta[2] += sign * (total or 0)
+        delta[3] += sign * (freight or 0)
+
+    def add_order(self, order, sign=1):
+        """Contribuição de um pedido persistido (models.Order ou linha de stored_orders)."""
+        self.add(order.marketplace, order.status, order.created_at_anymarket,
+                 order.gross, order.total, order.freight, sign)
+
+    def items(self):
+        return [(k, v) for k, v in self._deltas.items() if any(v)]
+
+    def __len__(self):
+        return len(self.items())
+
+
+class SkuSalesDeltas:
+    """Acumula deltas por (sku_partner_id, marketplace, dia)."""
+
+    def __init__(self):
+        self._deltas = defaultdict(lambda: [0.0, 0.0, 0.0])
+
+    def add_order(self, order, sign=1):
+        """Contribuição de todos os itens de um pedido persistido."""
+        if order.created_at_anymarket is None or order.status in SKU_SALES_EXCLUDED_STATUSES:
+            return
+        day = order.created_at_anymarket.date()
+        marketplace = order.marketplace or ""
+        for item in order.items_data or []:
+            sku_partner_id = (item.get("sku") or {}).get("partnerId")
+            if not sku_partner_id:
+                continue
+            delta = self._deltas[(str(sku_partner_id), marketplace, day)]
+            delta[0] += sign * _as_float(item.get("amount"))
+            delta[1] += sign * _as_float(item.get("total"))
+            delta[2] += sign * _as_float(item.get("discount"))
+
+    def items(self):
+        return [(k, v) for k, v in self._deltas.items() if any(v)]
+
+    def __len__(self):
+        return len(self.items())
+
+
+def stored_orders(db, anymarket_ids):
+    """Campos usados pelos agregados, como estão gravados (chamar após db.flush())."""
+    if not anymarket_ids:
+        return []
+    Order = models.Order
+    return with_order_state(db.query(
+        Order.marketplace, order_column("status"), Order.created_at_anymarket,
+        Order.gross, Order.total, Order.freight, Order.items_data,
+    )).filter(Order.anymarket_id.in_(anymarket_ids)).all()
+
+
+def _apply_deltas(db, model, key_columns, metrics, items):
+    """
+    Soma os deltas nas linhas existentes, cria as que faltam e remove as que
+    zeraram (pela primeira métrica). Não faz commit.
+    """
+    if not items:
+        return 0
+
+    columns = [getattr(model, c) for c in key_columns]
+    existing = {
+        tuple(getattr(r, c) for c in key_columns): r
+        for r in db.query(model).filter(tuple_(*columns).in_([k for k, _ in items])).all()
+    }
+
+    for key, values in items:
+        row = existing.get(key)
+        if row is None:
+            if values[0] <= 0:
+                # Pedido antigo sem linha no agregado: rode --rebuild-rollups uma vez
+                logger.warning(f"{model.__tablename__} sem linha para {key}; agregado precisa ser recalculado")
+                continue
+            db.add(model(**dict(zip(key_columns, key)), **dict(zip(metrics, values))))
+            continue
+
+        for metric, value in zip(metrics, values):
+            setattr(row, metric, getattr(row, metric) + value)
+        if getattr(row, metrics[0]) <= 0:
+            db.delete(row)
+
+    return len(items)
+
+
+def apply_order_rollup_deltas(db, deltas):
+    """Aplica os deltas em order_daily_rollup (sem commit)."""
+    return _apply_deltas(db, models.OrderDailyRollup, ("marketplace", "status", "day"),
+                         ROLLUP_METRICS, deltas.items())
+
+
+def apply_sku_sales_deltas(db, deltas):
+    """Aplica os deltas em sku_sales_daily (sem commit)."""
+    return _apply_deltas(db, models.SkuSalesDaily, ("sku_partner_id", "marketplace", "day"),
+                         SKU_SALES_METRICS, deltas.items())
+
+
+def rebuild_order_daily_rollup(db):
+    """Recalcula order_daily_rollup inteira a partir de orders (backfill)."""
+    Rollup = models.OrderDailyRollup
+    day = func.date(models.Order.created_at_anymarket, type_=Date)
+    status = order_column("status")
+
+    rows = with_order_state(db.query(
+        func.coalesce(models.Order.marketplace, "").label("marketplace"),
+        func.coalesce(status, "").label("status"),
+        day.label("day"),
+        func.count(models.Order.id).label("orders_count"),
+        func.coalesce(func.sum(models.Order.gross), 0).label("gross"),
+        func.coalesce(func.sum(models.Order.total), 0).label("total"),
+        func.coalesce(func.sum(models.Order.freight), 0).label("freight"),
+    )).filter(
+        models.Order.created_at_anymarket.isnot(None)
+    ).group_by(
+        func.coalesce(models.Order.marketplace, ""),
+        func.coalesce(status, ""),
+        day,
+    ).all()
+
+    db.query(Rollup).delete(synchronize_session=False)
+    db.bulk_insert_mappings(Rollup, [
+        {
+            "marketplace": r.marketplace,
+            "status": r.status,
+            "day": r.day,
+            **{m: getattr(r, m) for m in ROLLUP_METRICS},
+        }
+        for r in rows
+    ])
+    logger.info(f"order_daily_rollup recalculada: {len(rows)} linhas")
+    return len(rows)
+
+
+def rebuild_sku_sales_daily(db):
+    """Recalcula sku_sales_daily inteira lendo items_data de todos os pedidos (backfill)."""
+    Order = models.Order
+    deltas = SkuSalesDeltas()
+    stmt = with_order_state(select(
+        Order.marketplace, order_column("status"), Order.created_at_anymarket, Order.items_data,
+    )).where(
+        Order.created_at_anymarket.isnot(None)
+    ).execution_options(yield_per=ROLLUP_BATCH_SIZE)
+
+    for rows in db.execute(stmt).partitions():
+        for row in rows:
+            deltas.add_order(row)
+
+    items = deltas.items()
+    db.query(models.SkuSalesDaily).delete(synchronize_session=False)
+    db.bulk_insert_mappings(models.SkuSalesDaily, [
+        {
+            "sku_partner_id": sku_partner_id,
+            "marketplace": marketplace,
+            "day": day,
+            **dict(zip(SKU_SALES_METRICS, values)),
+        }
+        for (sku_partner_id, marketplace, day), values in items
+    ])
+    logger.info(f"sku_sales_daily recalculada: {len(items)} linhas")
+    return len(items)
@@ -0,0 +1,119 @@
+"""
+Endpoints de vendas por SKU, lidos de sku_sales_daily.
+
+A tabela tem uma linha por SKU × marketplace × dia com todos os itens dos
+pedidos (não só o primeiro), então as consultas não precisam abrir items_data.
+"""
+
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import cached
+from .database import get_read_db
+
+router = APIRouter(tags=["sales"])
+
+
+def sku_sales_conditions(
+    sku_partner_id: Optional[str] = None,
+    marketplace: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """Filtros de sku_sales_daily por SKU, marketplace e período (date_to exclusivo)"""
+    Sales = models.SkuSalesDaily
+    conditions = []
+    if sku_partner_id:
+        conditions.append(Sales.sku_partner_id == sku_partner_id)
+    if marketplace:
+        conditions.append(Sales.marketplace == marketplace)
+    if date_from is not None:
+        conditions.append(Sales.day >= date_from)
+    if date_to is not None:
+        conditions.append(Sales.day < date_to)
+    return conditions
+
+
+def _sales_totals():
+    Sales = models.SkuSalesDaily
+    return (
+        func.sum(Sales.units).label("units"),
+        func.sum(Sales.revenue).label("revenue"),
+        func.sum(Sales.discount).label("discount"),
+    )
+
+
+def _sales_dict(row):
+    return {
+        "units": float(row.units or 0),
+        "revenue": float(row.revenue or 0),
+        "discount": float(row.discount or 0),
+    }
+
+
+@router.get("/stats/skus/top-sellers")
+@cached("orders")
+def get_top_sellers(
+    date_from: Optional[date] = Query(None, description="Dia inicial"),
+    date_to: Optional[date] = Query(None, description="Dia final (exclusivo)"),
+    marketplace: Optional[str] = Query(None, description="Marketplace"),
+    order_by: str = Query("units", pattern="^(units|revenue)$", description="units ou revenue"),
+    limit: int = Query(20, ge=1, le=500),
+    db: Session = Depends(get_read_db),
+):
+    """SKUs mais vendidos no período, por unidades ou receita"""
+    Sales = models.SkuSalesDaily
+    totals = _sales_totals()
+    sort_column = totals[0] if order_by == "units" else totals[1]
+
+    rows = db.query(Sales.sku_partner_id, *totals).filter(*sku_sales_conditions(
+        marketplace=marketplace,
+        date_from=date_from,
+        date_to=date_to,
+    )).group_by(Sales.sku_partner_id).order_by(sort_column.desc()).limit(limit).all()
+
+    return {
+        "top_sellers": [
+            {"sku_partner_id": row.sku_partner_id, **_sales_dict(row)}
+            for row in rows
+        ],
+        "period": {"date_from": date_from, "date_to": date_to},
+        "order_by": order_by,
+    }
+
+
+@router.get("/stats/skus/{sku_partner_id}/daily")
+@cached("orders")
+def get_sku_sales_daily(
+    sku_partner_id: str,
+    date_from: Optional[date] = Query(None, description="Dia inicial"),
+    date_to: Optional[date] = Query(None, description="Dia final (exclusivo)"),
+    marketplace: Optional[str] = Query(None, description="Marketplace"),
+    by_marketplace: bool = Query(False, description="Separar por marketplace"),
+    db: Session = Depends(get_read_db),
+):
+    """Série diária de vendas de um SKU (unidades, receita e desconto)"""
+    Sales = models.SkuSalesDaily
+    group_by = [Sales.day, Sales.marketplace] if by_marketplace else [Sales.day]
+
+    rows = db.query(*group_by, *_sales_totals()).filter(*sku_sales_conditions(
+        sku_partner_id=sku_partner_id,
+        marketplace=marketplace,
+        date_from=date_from,
+        date_to=date_to,
+    )).group_by(*group_by).order_by(*group_by).all()
+
+    days = []
+    for row in rows:
+        item = {"day": row.day}
+        if by_marketplace:
+            item["marketplace"] = row.marketplace
+        item.update(_sales_dict(row))
+        days.append(item)
+
+    return {"sku_partner_id": sku_partner_id, "days": days}
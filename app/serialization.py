@@ -0,0 +1,131 @@
+"""
+Serialização JSON rápida para as respostas da API.
+
+- dumps() usa orjson e converte objetos ORM direto para dict, sem passar
+  pelo jsonable_encoder do FastAPI.
+- json_select_columns() / rows_to_json() leem as colunas JSON como texto e
+  copiam esse texto para a resposta, sem decodificar e recodificar os arrays
+  de skus, images, items etc.
+"""
+
+import functools
+from decimal import Decimal
+
+import orjson
+from sqlalchemy import JSON, Text, cast, inspect
+from sqlalchemy.engine import Row
+
+
+class RawJSON(bytes):
+    """Bytes que já são JSON válido e devem ser copiados como estão."""
+
+
+@functools.lru_cache(maxsize=None)
+def _column_keys(cls):
+    return tuple(attr.key for attr in inspect(cls).column_attrs)
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Row):
+        return obj._asdict()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    state = inspect(obj, raiseerr=False)
+    if state is not None and hasattr(state, "mapper"):
+        return {key: getattr(obj, key) for key in _column_keys(type(obj))}
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def dumps(obj) -> bytes:
+    """Serializa para JSON (bytes). Aceita objetos ORM, Rows, datetime e Decimal."""
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_with_raw(mapping) -> bytes:
+    """Serializa um dict cujo valor pode ser RawJSON, copiando esses valores sem reprocessar."""
+    parts = []
+    for key, value in mapping.items():
+        encoded = value if isinstance(value, RawJSON) else dumps(value)
+        parts.append(dumps(str(key)) + b":" + encoded)
+    return b"{" + b",".join(parts) + b"}"
+
+
+def to_json_bytes(result) -> bytes:
+    """Corpo JSON de uma resposta de endpoint."""
+    if isinstance(result, (bytes, bytearray)):
+        return bytes(result)
+    if isinstance(result, dict) and any(isinstance(v, RawJSON) for v in result.values()):
+        return dumps_with_raw(result)
+    return dumps(result)
+
+
+@functools.lru_cache(maxsize=None)
+def json_select_columns(model):
+    """
+    Colunas do model para um SELECT, com as colunas JSON/JSONB convertidas
+    para texto. Retorna (colunas, nomes das colunas JSON).
+    """
+    columns = []
+    raw_keys = []
+    for column in model.__table__.columns:
+        if isinstance(column.type, JSON):
+            columns.append(cast(column, Text).label(column.name))
+            raw_keys.append(column.name)
+        else:
+            columns.append(column)
+    return tuple(columns), tuple(raw_keys)
+
+
+def _raw_value(value):
+    if value is None:
+        return b"null"
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return dumps(value)
+
+
+def mapping_to_json(mapping, raw_keys) -> RawJSON:
+    """Serializa um dict cujas chaves em raw_keys já contêm texto JSON."""
+    return RawJSON(_mapping_to_json(mapping, raw_keys, frozenset(raw_keys)))
+
+
+def _row_to_json(row, raw_keys, raw_set):
+    return _mapping_to_json(row._mapping, raw_keys, raw_set)
+
+
+def _mapping_to_json(mapping, raw_keys, raw_set):
+    scalars = dumps({k: v for k, v in mapping.items() if k not in raw_set})
+    raw_parts = [b'"' + k.encode("utf-8") + b'":' + _raw_value(mapping[k]) for k in raw_keys]
+    if not raw_parts:
+        return scalars
+    if scalars == b"{}":
+        return b"{" + b",".join(raw_parts) + b"}"
+    return scalars[:-1] + b"," + b",".join(raw_parts) + b"}"
+
+
+def rows_to_json(rows, raw_keys) -> RawJSON:
+    """
+    Serializa linhas de um SELECT feito com json_select_columns() como um array JSON.
+    As colunas em raw_keys são copiadas do texto lido do banco.
+    """
+    raw_set = frozenset(raw_keys)
+    return RawJSON(b"[" + b",".join(_row_to_json(row, raw_keys, raw_set) for row in rows) + b"]")
+
+
+def query_to_json(query) -> RawJSON:
+    """Executa uma Query ORM de um model trazendo as colunas JSON como texto."""
+    model = query.column_descriptions[0]["entity"]
+    columns, raw_keys = json_select_columns(model)
+    return rows_to_json(query.with_entities(*columns).all(), raw_keys)
+
+
+def query_first_to_json(query):
+    """Como query_to_json, mas para um único registro; None se não encontrado."""
+    model = query.column_descriptions[0]["entity"]
+    columns, raw_keys = json_select_columns(model)
+    row = query.with_entities(*columns).first()
+    if row is None:
+        return None
+    return RawJSON(_row_to_json(row, raw_keys, frozenset(raw_keys)))
@@ -0,0 +1,146 @@
+"""
+Snapshot colunar (Parquet) das tabelas para análise fora do Postgres.
+
+write_snapshots() grava em SNAPSHOT_DIR:
+
+    products/products.parquet
+    sku_marketplaces/sku_marketplaces.parquet
+    orders/month=AAAA-MM/orders.parquet
+
+Uma marca d'água por entidade (maior coalesce(updated_at, created_at) já
+exportado) fica em SNAPSHOT_DIR/_watermarks.json. Entidades sem alterações
+desde a última marca não são regravadas; em orders só os meses com pedidos
+alterados são regravados.
+"""
+
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from . import models
+from .columnar import ParquetFileWriter, require_pyarrow, rows_to_batch, select_arrow_schema
+from .order_state import order_changed_at, order_select_columns, select_order_rows, with_order_state
+from .partitions import month_start, next_month
+from .serialization import json_select_columns
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "2000"))
+
+WATERMARK_FILE = "_watermarks.json"
+UNKNOWN_MONTH = "unknown"
+
+FULL_SNAPSHOT_MODELS = {
+    "products": models.Product,
+    "sku_marketplaces": models.SkuMarketplace,
+}
+
+
+def _changed_at(model):
+    return func.coalesce(model.updated_at, model.created_at)
+
+
+def load_watermarks(base_dir=SNAPSHOT_DIR):
+    path = Path(base_dir) / WATERMARK_FILE
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {k: datetime.fromisoformat(v) for k, v in json.load(f).items()}
+
+
+def save_watermarks(watermarks, base_dir=SNAPSHOT_DIR):
+    path = Path(base_dir) / WATERMARK_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({k: v.isoformat() for k, v in watermarks.items()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def export_parquet(db, model, conditions, path):
+    """
+    Grava em Parquet as linhas do model que satisfazem as condições (orders
+    com os campos de order_states). Retorna o número de linhas.
+    """
+    if model is models.Order:
+        columns, _ = order_select_columns()
+        stmt = select_order_rows(*columns)
+    else:
+        columns, _ = json_select_columns(model)
+        stmt = select(*columns)
+    schema = select_arrow_schema(columns)
+    stmt = (
+        stmt
+        .where(*conditions)
+        .order_by(model.id)
+        .execution_options(yield_per=SNAPSHOT_BATCH_SIZE)
+    )
+    with ParquetFileWriter(path, schema) as writer:
+        for rows in db.execute(stmt).partitions():
+            writer.write_batch(rows_to_batch(rows, schema))
+    return writer.rows
+
+
+def _snapshot_full(db, name, model, since, base_dir):
+    latest = db.query(func.max(_changed_at(model))).scalar()
+    if latest is None or (since is not None and latest <= since):
+        logger.info(f"Snapshot de {name}: sem alterações")
+        return None, since
+    rows = export_parquet(db, model, [], Path(base_dir) / name / f"{name}.parquet")
+    logger.info(f"Snapshot de {name}: {rows} linhas")
+    return rows, latest
+
+
+def _snapshot_orders(db, since, base_dir):
+    Order = models.Order
+    changed = [] if since is None else [order_changed_at() > since]
+    latest = with_order_state(db.query(func.max(order_changed_at()))).scalar()
+    if latest is None or (since is not None and latest <= since):
+        logger.info("Snapshot de orders: sem alterações")
+        return {}, since
+
+    months = set()
+    for (created_at,) in with_order_state(db.query(Order.created_at_anymarket)).filter(*changed).distinct():
+        months.add(month_start(created_at) if created_at is not None else None)
+
+    written = {}
+    for month in sorted(months, key=lambda m: (m is None, m)):
+        if month is None:
+            label, conditions = UNKNOWN_MONTH, [Order.created_at_anymarket.is_(None)]
+        else:
+            label = f"{month:%Y-%m}"
+            conditions = [
+                Order.created_at_anymarket >= month,
+                Order.created_at_anymarket < next_month(month),
+            ]
+        path = Path(base_dir) / "orders" / f"month={label}" / "orders.parquet"
+        written[label] = export_parquet(db, Order, conditions, path)
+
+    logger.info(f"Snapshot de orders: {len(written)} meses regravados")
+    return written, latest
+
+
+def write_snapshots(db, base_dir=SNAPSHOT_DIR):
+    """Atualiza o snapshot Parquet de products, sku_marketplaces e orders. Retorna o resumo por entidade."""
+    require_pyarrow()
+    watermarks = load_watermarks(base_dir)
+    summary = {}
+
+    for name, model in FULL_SNAPSHOT_MODELS.items():
+        rows, watermark = _snapshot_full(db, name, model, watermarks.get(name), base_dir)
+        summary[name] = rows
+        if watermark is not None:
+            watermarks[name] = watermark
+
+    months, orders_watermark = _snapshot_orders(db, watermarks.get("orders"), base_dir)
+    summary["orders"] = months
+    if orders_watermark is not None:
+        watermarks["orders"] = orders_watermark
+
+    save_watermarks(watermarks, base_dir)
+    return summary
@@ -0,0 +1,241 @@
+"""
+Perfil das consultas SQL de cada request.
+
+Os eventos de cursor de todos os engines acumulam, no request em andamento,
+quantas consultas foram feitas, o tempo total e o tempo de cada comando
+(agrupado pelo SQL normalizado). Ao final do request:
+  - o header Server-Timing traz o tempo de banco e o número de consultas;
+  - o mesmo comando repetido SQL_N_PLUS_ONE_THRESHOLD vezes ou mais é
+    sinalizado como N+1 (uma consulta por linha de um resultado anterior);
+  - consultas acima de SQL_SLOW_QUERY_MS são logadas e, com
+    SQL_EXPLAIN_SLOW=true, o plano (EXPLAIN, sem ANALYZE) vai junto no log;
+  - o resumo fica nos últimos SQL_PROFILE_HISTORY requests (GET /sql/profiles).
+"""
+
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+SQL_EXPLAIN_SLOW = os.getenv("SQL_EXPLAIN_SLOW", "false").lower() in ("1", "true", "yes", "sim")
+SQL_PROFILE_TOP = int(os.getenv("SQL_PROFILE_TOP", "3"))
+SQL_PROFILE_HISTORY = int(os.getenv("SQL_PROFILE_HISTORY", "100"))
+
+_WHITESPACE = re.compile(r"\s+")
+# Listas de IN expandidas (IN (%(id_1_1)s, %(id_1_2)s, ...)) têm tamanhos diferentes a cada chamada
+_IN_LIST = re.compile(r"\bIN \((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+
+
+def normalize_sql(statement):
+    """SQL com espaços e listas de IN colapsados, para agrupar execuções do mesmo comando."""
+    return _IN_LIST.sub("IN (...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class StatementStats:
+    __slots__ = ("statement", "parameters", "engine", "count", "seconds", "max_seconds")
+
+    def __init__(self, statement, parameters, engine):
+        self.statement = statement
+        self.parameters = parameters
+        self.engine = engine
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class RequestProfile:
+    """Consultas de um request: total, tempo e estatística por comando."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = {}
+        self.slow = []  # StatementStats com a execução lenta (parâmetros daquela execução)
+        self._lock = threading.Lock()
+
+    def record(self, statement, parameters, elapsed, engine):
+        key = normalize_sql(statement)
+        with self._lock:
+            self.queries += 1
+            self.seconds += elapsed
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = StatementStats(key, parameters, engine)
+            stats.count += 1
+            stats.seconds += elapsed
+            if elapsed > stats.max_seconds:
+                stats.max_seconds = elapsed
+                stats.parameters = parameters
+            if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+                slow = StatementStats(statement, parameters, engine)
+                slow.count, slow.seconds, slow.max_seconds = 1, elapsed, elapsed
+                self.slow.append(slow)
+
+    def slowest(self, limit=SQL_PROFILE_TOP):
+        return sorted(self.statements.values(), key=lambda s: s.max_seconds, reverse=True)[:limit]
+
+    def n_plus_one(self, threshold=SQL_N_PLUS_ONE_THRESHOLD):
+        """Comandos SELECT repetidos `threshold` vezes ou mais no mesmo request."""
+        return [
+            s for s in self.statements.values()
+            if s.count >= threshold and s.statement.lstrip().upper().startswith("SELECT")
+        ]
+
+    def summary(self):
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.seconds * 1000, 2),
+            "slowest": [
+                {"sql": s.statement[:500], "count": s.count, "max_ms": round(s.max_seconds * 1000, 2), "total_ms": round(s.seconds * 1000, 2)}
+                for s in self.slowest()
+            ],
+            "n_plus_one": [{"sql": s.statement[:500], "count": s.count} for s in self.n_plus_one()],
+            "slow_queries": len(self.slow),
+        }
+
+
+_current = contextvars.ContextVar("sql_profile", default=None)
+
+
+def current_profile():
+    return _current.get()
+
+
+def begin_profile():
+    """Inicia o perfil do request (ou reaproveita o já iniciado por um middleware externo)."""
+    profile = _current.get()
+    if profile is not None:
+        return profile, None
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def end_profile(token):
+    if token is not None:
+        _current.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    elapsed = time.perf_counter() - started
+    profile = _current.get()
+    if profile is not None:
+        profile.record(statement, parameters, elapsed, conn.engine)
+    if tracer.enabled:
+        tracer.complete("sql", "db", time.time_ns() // 1000 - int(elapsed * 1_000_000), elapsed * 1_000_000, {
+            "sql": normalize_sql(statement)[:300], "engine": conn.engine.url.host or conn.engine.url.database,
+        })
+
+
+def _handle_error(exception_context):
+    # Statement que falhou não passa pelo after_cursor_execute: tira o início dele da pilha
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engines():
+    """Registra os eventos de cursor em todos os engines (inclusive o sync_engine dos async); também geram os spans "sql" do trace."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def explain(stats):
+    """Plano (EXPLAIN sem ANALYZE, não executa a consulta) de um SELECT, numa conexão própria."""
+    if stats.engine.dialect.name != "postgresql" or not stats.statement.lstrip().upper().startswith("SELECT"):
+        return None
+    try:
+        with stats.engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN {stats.statement}", stats.parameters).scalars().all()
+            return "\n".join(rows)
+    except Exception as e:
+        return f"EXPLAIN falhou: {e}"
+
+
+recent_profiles = deque(maxlen=SQL_PROFILE_HISTORY)
+
+
+def route_label(scope):
+    route = scope.get("route")
+    # Rotas não encontradas num rótulo só, para não criar uma série por URL
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _server_timing(profile, elapsed):
+    return (
+        f'db;dur={profile.seconds * 1000:.1f};desc="{profile.queries} queries", '
+        f"app;dur={elapsed * 1000:.1f}"
+    ).encode("latin-1")
+
+
+def _log_profile(method, route, profile):
+    # Roda numa cópia do contexto: o EXPLAIN não entra no perfil do request
+    _current.set(None)
+    for stats in profile.n_plus_one():
+        logger.warning(f"Possível N+1 em {method} {route}: {stats.count}x {stats.statement[:300]}")
+    for stats in profile.slow:
+        logger.warning(f"Consulta lenta em {method} {route} ({stats.seconds * 1000:.0f} ms): {stats.statement[:1000]}")
+        if SQL_EXPLAIN_SLOW:
+            plan = explain(stats)
+            if plan:
+                logger.warning(f"Plano da consulta lenta:\n{plan}")
+
+
+class SqlProfilerMiddleware:
+    """Middleware ASGI: Server-Timing, detecção de N+1 e de consultas lentas por request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile, token = begin_profile()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(profile, time.perf_counter() - start)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_profile(token)
+
+        method, route = scope.get("method", ""), route_label(scope)
+        if profile.queries:
+            recent_profiles.append({
+                "method": method,
+                "route": route,
+                "path": scope.get("path", ""),
+                "at": time.time(),
+                **profile.summary(),
+            })
+        if profile.slow or profile.n_plus_one():
+            # Depois da resposta; o EXPLAIN usa outra conexão
+            await run_in_threadpool(_log_profile, method, route, profile)
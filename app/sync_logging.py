@@ -0,0 +1,186 @@
+"""
+Logging da sincronização: JSON estruturado, fila e amostragem.
+
+configure_logging() troca o handler do root logger por um QueueHandler. A
+thread do QueueListener faz a formatação e a escrita em stderr, fora do
+caminho quente: quem loga só enfileira o LogRecord. A mensagem não é
+formatada antes de entrar na fila. Por isso os argumentos (`"%s", valor`)
+devem ser valores imutáveis, como IDs e contadores.
+
+SamplingFilter limita as mensagens repetitivas que pedem amostragem com
+`extra=SAMPLE` (espera do rate limit, linhas por registro em DEBUG). Os
+demais registros, como os eventos por página, passam sempre. Ele agrupa os
+registros pelo template (o texto com "%s", antes dos argumentos). As
+LOG_SAMPLE_FIRST primeiras ocorrências passam e, depois, uma a cada
+LOG_SAMPLE_EVERY. O registro que passa leva em `sampled` quantas
+ocorrências representa. Com f-strings cada mensagem é um template
+diferente, então o hot path usa formatação com "%s".
+
+Com a fila cheia, registros abaixo de WARNING são descartados e contados;
+a quantidade é informada no shutdown_logging(). WARNING e acima esperam
+lugar na fila.
+
+LOG_FORMAT=json grava uma linha JSON por evento. Os campos passados em
+`extra` (ex: event, entity, inserted) viram chaves do objeto.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_FIRST = int(os.getenv("LOG_SAMPLE_FIRST", "10"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# extra= das mensagens que podem ser amostradas
+SAMPLE = {"_sample": True}
+
+# Atributos de todo LogRecord; o resto veio de `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha: ts, level, logger, msg, campos de `extra` e exc."""
+
+    def format(self, record):
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                event[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Nas mensagens marcadas com SAMPLE, deixa passar as `first` primeiras ocorrências
+    de cada template e depois uma a cada `every`. As demais passam sempre.
+    """
+
+    def __init__(self, first=LOG_SAMPLE_FIRST, every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.first = first
+        self.every = every
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, "_sample", False) or record.levelno >= logging.WARNING or self.every <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._seen.get(key, 0) + 1
+            self._seen[key] = count
+        if count <= self.first:
+            return True
+        if (count - self.first) % self.every == 0:
+            record.sampled = self.every
+            return True
+        return False
+
+    def reset(self):
+        with self._lock:
+            self._seen.clear()
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Enfileira o registro sem formatar; o traceback vira texto antes (os frames não ficam presos na fila)."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)  # avisos e erros nunca são descartados
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Fila cheia (stderr travado): descarta em vez de bloquear a sincronização
+            self.dropped += 1
+
+
+class _QueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Com a fila cheia, espera a thread abrir espaço em vez de levantar queue.Full
+        self.queue.put(self._sentinel)
+
+
+_listener = None
+_handler = None
+
+
+def configure_logging(fmt=LOG_FORMAT, level=LOG_LEVEL, stream=None):
+    """Root logger -> fila -> thread que formata (texto ou JSON) e grava em stderr. Idempotente."""
+    global _listener, _handler
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _LazyQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = _QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    _handler = handler
+    return handler
+
+
+def shutdown_logging():
+    """
+    Esvazia a fila, para a thread do listener e informa quantos registros a fila
+    cheia descartou. Depois disso o root logger grava direto no stream.
+    """
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    output = _listener.handlers[0]
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    root.addHandler(output)
+    if _handler.dropped:
+        output.handle(logging.makeLogRecord({
+            "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+            "msg": "%d registros de log descartados com a fila cheia (LOG_QUEUE_SIZE=%d)",
+            "args": (_handler.dropped, _handler.queue.maxsize),
+            "event": "log_dropped", "dropped": _handler.dropped,
+        }))
+    _listener = _handler = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,91 @@
+"""
+Memória da sincronização: RSS por entidade e modo de memória limitada.
+
+A cada página gravada o RSS do processo é medido, e o maior valor de cada
+entidade vai para sync_run_entities.peak_rss_bytes e para a métrica
+sync_peak_rss_bytes.
+
+No modo de memória limitada (daily_update.py --bounded-memory ou
+SYNC_BOUNDED_MEMORY=true), a sessão usada pelas páginas não acumula estado
+entre elas:
+  - ao fim de cada página, os objetos ORM são removidos da sessão (expunge_all);
+  - a cada SYNC_SESSION_PAGES páginas, a sessão é fechada (devolve a conexão
+    e descarta o identity map) e os ciclos de referência são coletados;
+  - a paginação solta a página anterior antes de buscar a próxima.
+Assim o pico de memória depende do tamanho da página, não do catálogo.
+SYNC_MEMORY_LIMIT_MB gera um aviso quando o RSS passa do orçamento.
+"""
+
+import gc
+import logging
+import os
+import resource
+import sys
+
+from .metrics import sync_peak_rss
+
+logger = logging.getLogger(__name__)
+
+SYNC_BOUNDED_MEMORY = os.getenv("SYNC_BOUNDED_MEMORY", "false").lower() in ("1", "true", "yes", "sim")
+SYNC_SESSION_PAGES = max(int(os.getenv("SYNC_SESSION_PAGES", "1")), 1)
+SYNC_MEMORY_LIMIT_MB = float(os.getenv("SYNC_MEMORY_LIMIT_MB", "0"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def peak_rss():
+    """Maior RSS do processo até agora, em bytes (ru_maxrss: KiB no Linux, bytes no macOS)."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def current_rss():
+    """RSS atual em bytes (/proc/self/statm); fora do Linux, o pico do processo."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss()
+
+
+class SyncMemory:
+    def __init__(self):
+        self.bounded = SYNC_BOUNDED_MEMORY
+        self.session_pages = SYNC_SESSION_PAGES
+        self.limit_bytes = SYNC_MEMORY_LIMIT_MB * 1024 * 1024
+        self.peaks = {}
+        self._pages = 0
+        self._warned = False
+
+    def configure(self, bounded):
+        self.bounded = bounded
+        if bounded:
+            logger.info(f"Modo de memoria limitada: sessao reciclada a cada {self.session_pages} pagina(s)")
+
+    def page_done(self, db, entity):
+        """Fim de uma página gravada: mede o RSS e, no modo limitado, libera o estado da sessão."""
+        if self.bounded:
+            db.expunge_all()
+            self._pages += 1
+            if self._pages % self.session_pages == 0:
+                db.close()
+                gc.collect()
+
+        rss = current_rss()
+        self.peaks[entity] = max(self.peaks.get(entity, 0), rss)
+        sync_peak_rss.set(self.peaks[entity], entity=entity)
+        if self.limit_bytes and rss > self.limit_bytes and not self._warned:
+            self._warned = True
+            logger.warning(
+                f"RSS de {rss / 1024 / 1024:.0f} MiB em {entity} passou de SYNC_MEMORY_LIMIT_MB={SYNC_MEMORY_LIMIT_MB:.0f}"
+                + ("" if self.bounded else "; considere --bounded-memory")
+            )
+        return rss
+
+    def reset(self):
+        self.peaks = {}
+        self._pages = 0
+        self._warned = False
+
+
+sync_memory = SyncMemory()
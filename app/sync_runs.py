@@ -0,0 +1,276 @@
+"""
+Histórico das sincronizações (sync_runs e sync_run_entities).
+
+Durante o daily_update.py, SyncRunRecorder acumula por entidade: páginas,
+chamadas à API Anymarket (bytes recebidos e respostas 429), registros
+inseridos/atualizados, o tempo de fetch, transform e write e o maior RSS
+medido nas páginas. Os registros buscados, ignorados e sem alteração vêm
+dos contadores de app.metrics. Ao final (sucesso ou erro) a execução é
+gravada numa linha de sync_runs e uma linha por entidade em
+sync_run_entities.
+
+run_history() monta o GET /sync/runs: cada execução comparada com a mediana
+das SYNC_BASELINE_RUNS execuções bem-sucedidas anteriores, com as
+regressões acima de SYNC_REGRESSION_FACTOR sinalizadas.
+"""
+
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from statistics import median
+
+from . import models
+from .metrics import sync_records_fetched, sync_records_skipped
+
+SYNC_BASELINE_RUNS = int(os.getenv("SYNC_BASELINE_RUNS", "7"))
+SYNC_BASELINE_MIN_RUNS = int(os.getenv("SYNC_BASELINE_MIN_RUNS", "3"))
+SYNC_REGRESSION_FACTOR = float(os.getenv("SYNC_REGRESSION_FACTOR", "1.5"))
+
+# Rótulo do endpoint no AnymarketClient -> entidade
+ENDPOINT_ENTITIES = {
+    "products": "products",
+    "products/{id}": "products",
+    "orders": "orders",
+    "skus/marketplaces": "sku_marketplaces",
+    "transmissions": "transmissions",
+    "stocks": "stocks",
+}
+
+SYNC_ENTITIES = ("products", "orders", "sku_marketplaces", "transmissions")
+COUNTERS = ("pages", "api_calls", "api_bytes", "rate_limited", "inserted", "updated")
+TIMINGS = ("fetch", "transform", "write")
+
+
+class SyncRunRecorder:
+    """Contadores e tempos por entidade da execução em andamento; inativo até start()."""
+
+    def __init__(self):
+        self.active = False
+        self.reset()
+
+    def reset(self):
+        self._counts = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        self._seconds = defaultdict(lambda: dict.fromkeys(TIMINGS, 0.0))
+        self._peak_rss = {}
+        self._stack = []
+
+    def start(self):
+        self.reset()
+        self.active = True
+
+    def api_call(self, endpoint, status, size):
+        if not self.active:
+            return
+        counts = self._counts[ENDPOINT_ENTITIES.get(endpoint, endpoint)]
+        counts["api_calls"] += 1
+        counts["api_bytes"] += size
+        if status == 429:
+            counts["rate_limited"] += 1
+
+    def page(self, entity, rss=None):
+        if self.active:
+            self._counts[entity]["pages"] += 1
+            if rss is not None:
+                self._peak_rss[entity] = max(self._peak_rss.get(entity, 0), rss)
+
+    def stored(self, entity, inserted=0, updated=0):
+        if self.active:
+            self._counts[entity]["inserted"] += inserted
+            self._counts[entity]["updated"] += updated
+
+    @contextmanager
+    def stage(self, name, entity):
+        """Soma o tempo do bloco em fetch/transform/write da entidade, sem contar o das etapas internas."""
+        if not self.active:
+            yield
+            return
+        now = time.perf_counter()
+        if self._stack:
+            outer_name, outer_entity, started = self._stack[-1]
+            self._seconds[outer_entity][outer_name] += now - started
+        self._stack.append((name, entity, now))
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._seconds[entity][name] += now - self._stack.pop()[2]
+            if self._stack:
+                outer_name, outer_entity, _ = self._stack[-1]
+                self._stack[-1] = (outer_name, outer_entity, now)
+
+    def _entity_rows(self, run_id, stage_seconds):
+        skipped = defaultdict(int)
+        unchanged = defaultdict(int)
+        for _, (entity, reason), _, value in sync_records_skipped.samples():
+            if reason == "unchanged":
+                unchanged[entity] += value
+            else:
+                skipped[entity] += value
+
+        entities = set(self._counts) | set(self._seconds) | {e for e in SYNC_ENTITIES if e in stage_seconds}
+        rows = []
+        for entity in sorted(entities):
+            fetched = int(sync_records_fetched.value(entity=entity))
+            duration = stage_seconds.get(entity)
+            rows.append(models.SyncRunEntity(
+                run_id=run_id,
+                entity=entity,
+                **self._counts.get(entity, dict.fromkeys(COUNTERS, 0)),
+                fetched=fetched,
+                unchanged=int(unchanged[entity]),
+                skipped=int(skipped[entity]),
+                **{f"{k}_seconds": round(v, 3) for k, v in self._seconds.get(entity, dict.fromkeys(TIMINGS, 0.0)).items()},
+                duration_seconds=duration,
+                records_per_second=round(fetched / duration, 2) if duration else None,
+                peak_rss_bytes=self._peak_rss.get(entity),
+            ))
+        return rows
+
+    def save(self, db, started_at, finished_at, stage_seconds, error=None):
+        """Grava a execução e as linhas por entidade na sessão (sem commit). Retorna o id da execução."""
+        run = models.SyncRun(
+            started_at=started_at,
+            finished_at=finished_at,
+            status="error" if error else "success",
+            error=error,
+            duration_seconds=round((finished_at - started_at).total_seconds(), 3),
+            stage_seconds=stage_seconds,
+        )
+        db.add(run)
+        db.flush()
+        rows = self._entity_rows(run.id, stage_seconds)
+        run.total_records = sum(r.inserted + r.updated for r in rows)
+        db.add_all(rows)
+        self.active = False
+        return run.id
+
+
+sync_run = SyncRunRecorder()
+
+
+# --- Histórico e regressões --------------------------------------------------
+
+def _per_record(seconds, records):
+    return seconds / records if records else None
+
+
+# métrica -> (função da linha, True se maior é pior)
+ENTITY_INDICATORS = {
+    "duration_seconds": (lambda r: r.duration_seconds, True),
+    "records_per_second": (lambda r: r.records_per_second, False),
+    "fetch_seconds_per_call": (lambda r: _per_record(r.fetch_seconds, r.api_calls), True),
+    "write_seconds_per_record": (lambda r: _per_record(r.write_seconds, r.inserted + r.updated + r.unchanged), True),
+    "transform_seconds_per_record": (lambda r: _per_record(r.transform_seconds, r.fetched - r.skipped), True),
+    "rate_limited": (lambda r: r.rate_limited, True),
+    "peak_rss_bytes": (lambda r: r.peak_rss_bytes, True),
+}
+
+
+# Com base zero, qualquer valor acima de zero já é regressão (tempos com base zero são ignorados)
+ZERO_BASELINE_INDICATORS = {"rate_limited"}
+
+
+def _regressed(name, value, base, higher_is_worse, factor):
+    if value is None or base is None:
+        return False
+    if not base:
+        return name in ZERO_BASELINE_INDICATORS and value > 0
+    if higher_is_worse:
+        return value > base * factor
+    return value < base / factor
+
+
+def _compare(values, baseline_values, indicators, factor):
+    """({indicador: mediana da base}, [indicadores com regressão])"""
+    baseline, regressions = {}, []
+    for name, higher_is_worse in indicators.items():
+        history = [v for v in baseline_values.get(name, []) if v is not None]
+        base = median(history) if len(history) >= SYNC_BASELINE_MIN_RUNS else None
+        baseline[name] = round(base, 6) if base is not None else None
+        if _regressed(name, values.get(name), base, higher_is_worse, factor):
+            regressions.append(name)
+    return baseline, regressions
+
+
+def _rounded(value):
+    return round(value, 6) if isinstance(value, float) else value
+
+
+def run_history(db, limit=30, entity=None, baseline_runs=SYNC_BASELINE_RUNS, factor=SYNC_REGRESSION_FACTOR):
+    """
+    Últimas `limit` execuções (mais recente primeiro), cada uma com os números
+    por entidade, a mediana das `baseline_runs` execuções bem-sucedidas
+    anteriores e os indicadores que pioraram mais que `factor` vezes.
+    """
+    runs = (
+        db.query(models.SyncRun)
+        .order_by(models.SyncRun.started_at.desc(), models.SyncRun.id.desc())
+        .limit(limit + baseline_runs)
+        .all()
+    )
+    rows = defaultdict(dict)
+    if runs:
+        query = db.query(models.SyncRunEntity).filter(models.SyncRunEntity.run_id.in_([r.id for r in runs]))
+        if entity:
+            query = query.filter(models.SyncRunEntity.entity == entity)
+        for row in query:
+            rows[row.run_id][row.entity] = row
+
+    result = []
+    for i, run in enumerate(runs[:limit]):
+        previous = [r for r in runs[i + 1:] if r.status == "success"][:baseline_runs]
+
+        _, run_regressions = _compare(
+            {"duration_seconds": run.duration_seconds},
+            {"duration_seconds": [r.duration_seconds for r in previous]},
+            {"duration_seconds": True}, factor,
+        )
+        entities = {}
+        for name, row in sorted(rows[run.id].items()):
+            values = {k: fn(row) for k, (fn, _) in ENTITY_INDICATORS.items()}
+            history = {
+                k: [fn(rows[r.id][name]) for r in previous if name in rows[r.id]]
+                for k, (fn, _) in ENTITY_INDICATORS.items()
+            }
+            baseline, regressions = _compare(
+                values, history, {k: worse for k, (_, worse) in ENTITY_INDICATORS.items()}, factor
+            )
+            entities[name] = {
+                **{c.name: getattr(row, c.name) for c in models.SyncRunEntity.__table__.columns if c.name not in ("id", "run_id", "entity")},
+                **{k: _rounded(v) for k, v in values.items()},
+                "baseline": baseline,
+                "regressions": regressions,
+            }
+            run_regressions += [f"{name}.{r}" for r in regressions]
+
+        result.append({
+            "id": run.id,
+            "started_at": run.started_at,
+            "finished_at": run.finished_at,
+            "status": run.status,
+            "error": run.error,
+            "duration_seconds": run.duration_seconds,
+            "total_records": run.total_records,
+            "stage_seconds": run.stage_seconds,
+            "entities": entities,
+            "regressions": run_regressions,
+        })
+
+    # Série de throughput por entidade, da execução mais antiga para a mais recente
+    trends = defaultdict(list)
+    for run in reversed(result):
+        for name, values in run["entities"].items():
+            trends[name].append({
+                "run_id": run["id"],
+                "started_at": run["started_at"],
+                "records_per_second": values["records_per_second"],
+                "duration_seconds": values["duration_seconds"],
+            })
+
+    return {
+        "baseline_runs": baseline_runs,
+        "regression_factor": factor,
+        "runs": result,
+        "trends": trends,
+    }
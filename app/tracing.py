@@ -0,0 +1,195 @@
+"""
+Spans de tracing gravados em arquivo local, no formato Trace Event do Chrome.
+
+O arquivo abre direto no Perfetto (https://ui.perfetto.dev) ou em
+chrome://tracing, sem coletor externo. Cada span é um evento "X" (início +
+duração); spans do mesmo track aninhados no tempo aparecem como filhos.
+
+Desligado por padrão: sem arquivo configurado, span() não registra nada.
+  - daily_update.py: --trace ARQUIVO (ou TRACE_FILE)
+  - API: TRACE_FILE (um request por track)
+
+O arquivo usa o formato de array JSON, que o visualizador aceita sem o "]"
+final; os eventos são acrescentados em lotes de TRACE_FLUSH_EVENTS e no
+encerramento do processo.
+"""
+
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_FLUSH_EVENTS = int(os.getenv("TRACE_FLUSH_EVENTS", "1000"))
+
+# Track dos spans do contexto atual (um por request na API); sem track, usa a thread
+_track = contextvars.ContextVar("trace_track", default=None)
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "_ts", "_start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self._ts = time.time_ns() // 1000
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = (time.perf_counter() - self._start) * 1_000_000
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.complete(self.name, self.category, self._ts, duration, self.args)
+        return False
+
+    def set(self, **args):
+        """Acrescenta argumentos ao span (ex: status, linhas gravadas)."""
+        self.args.update(args)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    def __init__(self):
+        self.path = None
+        self._events = []
+        self._lock = threading.Lock()
+        self._tracks = itertools.count(1)
+        self._pid = os.getpid()
+        self._started = False
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def configure(self, path, process_name):
+        """Passa a gravar spans em `path` (o arquivo é recriado)."""
+        if not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[\n")
+        self.path = path
+        self._pid = os.getpid()
+        self._append({"name": "process_name", "ph": "M", "pid": self._pid, "tid": 0, "args": {"name": process_name}})
+        if not self._started:
+            atexit.register(self.flush)
+            self._started = True
+        logger.info(f"Tracing ativo: {path}")
+
+    def span(self, name, category="app", **args):
+        if self.path is None:
+            return _NOOP
+        return _Span(self, name, category, args)
+
+    def new_track(self, name):
+        """Track próprio para o contexto atual (ex: um request). Retorna o token para end_track()."""
+        if self.path is None:
+            return None
+        track = 1_000_000 + next(self._tracks)
+        self._append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": track, "args": {"name": name}})
+        return _track.set(track)
+
+    def end_track(self, token):
+        if token is not None:
+            _track.reset(token)
+
+    def complete(self, name, category, ts, duration, args):
+        track = _track.get() or threading.get_ident()
+        self._append({
+            "name": name, "cat": category, "ph": "X", "ts": ts, "dur": round(duration, 1),
+            "pid": self._pid, "tid": track, "args": args,
+        })
+
+    def _append(self, event):
+        with self._lock:
+            self._events.append(event)
+            full = len(self._events) >= TRACE_FLUSH_EVENTS
+        if full:
+            self.flush()
+
+    def flush(self):
+        if self.path is None:
+            return
+        with self._lock:
+            events, self._events = self._events, []
+            if not events:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for event in events:
+                        f.write(json.dumps(event, default=str, ensure_ascii=False))
+                        f.write(",\n")
+            except OSError as e:
+                logger.error(f"Erro ao gravar spans em {self.path}: {e}")
+
+
+tracer = Tracer()
+
+
+def span(name, category="app", **args):
+    """Atalho para tracer.span(); no-op quando o tracing está desligado."""
+    return tracer.span(name, category, **args)
+
+
+class TracingMiddleware:
+    """Middleware ASGI: um span por request (método + rota), cada request no seu track."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        from .sql_profiler import current_profile, route_label
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = tracer.new_track(f"{scope.get('method', '')} {scope.get('path', '')}")
+        try:
+            with tracer.span("request", "http", path=scope.get("path", "")) as request_span:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    # A rota só é conhecida depois do roteamento
+                    request_span.name = f"{scope.get('method', '')} {route_label(scope)}"
+                    request_span.set(status=status["code"])
+                    profile = current_profile()
+                    if profile is not None:
+                        request_span.set(queries=profile.queries, db_ms=round(profile.seconds * 1000, 2))
+        finally:
+            tracer.end_track(token)
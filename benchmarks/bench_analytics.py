@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark das agregações analíticas: Postgres (tabelas de linhas) vs espelho DuckDB.
+
+Roda as mesmas consultas de /analytics/* nos dois bancos e confere que os
+resultados batem:
+  - top marcas e top categorias (GROUP BY em products)
+  - receita por marketplace (GROUP BY em orders)
+
+Usa o banco de DATABASE_URL; com --seed, insere antes produtos e pedidos
+sintéticos (use um banco descartável). O espelho é gerado do zero em um
+arquivo temporário, e o tempo dessa cópia também é mostrado.
+
+Uso:
+    DATABASE_URL=postgresql://... python benchmarks/bench_analytics.py --repeat 20
+    DATABASE_URL=postgresql://.../bench python benchmarks/bench_analytics.py --seed 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, insert
+
+from app import models
+from app.analytics import AnalyticsMirror, refresh_analytics_mirror, revenue_by_marketplace, top_products_by
+from app.database import SessionLocal, engine
+
+MARKETPLACES = ["MERCADO_LIVRE", "AMAZON", "MAGALU", "SHOPEE", "NETSHOES", "AMERICANAS"]
+STATUSES = ["PAID", "INVOICED", "SHIPPED", "CONCLUDED", "CANCELED"]
+
+
+def seed(db, count, batch_size=5000):
+    """Insere `count` produtos e `count` pedidos sintéticos."""
+    start = datetime(2023, 1, 1)
+    for offset in range(0, count, batch_size):
+        ids = range(offset, min(offset + batch_size, count))
+        db.execute(insert(models.Product), [
+            {
+                "anymarket_id": f"bench-{i}",
+                "title": f"Produto {i}",
+                "brand_id": str(i % 300),
+                "brand_name": f"Marca {i % 300}",
+                "category_id": str(i % 120),
+                "category_name": f"Categoria {i % 120}",
+                "sku_price": round(random.uniform(10, 500), 2),
+                "total_stock": random.randint(0, 100),
+            }
+            for i in ids
+        ])
+        db.execute(insert(models.OrderState), [
+            {"order_anymarket_id": f"bench-{i}", "status": random.choice(STATUSES)}
+            for i in ids
+        ])
+        db.execute(insert(models.Order), [
+            {
+                "anymarket_id": f"bench-{i}",
+                "marketplace": random.choice(MARKETPLACES),
+                "created_at_anymarket": start + timedelta(minutes=random.randint(0, 60 * 24 * 700)),
+                "gross": round(random.uniform(20, 800), 2),
+                "total": round(random.uniform(20, 800), 2),
+                "discount": round(random.uniform(0, 20), 2),
+                "freight": round(random.uniform(0, 40), 2),
+            }
+            for i in ids
+        ])
+        db.commit()
+
+
+def pg_top_products_by(db, column, limit):
+    Product = models.Product
+    attr = getattr(Product, column)
+    rows = db.query(attr, func.count(Product.id).label("count"), func.sum(Product.total_stock).label("total_stock")).filter(
+        attr.isnot(None), attr != ""
+    ).group_by(attr).order_by(func.count(Product.id).desc(), attr).limit(limit).all()
+    return [{column: row[0], "count": row.count, "total_stock": row.total_stock} for row in rows]
+
+
+def pg_revenue_by_marketplace(db):
+    Order = models.Order
+    rows = db.query(
+        Order.marketplace,
+        func.count(Order.id).label("orders_count"),
+        func.coalesce(func.sum(Order.gross), 0).label("gross"),
+        func.coalesce(func.sum(Order.total), 0).label("total"),
+        func.coalesce(func.sum(Order.discount), 0).label("discount"),
+        func.coalesce(func.sum(Order.freight), 0).label("freight"),
+    ).group_by(Order.marketplace).order_by(func.sum(Order.total).desc()).all()
+    return [row._asdict() for row in rows]
+
+
+def _timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _same(pg_rows, duck_rows):
+    def normalize(rows):
+        return [{k: round(float(v), 2) if isinstance(v, float) else v for k, v in row.items()} for row in rows]
+    return normalize(pg_rows) == normalize(duck_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Postgres vs espelho DuckDB")
+    parser.add_argument("--seed", type=int, default=0, help="Inserir N produtos e N pedidos sintéticos antes")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(
+        bind=engine, tables=[models.Product.__table__, models.Order.__table__, models.OrderState.__table__]
+    )
+    db = SessionLocal()
+    if args.seed:
+        print(f"Inserindo {args.seed} produtos e {args.seed} pedidos...")
+        seed(db, args.seed)
+
+    products = db.query(func.count(models.Product.id)).scalar()
+    orders = db.query(func.count(models.Order.id)).scalar()
+    print(f"Banco: {engine.url.render_as_string(hide_password=True)} ({products} produtos, {orders} pedidos)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.duckdb")
+        t0 = time.perf_counter()
+        refresh_analytics_mirror(db, path=path)
+        print(f"Cópia inicial do espelho DuckDB: {time.perf_counter() - t0:.2f}s")
+        mirror = AnalyticsMirror(path)
+
+        cases = [
+            ("top marcas",
+             lambda: pg_top_products_by(db, "brand_name", args.limit),
+             lambda: top_products_by("brand_name", args.limit, mirror=mirror)),
+            ("top categorias",
+             lambda: pg_top_products_by(db, "category_name", args.limit),
+             lambda: top_products_by("category_name", args.limit, mirror=mirror)),
+            ("receita por marketplace",
+             lambda: pg_revenue_by_marketplace(db),
+             lambda: revenue_by_marketplace(mirror=mirror)),
+        ]
+
+        print()
+        print(f"Melhor de {args.repeat} execuções (o DuckDB inclui abrir o arquivo, como na API)")
+        print(f"{'consulta':<26} {'banco ms':>12} {'duckdb ms':>10} {'ganho':>7}  resultado")
+        for name, pg_fn, duck_fn in cases:
+            pg_time, pg_rows = _timeit(pg_fn, args.repeat)
+            duck_time, duck_rows = _timeit(duck_fn, args.repeat)
+            check = "igual" if _same(pg_rows, duck_rows) else "DIFERENTE"
+            print(f"{name:<26} {pg_time * 1000:>12.2f} {duck_time * 1000:>10.2f} {pg_time / duck_time:>6.1f}x  {check}")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Custo de CPU do logging no caminho quente da sincronização.
+
+Simula os logs de N registros gravados em páginas de 50, sem banco e sem
+API, e compara:
+  1. antes: basicConfig, uma linha INFO por registro com f-string
+  2. fila + amostragem, ainda com uma linha INFO por registro (lazy)
+  3. depois: fila, registros em DEBUG e um evento por página (texto)
+  4. igual ao 3, em JSON (LOG_FORMAT=json)
+
+Para cada caso mostra o CPU da thread que loga (o que a sincronização
+paga) e o CPU do processo inteiro, que inclui a thread do QueueListener.
+A saída vai para /dev/null, então o custo de disco não entra na medida.
+
+Uso:
+    python benchmarks/bench_logging.py --records 200000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.sync_logging import configure_logging, shutdown_logging, SAMPLE
+
+PAGE_SIZE = 50
+logger = logging.getLogger("daily_update")
+
+
+def _per_record_fstring(records):
+    for start in range(0, records, PAGE_SIZE):
+        for anymarket_id in range(start, min(start + PAGE_SIZE, records)):
+            logger.info(f"Product atualizado: {anymarket_id}")
+        logger.info(f"products: {start + PAGE_SIZE} processados ate agora")
+
+
+def _per_record_lazy(records):
+    for start in range(0, records, PAGE_SIZE):
+        for anymarket_id in range(start, min(start + PAGE_SIZE, records)):
+            logger.info("Product atualizado: %s", anymarket_id, extra=SAMPLE)
+        logger.info("%s: %d processados ate agora", "products", start + PAGE_SIZE)
+
+
+def _page_summary(records):
+    for start in range(0, records, PAGE_SIZE):
+        for anymarket_id in range(start, min(start + PAGE_SIZE, records)):
+            logger.debug("Product atualizado: %s", anymarket_id, extra=SAMPLE)
+        logger.info(
+            "%s: pagina gravada (%d recebidos, %d inseridos, %d atualizados)", "products", PAGE_SIZE, 0, PAGE_SIZE,
+            extra={"event": "page_saved", "entity": "products", "received": PAGE_SIZE, "inserted": 0,
+                   "updated": PAGE_SIZE, "skipped": 0},
+        )
+
+
+def _basic_config(stream):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    logging.basicConfig(level=logging.INFO, stream=stream, force=True)
+
+
+def _measure(setup, workload, records, stream):
+    setup(stream)
+    wall, process, thread = time.perf_counter(), time.process_time(), time.thread_time()
+    workload(records)
+    thread = time.thread_time() - thread
+    shutdown_logging()  # espera a fila esvaziar
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+    return thread, time.process_time() - process, time.perf_counter() - wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU do logging no caminho quente da sincronização")
+    parser.add_argument("--records", type=int, default=200_000)
+    args = parser.parse_args()
+
+    cases = [
+        ("antes: INFO por registro (f-string)", _basic_config, _per_record_fstring),
+        ("fila + amostragem, INFO por registro", lambda s: configure_logging("text", "INFO", s), _per_record_lazy),
+        ("fila + resumo por pagina (texto)", lambda s: configure_logging("text", "INFO", s), _page_summary),
+        ("fila + resumo por pagina (JSON)", lambda s: configure_logging("json", "INFO", s), _page_summary),
+    ]
+
+    print(f"Logging de {args.records} registros em paginas de {PAGE_SIZE} (saida em /dev/null)")
+    print(f"{'caso':<40} {'CPU thread (s)':>15} {'CPU processo (s)':>17} {'us/registro':>12}")
+    baseline = None
+    with open(os.devnull, "w") as devnull:
+        for name, setup, workload in cases:
+            thread, process, _ = _measure(setup, workload, args.records, devnull)
+            baseline = baseline or thread
+            per_record = thread * 1_000_000 / args.records
+            print(f"{name:<40} {thread:>15.3f} {process:>17.3f} {per_record:>12.2f}   ({baseline / thread:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Amplificação de escrita de mudanças de status/tracking: linha larga vs order_states.
+
+Copia uma amostra de pedidos para duas tabelas descartáveis, com os mesmos
+índices das tabelas reais:
+  - bench_orders_wide: orders + campos de order_states numa linha só (layout antigo)
+  - bench_order_states: cópia de order_states (layout novo, fillfactor 70)
+
+e aplica nas duas a mesma carga: a cada rodada, muda o tracking de todos os
+pedidos da amostra e o status de uma parte deles. Para cada tabela mostra o
+WAL gerado, quantos updates foram HOT e o crescimento da tabela + índices.
+As tabelas de teste são removidas no fim. Só PostgreSQL.
+
+Uso:
+    python benchmarks/bench_order_state_writes.py --orders 20000 --rounds 5 --status-ratio 0.2
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.models import ORDER_STATE_FIELDS
+
+WIDE_TABLE = "bench_orders_wide"
+NARROW_TABLE = "bench_order_states"
+
+
+def _setup(conn, orders):
+    state_columns = ", ".join(f"s.{name}" for name in ORDER_STATE_FIELDS)
+    conn.execute(text(f"DROP TABLE IF EXISTS {WIDE_TABLE}, {NARROW_TABLE}"))
+
+    # Layout antigo: a linha de orders com status e tracking, e os índices de
+    # orders mais o índice de status que existia antes
+    conn.execute(text(
+        f"CREATE TABLE {WIDE_TABLE} AS "
+        f"SELECT o.*, {state_columns} FROM orders o "
+        f"JOIN order_states s ON s.order_anymarket_id = o.anymarket_id "
+        f"ORDER BY o.id DESC LIMIT :orders"
+    ), {"orders": orders})
+    indexes = conn.execute(text(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'orders'"
+    )).scalars().all()
+    for number, indexdef in enumerate(indexes):
+        columns = indexdef[indexdef.index("("):]
+        using = " USING gin " if " USING gin " in indexdef else " "
+        conn.execute(text(f"CREATE INDEX bench_wide_ix{number} ON {WIDE_TABLE}{using}{columns}"))
+    conn.execute(text(f"CREATE INDEX bench_wide_ix_status ON {WIDE_TABLE} (status)"))
+
+    conn.execute(text(
+        f"CREATE TABLE {NARROW_TABLE} (LIKE order_states INCLUDING ALL) WITH (fillfactor = 70)"
+    ))
+    conn.execute(text(
+        f"INSERT INTO {NARROW_TABLE} SELECT s.* FROM order_states s "
+        f"JOIN {WIDE_TABLE} w ON w.anymarket_id = s.order_anymarket_id"
+    ))
+    conn.execute(text(f"ANALYZE {WIDE_TABLE}"))
+    conn.execute(text(f"ANALYZE {NARROW_TABLE}"))
+
+
+def _total_size(conn, table):
+    size = conn.execute(text("SELECT pg_total_relation_size(:table)"), {"table": table}).scalar()
+    conn.commit()
+    return size
+
+
+def _run(conn, table, key, rounds, status_ratio):
+    """Aplica a carga, uma transação por rodada, e devolve as métricas."""
+    size_before = _total_size(conn, table)
+    elapsed = 0.0
+    updated = hot = wal = 0
+    modulo = max(1, round(1 / status_ratio)) if status_ratio > 0 else 0
+
+    for number in range(rounds):
+        lsn_before = conn.execute(text("SELECT pg_current_wal_insert_lsn()")).scalar()
+        t0 = time.perf_counter()
+        conn.execute(text(
+            f"UPDATE {table} SET tracking_delivery_status = :tracking, tracking_date = now()"
+        ), {"tracking": f"EM_TRANSITO_{number}"})
+        if modulo:
+            conn.execute(text(
+                f"UPDATE {table} SET status = :status WHERE abs(hashtext({key})) % :modulo = :slot"
+            ), {"status": f"STATUS_{number}", "modulo": modulo, "slot": number % modulo})
+        elapsed += time.perf_counter() - t0
+        wal += conn.execute(text(
+            "SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :lsn)"
+        ), {"lsn": lsn_before}).scalar()
+        # Contadores da própria transação, lidos antes do commit
+        counters = conn.execute(text(
+            "SELECT pg_stat_get_xact_tuples_updated(CAST(:table AS regclass)), "
+            "pg_stat_get_xact_tuples_hot_updated(CAST(:table AS regclass))"
+        ), {"table": table}).one()
+        updated += counters[0]
+        hot += counters[1]
+        conn.commit()
+
+    return {
+        "ms": elapsed * 1000,
+        "wal": int(wal),
+        "updated": updated,
+        "hot": hot,
+        "growth": _total_size(conn, table) - size_before,
+    }
+
+
+def _mb(value):
+    return f"{value / 1024 / 1024:.2f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAL e updates HOT: orders larga vs order_states")
+    parser.add_argument("--orders", type=int, default=20000, help="Pedidos na amostra")
+    parser.add_argument("--rounds", type=int, default=5, help="Rodadas de atualização")
+    parser.add_argument("--status-ratio", type=float, default=0.2, help="Fração dos pedidos que muda de status por rodada")
+    parser.add_argument("--keep", action="store_true", help="Não remover as tabelas de teste")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        sys.exit("Este benchmark mede WAL e updates HOT e só roda no PostgreSQL")
+
+    with engine.connect() as conn:
+        _setup(conn, args.orders)
+        sample = conn.execute(text(f"SELECT count(*) FROM {WIDE_TABLE}")).scalar()
+        conn.commit()
+        print(f"Amostra: {sample} pedidos, {args.rounds} rodadas, status muda em {args.status_ratio:.0%} por rodada")
+
+        try:
+            results = {
+                "linha larga (antes)": _run(conn, WIDE_TABLE, "anymarket_id", args.rounds, args.status_ratio),
+                "order_states (agora)": _run(conn, NARROW_TABLE, "order_anymarket_id", args.rounds, args.status_ratio),
+            }
+        finally:
+            conn.rollback()
+            if not args.keep:
+                conn.execute(text(f"DROP TABLE IF EXISTS {WIDE_TABLE}, {NARROW_TABLE}"))
+                conn.commit()
+
+    print()
+    print(f"{'layout':<22} {'tempo ms':>10} {'WAL':>12} {'updates':>9} {'HOT':>7} {'crescimento':>13}")
+    for name, r in results.items():
+        hot = f"{r['hot'] / r['updated']:.0%}" if r["updated"] else "-"
+        print(f"{name:<22} {r['ms']:>10.1f} {_mb(r['wal']):>12} {r['updated']:>9} {hot:>7} {_mb(r['growth']):>13}")
+
+    wide, narrow = results.values()
+    if narrow["wal"]:
+        print(f"\nWAL: {wide['wal'] / narrow['wal']:.1f}x menor com order_states")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialização: tempo para serializar 100 produtos.
+
+Compara três caminhos sobre os mesmos dados (SQLite em memória):
+  1. padrão do FastAPI: objetos ORM -> jsonable_encoder -> json.dumps
+  2. orjson direto sobre os objetos ORM (app.serialization.dumps)
+  3. colunas JSON lidas como texto e copiadas sem decodificar (query_to_json)
+
+Também mostra o tamanho do corpo sem compressão, com gzip e com brotli.
+
+Uso:
+    python benchmarks/bench_serialization.py --products 100 --repeat 200
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.serialization import dumps, query_to_json
+from daily_update import _build_product_fields
+
+
+def _fake_product(i):
+    skus = [
+        {
+            "id": i * 10 + j,
+            "title": f"Produto {i} variação {j}",
+            "partnerId": f"SKU-{i}-{j}",
+            "ean": f"789{i:06d}{j:03d}",
+            "price": round(random.uniform(10, 500), 2),
+            "amount": random.randint(0, 100),
+            "additionalTime": 0,
+            "stockLocalId": "1",
+            "variations": [{"id": j, "description": "Azul", "type": {"id": 1, "name": "Cor"}}],
+        }
+        for j in range(4)
+    ]
+    images = [
+        {
+            "id": i * 100 + j,
+            "index": j,
+            "main": j == 0,
+            "url": f"https://cdn.example.com/{i}/{j}.jpg",
+            "thumbnailUrl": f"https://cdn.example.com/{i}/{j}_thumb.jpg",
+            "standardUrl": f"https://cdn.example.com/{i}/{j}_std.jpg",
+            "status": "PROCESSED",
+            "standardWidth": 1000,
+            "standardHeight": 1000,
+        }
+        for j in range(6)
+    ]
+    characteristics = [{"index": j, "name": f"Atributo {j}", "value": f"Valor {j}"} for j in range(8)]
+    return {
+        "id": i,
+        "title": f"Produto de teste {i}",
+        "description": "Descrição longa " * 30,
+        "category": {"id": 10, "name": "Categoria", "path": "Raiz/Categoria"},
+        "brand": {"id": 20, "name": "Marca", "reducedName": "MRC"},
+        "createdAt": "2024-01-01T10:00:00Z",
+        "skus": skus,
+        "images": images,
+        "characteristics": characteristics,
+    }
+
+
+def _timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialização de produtos")
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine, tables=[models.Product.__table__])
+    db = sessionmaker(bind=engine)()
+    for i in range(args.products):
+        db.add(models.Product(**_build_product_fields(_fake_product(i))))
+    db.commit()
+
+    def default_path():
+        db.expunge_all()
+        products = db.query(models.Product).limit(args.products).all()
+        return json.dumps(jsonable_encoder(products)).encode("utf-8")
+
+    def orjson_path():
+        db.expunge_all()
+        products = db.query(models.Product).limit(args.products).all()
+        return dumps(products)
+
+    def raw_json_path():
+        return bytes(query_to_json(db.query(models.Product).limit(args.products)))
+
+    # Os três caminhos precisam produzir o mesmo conteúdo
+    reference = json.loads(default_path())
+    assert json.loads(orjson_path()) == reference
+    assert json.loads(raw_json_path()) == reference
+
+    print(f"Serialização de {args.products} produtos (melhor de {args.repeat} execuções, inclui a consulta)")
+    print(f"{'caminho':<34} {'ms':>9} {'ms/100 produtos':>16}")
+    baseline = None
+    for name, fn in [
+        ("jsonable_encoder + json.dumps", default_path),
+        ("orjson sobre objetos ORM", orjson_path),
+        ("orjson + colunas JSON como texto", raw_json_path),
+    ]:
+        elapsed = _timeit(fn, args.repeat)
+        baseline = baseline or elapsed
+        per_100 = elapsed * 1000 * 100 / args.products
+        print(f"{name:<34} {elapsed * 1000:>9.2f} {per_100:>16.2f}   ({baseline / elapsed:.1f}x)")
+
+    body = raw_json_path()
+    print()
+    print(f"Tamanho do corpo: {len(body)} bytes")
+    print(f"  gzip:   {len(gzip.compress(body, 6))} bytes")
+    try:
+        import brotli
+        print(f"  brotli: {len(brotli.compress(body, quality=4))} bytes")
+    except ImportError:
+        print("  brotli: pacote não instalado")
+
+
+if __name__ == "__main__":
+    main()
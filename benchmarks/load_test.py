@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Teste de carga: endpoints síncronos vs async def de produtos.
+
+Dispara N clientes concorrentes contra o mesmo endpoint nas duas versões
+(ex: /products/with-stock e /async/products/with-stock) e compara
+throughput e latência.
+
+Rode a API com o cache de respostas desligado, senão os dois caminhos só
+medem o cache:
+
+    RESPONSE_CACHE_MAX_ENTRIES=0 uvicorn app.main:app --workers 1
+    python benchmarks/load_test.py --clients 500 --duration 30
+
+Uso:
+    python benchmarks/load_test.py --base-url http://localhost:8000 --path /products/with-stock
+"""
+
+import argparse
+import threading
+import time
+
+import requests
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_load(url, clients, duration):
+    """Executa `clients` threads fazendo GET em loop durante `duration` segundos."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    start_barrier = threading.Barrier(clients)
+
+    def worker():
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        start_barrier.wait()
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                response = session.get(url, params={"limit": 50}, timeout=60)
+                if response.status_code != 200:
+                    local_errors += 1
+                    continue
+            except requests.exceptions.RequestException:
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga sync vs async")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/products/with-stock", help="Endpoint síncrono; a versão async é /async + path")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos por cenário")
+    args = parser.parse_args()
+
+    scenarios = [
+        ("sync", f"{args.base_url}{args.path}"),
+        ("async", f"{args.base_url}/async{args.path}"),
+    ]
+
+    print(f"Clientes concorrentes: {args.clients}, duração: {args.duration}s por cenário")
+    print(f"{'cenario':<8} {'reqs':>8} {'erros':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, url in scenarios:
+        r = run_load(url, args.clients, args.duration)
+        print(
+            f"{name:<8} {r['requests']:>8} {r['errors']:>6} {r['throughput_rps']:>9.1f} "
+            f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,24 +9,70 @@ Uso:
     python daily_update.py --auto --sku-marketplaces # inclui SKU marketplaces
     python daily_update.py --auto --transmissions    # inclui transmissions
     python daily_update.py --auto --all              # sincroniza tudo
+    python daily_update.py --auto --snapshot         # grava snapshot Parquet ao final
+    python daily_update.py --auto --analytics        # atualiza o espelho DuckDB ao final
+    python daily_update.py --auto --metrics-file /var/lib/node_exporter/anymarket_sync.prom
+    python daily_update.py --auto --trace sync_trace.json   # spans para o Perfetto / chrome://tracing
+    python daily_update.py --auto --profile          # cProfile por etapa + tracemalloc por pagina
+    python daily_update.py --auto --all --bounded-memory  # sessao reciclada por pagina (backfills grandes)
+    python daily_update.py --rebuild-rollups         # recalcula order_daily_rollup e sku_sales_daily
+    python daily_update.py --rebuild-children        # recria as tabelas filhas (skus, images, items...)
+    python daily_update.py --rebuild-dimensions      # recalcula brands, categories, nbms e origins
+    python daily_update.py --partition-orders        # converte orders em tabela particionada por mes
+    python daily_update.py --detach-orders-before 2023-01  # desanexa particoes antigas de orders
+    python daily_update.py --archive-orders          # arquiva em Parquet os pedidos fora da janela quente
 """
 
 import argparse
 import json
 import sys
 import time
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent))
 
 from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
 from app.database import engine, SessionLocal
 from app import models
+from app.cache import bump_data_version
+from app.children import (
+    ChildRowsWriter, PRODUCT_CHILD_MODELS, ORDER_CHILD_MODELS,
+    rebuild_product_children, rebuild_order_children,
+)
+from app.dimensions import dimension_cache, rebuild_dimensions
+from app.order_state import split_order_fields, assign_changed, save_order_state
+from app.partitions import order_partitions, partition_orders_table, detach_order_partitions
+from app.archive import archive_cold_orders, ORDER_HOT_MONTHS
+from app.snapshot import write_snapshots, SNAPSHOT_DIR
+from app.analytics import refresh_analytics_mirror, ANALYTICS_DB_PATH
+from app.rollups import (
+    OrderRollupDeltas, SkuSalesDeltas, stored_orders,
+    apply_order_rollup_deltas, apply_sku_sales_deltas,
+    rebuild_order_daily_rollup, rebuild_sku_sales_daily,
+)
 from app.anymarket_client import AnymarketClient
+from app.tracing import tracer, span, TRACE_FILE
+from app.sql_profiler import instrument_engines
+from app.profiling import sync_profiler
+from app.sync_runs import sync_run
+from app.sync_memory import sync_memory, SYNC_BOUNDED_MEMORY
+from app.metrics import (
+    registry, stage_timer, read_textfile_value, SYNC_FAMILIES, METRICS_TEXTFILE,
+    sync_records_fetched, sync_records_written, sync_records_skipped,
+    sync_stage_seconds, sync_last_success, sync_last_run_ok,
+)
+from app.sync_logging import configure_logging, SAMPLE
+from app.dead_letters import (
+    is_record_error, error_text, store_dead_letter, pending_dead_letters, pending_counts,
+    mark_failed, mark_resolved, DEAD_LETTER_RETRY_BATCH,
+)
 import logging
 
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -76,6 +122,93 @@ def safe_float(value, default=0):
 # Lookup: última data de cada entidade
 # ---------------------------------------------------------------------------
 
+@contextmanager
+def _stage(name, entity):
+    """Etapa fetch/transform/write: tempo por entidade em sync_runs e cProfile da etapa (--profile)."""
+    with sync_run.stage(name, entity), sync_profiler.stage(name):
+        yield
+
+
+def _page_done(db, entity):
+    """Fim de uma pagina gravada: RSS e sessao (--bounded-memory), sync_runs e snapshot de memoria (--profile)."""
+    rss = sync_memory.page_done(db, entity)
+    sync_run.page(entity, rss)
+    sync_profiler.page(entity)
+
+
+def _log_page(entity, received, inserted, updated, rejected=0):
+    """Um evento por pagina gravada, no lugar de uma linha por registro (as linhas por registro ficam em DEBUG)."""
+    logger.info(
+        "%s: pagina gravada (%d recebidos, %d inseridos, %d atualizados, %d com erro)",
+        entity, received, inserted, updated, rejected,
+        extra={"event": "page_saved", "entity": entity, "received": received, "inserted": inserted,
+               "updated": updated, "rejected": rejected, "skipped": received - inserted - updated},
+    )
+
+
+def _build_page(records, build_fn, entity, label):
+    """
+    Etapa de transformacao de uma pagina: aplica build_fn a cada registro da API.
+    Retorna ([(registro, campos)], [(registro, erro)]); os registros invalidos sao logados e contados.
+    """
+    built, invalid = [], []
+    with span(f"transform {entity}", "transform", records=len(records)), _stage("transform", entity):
+        for record in records:
+            try:
+                built.append((record, build_fn(record)))
+            except (ValueError, TypeError) as e:
+                logger.error("Erro ao processar %s %s: %s", label, record.get("id"), e)
+                sync_records_skipped.inc(entity=entity, reason="invalid")
+                invalid.append((record, e))
+    return built, invalid
+
+
+def _write_isolated(write_fn, built, db, entity):
+    """
+    Grava a pagina com write_fn (que faz o commit). Se o banco recusar o lote por causa
+    de algum registro, faz rollback e divide o lote ao meio ate isolar os registros com
+    erro; o resto e gravado. Retorna (contagens, [(registro, erro)]).
+    """
+    try:
+        return write_fn(built, db), []
+    except SQLAlchemyError as e:
+        db.rollback()
+        if not built or not is_record_error(e):
+            raise
+        if len(built) == 1:
+            record = built[0][0]
+            logger.warning("%s %s recusado pelo banco: %s", entity, record.get("id"), error_text(e))
+            return Counter(), [(record, e)]
+        logger.debug("%s: lote de %d recusado, dividindo (%s)", entity, len(built), error_text(e))
+        middle = len(built) // 2
+        counts, failed = _write_isolated(write_fn, built[:middle], db, entity)
+        rest_counts, rest_failed = _write_isolated(write_fn, built[middle:], db, entity)
+        return counts + rest_counts, failed + rest_failed
+
+
+def _record_page(entity, received, counts, invalid, failed, db, dead_letters=True):
+    """Metricas, sync_runs e log da pagina; grava os registros recusados em sync_dead_letters. Retorna os recusados."""
+    sync_records_written.inc(counts["inserted"] + counts["updated"], entity=entity)
+    for reason in ("unchanged", "missing_id"):
+        if counts[reason]:
+            sync_records_skipped.inc(counts[reason], entity=entity, reason=reason)
+    if failed:
+        sync_records_skipped.inc(len(failed), entity=entity, reason="db_error")
+    sync_run.stored(entity, counts["inserted"], counts["updated"])
+
+    rejected = invalid + failed
+    if rejected and dead_letters:
+        try:
+            for record, error in rejected:
+                store_dead_letter(db, entity, record, error)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error("Erro ao gravar dead letters de %s: %s", entity, error_text(e))
+    _log_page(entity, received, counts["inserted"], counts["updated"], len(rejected))
+    return rejected
+
+
 def get_last_date(db, model_class, date_field="created_at", fallback_days=30):
     """Busca a última data de um campo em uma tabela."""
     try:
@@ -232,11 +365,30 @@ def _build_product_fields(product_data):
     }
 
 
-def save_products(products_data, db):
-    """Salva/atualiza produtos no banco."""
-    for product_data in products_data:
-        try:
-            fields = _build_product_fields(product_data)
+# Campos de controle da sincronizacao: mudam a cada execucao e nao contam como alteracao
+SYNC_FIELDS = ("anymarket_id", "sync_status", "last_sync_date")
+
+
+def _update_existing(existing, fields):
+    """
+    Aplica os campos da API a um registro existente. So os campos que mudaram sao
+    atribuidos; last_sync_date e sempre atualizado. Retorna se algum dado mudou.
+    """
+    changed = assign_changed(existing, {k: v for k, v in fields.items() if k not in SYNC_FIELDS})
+    if changed:
+        existing.updated_at = datetime.now()
+    existing.sync_status = fields["sync_status"]
+    existing.last_sync_date = fields["last_sync_date"]
+    return changed
+
+
+def _write_products(built, db):
+    """Grava uma pagina de produtos ja transformada e suas tabelas filhas, com commit. Retorna as contagens."""
+    children = ChildRowsWriter(PRODUCT_CHILD_MODELS)
+    counts = Counter()
+
+    with span("write products", "write", records=len(built)):
+        for product_data, fields in built:
             anymarket_id = fields["anymarket_id"]
 
             existing = db.query(models.Product).filter(
@@ -244,20 +396,35 @@ def save_products(products_data, db):
             ).first()
 
             if existing:
-                for k, v in fields.items():
-                    if k != "anymarket_id":
-                        setattr(existing, k, v)
-                existing.updated_at = datetime.now()
-                logger.info(f"Product atualizado: {anymarket_id}")
+                if _update_existing(existing, fields):
+                    logger.debug("Product atualizado: %s", anymarket_id, extra=SAMPLE)
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
             else:
                 db.add(models.Product(**fields))
-                logger.info(f"Product criado: {anymarket_id}")
+                logger.debug("Product criado: %s", anymarket_id, extra=SAMPLE)
+                counts["inserted"] += 1
+            children.add_product(anymarket_id, product_data)
 
-        except (ValueError, TypeError) as e:
-            logger.error(f"Erro ao processar product {product_data.get('id')}: {e}")
-            continue
+        children.flush(db)
+        dimension_cache.sync(db, [fields for _, fields in built])
+        bump_data_version(db, "products")
 
-    db.commit()
+    with span("commit products", "write"):
+        db.commit()
+    dimension_cache.confirm()
+    return counts
+
+
+def save_products(products_data, db, dead_letters=True):
+    """
+    Salva/atualiza produtos no banco e suas tabelas filhas. Registros recusados vao
+    para sync_dead_letters (dead_letters=False so os retorna). Retorna [(registro, erro)].
+    """
+    built, invalid = _build_page(products_data, _build_product_fields, "products", "product")
+    counts, failed = _write_isolated(_write_products, built, db, "products")
+    return _record_page("products", len(products_data), counts, invalid, failed, db, dead_letters)
 
 
 # ---------------------------------------------------------------------------
@@ -487,32 +654,80 @@ def _build_order_fields(order_data):
     }
 
 
-def save_orders(orders_data, db):
-    """Salva/atualiza orders no banco."""
-    for order_data in orders_data:
-        try:
-            fields = _build_order_fields(order_data)
-            anymarket_id = fields["anymarket_id"]
+def _write_orders(built, db):
+    """Grava uma pagina de orders ja transformada e os deltas dos agregados, com commit. Retorna as contagens."""
+    rollup_deltas = OrderRollupDeltas()
+    sku_deltas = SkuSalesDeltas()
+    children = ChildRowsWriter(ORDER_CHILD_MODELS)
+    saved_ids = set()
+    counts = Counter()
+
+    # Pedido repetido na pagina: fica so a ultima versao (como nas tabelas filhas).
+    # Sem isso o pedido existente seria subtraido dos agregados uma vez por repeticao
+    # e somado de volta uma vez so, e um pedido novo seria inserido duas vezes
+    built = list({fields["anymarket_id"]: (order_data, (fields, state_fields))
+                  for order_data, (fields, state_fields) in built}.values())
+
+    with span("write orders", "write", records=len(built)):
+        for order_data, (fields, state_fields) in built:
+            # Copia: se o lote for recusado, os mesmos campos sao gravados de novo na divisao
+            fields = dict(fields)
+            anymarket_id = fields.pop("anymarket_id")
 
             existing = db.query(models.Order).filter(
                 models.Order.anymarket_id == anymarket_id
             ).first()
 
             if existing:
-                for k, v in fields.items():
-                    if k != "anymarket_id":
-                        setattr(existing, k, v)
-                existing.updated_at = datetime.now()
-                logger.info(f"Order atualizado: {anymarket_id}")
+                rollup_deltas.add_order(existing, sign=-1)
+                sku_deltas.add_order(existing, sign=-1)
+                # A linha larga de orders so e reescrita se algum campo dela mudou;
+                # status e tracking sao atualizados em order_states
+                order_changed = assign_changed(existing, fields)
+                if order_changed:
+                    existing.updated_at = datetime.now()
+                state_changed = save_order_state(db, existing, anymarket_id, state_fields)
+                if order_changed or state_changed:
+                    logger.debug("Order atualizado: %s%s", anymarket_id, "" if order_changed else " (so status/tracking)", extra=SAMPLE)
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
             else:
-                db.add(models.Order(**fields))
-                logger.info(f"Order criado: {anymarket_id}")
+                db.add(models.Order(anymarket_id=anymarket_id, **fields))
+                save_order_state(db, None, anymarket_id, state_fields)
+                logger.debug("Order criado: %s", anymarket_id, extra=SAMPLE)
+                counts["inserted"] += 1
+            saved_ids.add(anymarket_id)
+            children.add_order(anymarket_id, order_data)
+
+        children.flush(db)
+        db.flush()
+        for order in stored_orders(db, list(saved_ids)):
+            rollup_deltas.add_order(order)
+            sku_deltas.add_order(order)
+        apply_order_rollup_deltas(db, rollup_deltas)
+        apply_sku_sales_deltas(db, sku_deltas)
+        bump_data_version(db, "orders")
+
+    with span("commit orders", "write"):
+        db.commit()
+    return counts
+
+
+def save_orders(orders_data, db, dead_letters=True):
+    """
+    Salva/atualiza orders no banco e mantem order_daily_rollup e sku_sales_daily.
+    Registros recusados vao para sync_dead_letters. Retorna [(registro, erro)].
+    """
+    built, invalid = _build_page(orders_data, lambda o: split_order_fields(_build_order_fields(o)), "orders", "order")
 
-        except (ValueError, TypeError) as e:
-            logger.error(f"Erro ao processar order {order_data.get('id')}: {e}")
-            continue
+    # Com orders particionada, cria antes as partições dos meses da página, com commit
+    # próprio: um rollback ao isolar registros com erro não desfaz as partições em cache
+    if order_partitions.ensure_for(db, [parse_datetime(o.get("createdAt")) for o in orders_data]):
+        db.commit()
 
-    db.commit()
+    counts, failed = _write_isolated(_write_orders, built, db, "orders")
+    return _record_page("orders", len(orders_data), counts, invalid, failed, db, dead_letters)
 
 
 # ---------------------------------------------------------------------------
@@ -598,14 +813,16 @@ def _build_sku_marketplace_fields(sku_data):
     }
 
 
-def save_sku_marketplaces(sku_marketplaces_data, db):
-    """Salva/atualiza SKU marketplaces no banco."""
-    for sku_data in sku_marketplaces_data:
-        try:
-            fields = _build_sku_marketplace_fields(sku_data)
+def _write_sku_marketplaces(built, db):
+    """Grava uma pagina de SKU marketplaces ja transformada, com commit. Retorna as contagens."""
+    counts = Counter()
+
+    with span("write sku_marketplaces", "write", records=len(built)):
+        for _, fields in built:
             anymarket_id = fields["anymarket_id"]
 
             if not anymarket_id:
+                counts["missing_id"] += 1
                 continue
 
             existing = db.query(models.SkuMarketplace).filter(
@@ -613,20 +830,28 @@ def save_sku_marketplaces(sku_marketplaces_data, db):
             ).first()
 
             if existing:
-                for k, v in fields.items():
-                    if k != "anymarket_id":
-                        setattr(existing, k, v)
-                existing.updated_at = datetime.now()
-                logger.info(f"SKU marketplace atualizado: {anymarket_id}")
+                if _update_existing(existing, fields):
+                    logger.debug("SKU marketplace atualizado: %s", anymarket_id, extra=SAMPLE)
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
             else:
                 db.add(models.SkuMarketplace(**fields))
-                logger.info(f"SKU marketplace criado: {anymarket_id}")
+                logger.debug("SKU marketplace criado: %s", anymarket_id, extra=SAMPLE)
+                counts["inserted"] += 1
 
-        except (ValueError, TypeError) as e:
-            logger.error(f"Erro ao processar SKU marketplace {sku_data.get('id')}: {e}")
-            continue
+        bump_data_version(db, "sku_marketplaces")
+
+    with span("commit sku_marketplaces", "write"):
+        db.commit()
+    return counts
 
-    db.commit()
+
+def save_sku_marketplaces(sku_marketplaces_data, db, dead_letters=True):
+    """Salva/atualiza SKU marketplaces no banco. Registros recusados vao para sync_dead_letters. Retorna [(registro, erro)]."""
+    built, invalid = _build_page(sku_marketplaces_data, _build_sku_marketplace_fields, "sku_marketplaces", "SKU marketplace")
+    counts, failed = _write_isolated(_write_sku_marketplaces, built, db, "sku_marketplaces")
+    return _record_page("sku_marketplaces", len(sku_marketplaces_data), counts, invalid, failed, db, dead_letters)
 
 
 # ---------------------------------------------------------------------------
@@ -738,35 +963,49 @@ def _build_transmission_fields(trans_data):
     }
 
 
-def save_transmissions(transmissions_data, db):
-    """Salva/atualiza transmissions no banco."""
-    for trans_data in transmissions_data:
-        try:
-            fields = _build_transmission_fields(trans_data)
+def _write_transmissions(built, db):
+    """Grava uma pagina de transmissions ja transformada, com commit. Retorna as contagens."""
+    page_fields = []
+    counts = Counter()
+
+    with span("write transmissions", "write", records=len(built)):
+        for _, fields in built:
             anymarket_id = fields["anymarket_id"]
 
             if not anymarket_id:
+                counts["missing_id"] += 1
                 continue
+            page_fields.append(fields)
 
             existing = db.query(models.Transmission).filter(
                 models.Transmission.anymarket_id == anymarket_id
             ).first()
 
             if existing:
-                for k, v in fields.items():
-                    if k != "anymarket_id":
-                        setattr(existing, k, v)
-                existing.updated_at = datetime.now()
-                logger.info(f"Transmission atualizado: {anymarket_id}")
+                if _update_existing(existing, fields):
+                    logger.debug("Transmission atualizado: %s", anymarket_id, extra=SAMPLE)
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
             else:
                 db.add(models.Transmission(**fields))
-                logger.info(f"Transmission criado: {anymarket_id}")
+                logger.debug("Transmission criado: %s", anymarket_id, extra=SAMPLE)
+                counts["inserted"] += 1
 
-        except (ValueError, TypeError) as e:
-            logger.error(f"Erro ao processar transmission {trans_data.get('id')}: {e}")
-            continue
+        dimension_cache.sync(db, page_fields)
+        bump_data_version(db, "transmissions")
 
-    db.commit()
+    with span("commit transmissions", "write"):
+        db.commit()
+    dimension_cache.confirm()
+    return counts
+
+
+def save_transmissions(transmissions_data, db, dead_letters=True):
+    """Salva/atualiza transmissions no banco. Registros recusados vao para sync_dead_letters. Retorna [(registro, erro)]."""
+    built, invalid = _build_page(transmissions_data, _build_transmission_fields, "transmissions", "transmission")
+    counts, failed = _write_isolated(_write_transmissions, built, db, "transmissions")
+    return _record_page("transmissions", len(transmissions_data), counts, invalid, failed, db, dead_letters)
 
 
 # ---------------------------------------------------------------------------
@@ -784,30 +1023,41 @@ def _paginate_and_save(client_method, save_fn, db, entity_name, filter_fn=None):
     total = 0
 
     while True:
-        logger.info(f"Buscando {entity_name}: offset {offset}")
-        response = client_method(limit=limit, offset=offset)
-
-        # A API retorna {content: [...]} ou lista direta
-        if isinstance(response, dict):
-            records = response.get("content", [])
-        else:
-            records = response
-
-        if not records:
-            break
+        logger.debug("Buscando %s: offset %d", entity_name, offset, extra=SAMPLE)
+        with span(f"page {entity_name}", "page", offset=offset) as page:
+            with _stage("fetch", entity_name):
+                response = client_method(limit=limit, offset=offset)
+
+            # A API retorna {content: [...]} ou lista direta
+            if isinstance(response, dict):
+                records = response.get("content", [])
+            else:
+                records = response
 
-        if filter_fn:
-            records = [r for r in records if filter_fn(r)]
             if not records:
                 break
-
-        save_fn(records, db)
-        total += len(records)
+            sync_records_fetched.inc(len(records), entity=entity_name)
+            page.set(fetched=len(records))
+
+            if filter_fn:
+                fetched = len(records)
+                records = [r for r in records if filter_fn(r)]
+                sync_records_skipped.inc(fetched - len(records), entity=entity_name, reason="filtered")
+                if not records:
+                    break
+
+            with _stage("write", entity_name):
+                save_fn(records, db)
+            saved = len(records)
+            # Solta a pagina antes de buscar a proxima: uma pagina da API em memoria por vez
+            del response, records
+        _page_done(db, entity_name)
+        total += saved
         offset += limit
 
-        logger.info(f"{entity_name}: {total} processados ate agora")
+        logger.info("%s: %d processados ate agora", entity_name, total)
 
-        if len(records) < limit:
+        if saved < limit:
             break
 
         time.sleep(0.5)
@@ -830,6 +1080,8 @@ def update_products(client, db):
 def update_orders(client, db):
     """Atualiza pedidos novos desde a ultima sincronizacao."""
     since = get_last_date(db, models.Order)
+    order_partitions.ensure_ahead(db)
+    db.commit()
 
     def is_new(order):
         dt = parse_datetime(order.get("createdAt"))
@@ -854,11 +1106,17 @@ def update_sku_marketplaces(client, db):
 
     total = 0
     for i, pid in enumerate(partner_ids):
-        logger.info(f"[{i + 1}/{len(partner_ids)}] SKU marketplace para: {pid}")
-        data = client.get_sku_marketplaces(partner_id=pid)
-        if data:
-            save_sku_marketplaces(data, db)
-            total += len(data)
+        logger.info("[%d/%d] SKU marketplace para: %s", i + 1, len(partner_ids), pid, extra=SAMPLE)
+        with span("page sku_marketplaces", "page", partner_id=pid) as page:
+            with _stage("fetch", "sku_marketplaces"):
+                data = client.get_sku_marketplaces(partner_id=pid)
+            if data:
+                sync_records_fetched.inc(len(data), entity="sku_marketplaces")
+                page.set(fetched=len(data))
+                with _stage("write", "sku_marketplaces"):
+                    save_sku_marketplaces(data, db)
+                _page_done(db, "sku_marketplaces")
+                total += len(data)
         time.sleep(0.5)
 
     logger.info(f"SKU marketplaces: concluido! Total: {total}")
@@ -905,6 +1163,7 @@ def verify_sync_status(db):
 
         tables = [
             ("products", models.Product, "created_at"),
+            # recent_24h = sincronizados nas ultimas 24h (created_at), nao pedidos feitos nas ultimas 24h
             ("orders", models.Order, "created_at"),
             ("sku_marketplaces", models.SkuMarketplace, "last_sync_date"),
             ("transmissions", models.Transmission, "last_sync_date"),
@@ -918,6 +1177,11 @@ def verify_sync_status(db):
             stats[name] = {"total": total, "recent_24h": recent}
             logger.info(f"  {name}: {total} total, {recent} recentes (24h)")
 
+        # Pedidos feitos nas ultimas 24h: filtro na chave de particao, le so as particoes do periodo
+        placed = db.query(models.Order).filter(models.Order.created_at_anymarket >= yesterday).count()
+        stats["orders"]["placed_24h"] = placed
+        logger.info(f"  orders: {placed} feitos nas ultimas 24h (created_at_anymarket)")
+
         return stats
     except Exception as e:
         logger.error(f"Erro ao verificar status: {e}")
@@ -934,13 +1198,224 @@ def parse_args():
     parser.add_argument("--sku-marketplaces", action="store_true", help="Incluir sincronizacao de SKU marketplaces")
     parser.add_argument("--transmissions", action="store_true", help="Incluir sincronizacao de transmissions")
     parser.add_argument("--all", action="store_true", help="Sincronizar tudo (products + orders + sku_marketplaces + transmissions)")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="Recalcular order_daily_rollup e sku_sales_daily a partir de orders e sair")
+    parser.add_argument("--partition-orders", action="store_true", help="Converter orders em tabela particionada por mes (PostgreSQL) e sair")
+    parser.add_argument("--detach-orders-before", metavar="AAAA-MM", help="Desanexar particoes de orders anteriores a este mes e sair")
+    parser.add_argument("--snapshot", action="store_true", help="Gravar snapshot Parquet das tabelas ao final de uma sincronizacao bem-sucedida")
+    parser.add_argument("--analytics", action="store_true", help="Atualizar o espelho analitico DuckDB ao final de uma sincronizacao bem-sucedida")
+    parser.add_argument("--archive-orders", action="store_true", help="Arquivar em Parquet os pedidos fora da janela quente e sair")
+    parser.add_argument("--hot-months", type=int, default=ORDER_HOT_MONTHS, help="Meses de pedidos mantidos no banco (padrao: ORDER_HOT_MONTHS)")
+    parser.add_argument("--rebuild-children", action="store_true", help="Recriar as tabelas filhas a partir das colunas JSON e sair")
+    parser.add_argument("--metrics-file", default=METRICS_TEXTFILE, help="Gravar metricas da sincronizacao neste arquivo .prom (textfile collector do node_exporter)")
+    parser.add_argument("--trace", default=TRACE_FILE, metavar="ARQUIVO", help="Gravar spans (fetch, transform, write) neste arquivo JSON do formato Trace Event (Perfetto / chrome://tracing)")
+    parser.add_argument("--profile", action="store_true", help="Gravar profiles de CPU por etapa (fetch, transform, write) e relatorio de memoria por pagina junto ao resumo")
+    parser.add_argument("--bounded-memory", action="store_true", default=SYNC_BOUNDED_MEMORY, help="Memoria limitada: libera a sessao a cada pagina e a fecha a cada SYNC_SESSION_PAGES paginas")
+    parser.add_argument("--retry-dead-letters", action="store_true", help="Reprocessar os registros recusados em sync_dead_letters e sair")
+    parser.add_argument("--rebuild-dimensions", action="store_true", help="Recalcular brands, categories, nbms e origins a partir de products e transmissions e sair")
     return parser.parse_args()
 
 
+def _previous_success(path):
+    """Fim da ultima sincronizacao bem-sucedida (epoch): sync_runs ou, sem banco, o arquivo anterior."""
+    db = SessionLocal()
+    try:
+        finished = db.query(func.max(models.SyncRun.finished_at)).filter(models.SyncRun.status == "success").scalar()
+        if finished is not None:
+            return finished.timestamp()
+    except Exception as e:
+        logger.warning(f"Erro ao buscar o ultimo sucesso em sync_runs: {e}")
+    finally:
+        db.close()
+    return read_textfile_value(path, sync_last_success)
+
+
+def write_metrics(path, start_time):
+    """Grava as metricas da sincronizacao para o textfile collector."""
+    try:
+        sync_stage_seconds.set(round((datetime.now() - start_time).total_seconds(), 3), stage="total")
+        # Execucao com erro: repete o ultimo sucesso, senao a serie some do arquivo e o alerta de atraso nao dispara
+        if not sync_last_success.samples():
+            previous = _previous_success(path)
+            if previous is not None:
+                sync_last_success.set(previous)
+        registry.write_textfile(path, names=SYNC_FAMILIES)
+        logger.info(f"Metricas gravadas em {path}")
+    except OSError as e:
+        logger.error(f"Erro ao gravar metricas em {path}: {e}")
+
+
+def record_sync_run(start_time, error=None):
+    """Grava a execucao em sync_runs e sync_run_entities (GET /sync/runs)."""
+    db = SessionLocal()
+    try:
+        stages = {stage: seconds for _, (stage,), _, seconds in sync_stage_seconds.samples()}
+        run_id = sync_run.save(db, start_time, datetime.now(), stages, error)
+        db.commit()
+        logger.info(f"Execucao registrada em sync_runs: {run_id}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao registrar execucao em sync_runs: {e}")
+    finally:
+        db.close()
+
+
+def write_profile(start_time):
+    """Grava os profiles da sincronizacao ao lado do daily_sync_summary_*.json."""
+    try:
+        files = sync_profiler.write(f"daily_sync_profile_{start_time:%Y%m%d_%H%M%S}")
+        print("\nProfiles:")
+        for filename in files:
+            print(f"  {filename}")
+    except OSError as e:
+        logger.error(f"Erro ao gravar profiles: {e}")
+
+
+SAVE_FUNCTIONS = {
+    "products": save_products,
+    "orders": save_orders,
+    "sku_marketplaces": save_sku_marketplaces,
+    "transmissions": save_transmissions,
+}
+
+
+def retry_dead_letters(batch_size=DEAD_LETTER_RETRY_BATCH):
+    """Reprocessa os registros pendentes em sync_dead_letters; os que forem gravados ficam resolvidos."""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print("Reprocessando dead letters:")
+        for entity, save_fn in SAVE_FUNCTIONS.items():
+            resolved = failed = 0
+            last_id = 0
+            while True:
+                letters = pending_dead_letters(db, entity, after_id=last_id, limit=batch_size)
+                if not letters:
+                    break
+                last_id = letters[-1].id
+                payloads = [letter.payload for letter in letters]
+                # save_fn devolve os mesmos objetos de payload que recusou
+                errors = {id(record): error for record, error in save_fn(payloads, db, dead_letters=False)}
+                for letter, payload in zip(letters, payloads):
+                    error = errors.get(id(payload))
+                    if error is None:
+                        mark_resolved(letter)
+                        resolved += 1
+                    else:
+                        mark_failed(letter, error)
+                        failed += 1
+                db.commit()
+            if resolved or failed:
+                print(f"  {entity}: {resolved} resolvidos, {failed} ainda com erro")
+                logger.info(f"Dead letters de {entity}: {resolved} resolvidos, {failed} ainda com erro")
+        pending = pending_counts(db)
+        print(f"Pendentes: {sum(pending.values())}")
+    finally:
+        db.close()
+
+
+def rebuild_rollups():
+    """Recalcula as tabelas agregadas a partir das tabelas de origem."""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rebuild_order_daily_rollup(db)
+        rebuild_sku_sales_daily(db)
+        bump_data_version(db, "orders")
+        db.commit()
+    finally:
+        db.close()
+
+
+def rebuild_children():
+    """Recria product_skus, product_images, product_characteristics, order_items e order_payments."""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rebuild_product_children(db)
+        rebuild_order_children(db)
+        bump_data_version(db, "products")
+        bump_data_version(db, "orders")
+        db.commit()
+    finally:
+        db.close()
+
+
+def rebuild_dimension_tables():
+    """Recalcula as tabelas de dimensao (brands, categories, nbms, origins)."""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        counts = rebuild_dimensions(db)
+        bump_data_version(db, "products")
+        bump_data_version(db, "transmissions")
+        db.commit()
+        for name, count in counts.items():
+            print(f"  {name}: {count}")
+    finally:
+        db.close()
+
+
+def manage_order_partitions(args):
+    """Conversao para tabela particionada e desanexacao de particoes antigas de orders."""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.partition_orders:
+            created = partition_orders_table(db)
+            print(f"Particoes criadas: {len(created)}")
+        if args.detach_orders_before:
+            before = datetime.strptime(args.detach_orders_before, "%Y-%m")
+            detached = detach_order_partitions(db, before)
+            print(f"Particoes desanexadas: {', '.join(detached) or 'nenhuma'}")
+        bump_data_version(db, "orders")
+        db.commit()
+    finally:
+        db.close()
+
+
+def archive_orders(hot_months):
+    """Move para o arquivo Parquet os pedidos anteriores a janela quente."""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        archived = archive_cold_orders(db, hot_months=hot_months)
+        for month, count in archived.items():
+            print(f"  {month}: {count} pedidos arquivados")
+        if archived:
+            bump_data_version(db, "orders")
+            db.commit()
+    finally:
+        db.close()
+
+
 def main():
     args = parse_args()
     start_time = datetime.now()
 
+    if args.rebuild_rollups:
+        rebuild_rollups()
+        return
+
+    if args.rebuild_children:
+        rebuild_children()
+        return
+
+    if args.rebuild_dimensions:
+        rebuild_dimension_tables()
+        return
+
+    if args.retry_dead_letters:
+        retry_dead_letters()
+        return
+
+    if args.archive_orders:
+        archive_orders(args.hot_months)
+        return
+
+    if args.partition_orders or args.detach_orders_before:
+        manage_order_partitions(args)
+        return
+
     sync_sku = args.sku_marketplaces or args.all
     sync_trans = args.transmissions or args.all
 
@@ -955,6 +1430,10 @@ def main():
         steps.append(f"{len(steps) + 1}. Sincronizar SKU marketplaces")
     if sync_trans:
         steps.append(f"{len(steps) + 1}. Sincronizar transmissions")
+    if args.snapshot:
+        steps.append(f"{len(steps) + 1}. Gravar snapshot Parquet")
+    if args.analytics:
+        steps.append(f"{len(steps) + 1}. Atualizar espelho analitico DuckDB")
     steps.append(f"{len(steps) + 1}. Gerar relatorio")
 
     for s in steps:
@@ -968,8 +1447,18 @@ def main():
             print("Operacao cancelada")
             return
 
+    tracer.configure(args.trace, "daily_update")
+    if tracer.enabled:
+        instrument_engines()
+    if args.profile:
+        sync_profiler.start()
+    sync_run.start()
+    sync_memory.configure(args.bounded_memory)
+    run_error = None
+
     try:
-        client = AnymarketClient()
+        models.Base.metadata.create_all(bind=engine)
+        client = AnymarketClient(recorder=sync_run)
         db = SessionLocal()
 
         logger.info("Status inicial do banco:")
@@ -978,24 +1467,53 @@ def main():
         # Products
         print("\n" + "=" * 40)
         logger.info("ATUALIZANDO PRODUTOS...")
-        results = {"products": update_products(client, db)}
+        with stage_timer("products"):
+            results = {"products": update_products(client, db)}
 
         # Orders
         print("\n" + "=" * 40)
         logger.info("ATUALIZANDO PEDIDOS...")
-        results["orders"] = update_orders(client, db)
+        with stage_timer("orders"):
+            results["orders"] = update_orders(client, db)
 
         # SKU Marketplaces (opcional)
         if sync_sku:
             print("\n" + "=" * 40)
             logger.info("ATUALIZANDO SKU MARKETPLACES...")
-            results["sku_marketplaces"] = update_sku_marketplaces(client, db)
+            with stage_timer("sku_marketplaces"):
+                results["sku_marketplaces"] = update_sku_marketplaces(client, db)
 
         # Transmissions (opcional)
         if sync_trans:
             print("\n" + "=" * 40)
             logger.info("ATUALIZANDO TRANSMISSIONS...")
-            results["transmissions"] = update_transmissions(client, db)
+            with stage_timer("transmissions"):
+                results["transmissions"] = update_transmissions(client, db)
+
+        # Snapshot colunar (opcional)
+        snapshot = None
+        if args.snapshot:
+            print("\n" + "=" * 40)
+            logger.info(f"GRAVANDO SNAPSHOT PARQUET EM {SNAPSHOT_DIR}...")
+            try:
+                with stage_timer("snapshot"):
+                    snapshot = write_snapshots(db)
+            except Exception as e:
+                logger.error(f"Erro ao gravar snapshot: {e}")
+
+        # Espelho analitico (opcional)
+        analytics = None
+        if args.analytics:
+            print("\n" + "=" * 40)
+            logger.info(f"ATUALIZANDO ESPELHO ANALITICO EM {ANALYTICS_DB_PATH}...")
+            try:
+                with stage_timer("analytics"):
+                    analytics = refresh_analytics_mirror(db)
+                bump_data_version(db, "analytics")
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Erro ao atualizar espelho analitico: {e}")
 
         # Status final
         print("\n" + "=" * 40)
@@ -1004,6 +1522,8 @@ def main():
 
         end_time = datetime.now()
         summary_file = create_summary(results, start_time, end_time)
+        sync_last_run_ok.set(1)
+        sync_last_success.set(end_time.timestamp())
 
         # Resultado
         print("\nATUALIZACAO DIARIA CONCLUIDA!")
@@ -1017,13 +1537,40 @@ def main():
             print(f"  {entity}: {count} atualizados")
         print(f"  TOTAL: {sum(results.values())}")
 
+        if sync_memory.peaks:
+            print("\nPico de memoria (RSS) por entidade" + (" - modo limitado" if sync_memory.bounded else "") + ":")
+            for entity, rss in sync_memory.peaks.items():
+                print(f"  {entity}: {rss / 1024 / 1024:.0f} MiB")
+
+        dead_letters = pending_counts(db)
+        if dead_letters:
+            print("\nRegistros recusados pendentes (sync_dead_letters):")
+            for entity, count in sorted(dead_letters.items()):
+                print(f"  {entity}: {count}")
+            print("  Reprocessar: python daily_update.py --retry-dead-letters")
+
         if summary_file:
             print(f"\nRelatorio: {summary_file}")
 
+        if snapshot is not None:
+            print(f"\nSnapshot Parquet: {SNAPSHOT_DIR}")
+            for entity, written in snapshot.items():
+                if isinstance(written, dict):
+                    print(f"  {entity}: {len(written)} meses regravados")
+                else:
+                    print(f"  {entity}: {'sem alteracoes' if written is None else f'{written} linhas'}")
+
+        if analytics is not None:
+            print(f"\nEspelho analitico: {ANALYTICS_DB_PATH}")
+            for entity, copied in analytics.items():
+                print(f"  {entity}: {copied} linhas copiadas")
+
         if final_stats:
             print("\nEstatisticas do banco:")
             for name, info in final_stats.items():
                 print(f"  {name}: {info['total']} total, {info['recent_24h']} recentes (24h)")
+                if "placed_24h" in info:
+                    print(f"  {name}: {info['placed_24h']} feitos nas ultimas 24h")
 
         print()
         print("Para automatizar:")
@@ -1036,6 +1583,7 @@ def main():
         db.close()
 
     except Exception as e:
+        run_error = str(e)
         logger.error(f"Erro durante a atualizacao: {e}")
         print(f"Atualizacao falhou: {e}")
 
@@ -1053,6 +1601,18 @@ def main():
         except Exception:
             pass
 
+        sync_last_run_ok.set(0)
+
+    finally:
+        record_sync_run(start_time, run_error)
+        if args.metrics_file:
+            write_metrics(args.metrics_file, start_time)
+        if args.profile:
+            write_profile(start_time)
+        if tracer.enabled:
+            tracer.flush()
+            logger.info(f"Trace gravado em {args.trace}")
+
 
 if __name__ == "__main__":
     main()
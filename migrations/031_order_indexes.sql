@@ -0,0 +1,10 @@
+-- Índices de orders para a API de consulta de pedidos (user-031).
+-- create_all() cria order_daily_rollup, mas não adiciona índices a tabelas
+-- que já existem. Depois de aplicar, popular o rollup com:
+--   python daily_update.py --rebuild-rollups
+
+CREATE INDEX IF NOT EXISTS ix_orders_marketplace ON orders (marketplace);
+CREATE INDEX IF NOT EXISTS ix_orders_status ON orders (status);
+CREATE INDEX IF NOT EXISTS ix_orders_created_at_anymarket ON orders (created_at_anymarket);
+CREATE INDEX IF NOT EXISTS ix_orders_marketplace_status_created
+    ON orders (marketplace, status, created_at_anymarket);
@@ -0,0 +1,49 @@
+-- Converte as colunas JSON de products, orders e transmissions para JSONB e
+-- cria índices GIN (jsonb_path_ops) para buscas por containment (@>) (user-034).
+-- Idempotente: só converte colunas que ainda são json.
+-- A conversão reescreve cada tabela; rode fora do horário do daily_update.
+
+DO $$
+DECLARE
+    target RECORD;
+BEGIN
+    FOR target IN
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND data_type = 'json'
+          AND (table_name, column_name) IN (
+              ('products', 'skus'),
+              ('products', 'images'),
+              ('products', 'characteristics'),
+              ('orders', 'items_data'),
+              ('orders', 'payments_data'),
+              ('transmissions', 'category_data'),
+              ('transmissions', 'brand_data'),
+              ('transmissions', 'product_data'),
+              ('transmissions', 'nbm_data'),
+              ('transmissions', 'origin_data'),
+              ('transmissions', 'sku_data'),
+              ('transmissions', 'characteristics_data'),
+              ('transmissions', 'images_data')
+          )
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN %I TYPE jsonb USING %I::jsonb',
+            target.table_name, target.column_name, target.column_name
+        );
+        RAISE NOTICE 'Convertido para jsonb: %.%', target.table_name, target.column_name;
+    END LOOP;
+END $$;
+
+-- CONCURRENTLY não bloqueia escritas; psql executa cada comando fora de transação
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_skus_gin
+    ON products USING gin (skus jsonb_path_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_characteristics_gin
+    ON products USING gin (characteristics jsonb_path_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_items_data_gin
+    ON orders USING gin (items_data jsonb_path_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_payments_data_gin
+    ON orders USING gin (payments_data jsonb_path_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transmissions_sku_data_gin
+    ON transmissions USING gin (sku_data jsonb_path_ops);
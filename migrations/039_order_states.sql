@@ -0,0 +1,69 @@
+-- Move status, market_place_*_status e tracking_* de orders para a tabela
+-- estreita order_states (user-039). Idempotente: copia e remove as colunas
+-- só enquanto orders ainda tem a coluna status.
+-- Rode com o daily_update parado; a remoção das colunas só altera o catálogo.
+
+CREATE TABLE IF NOT EXISTS order_states (
+    order_anymarket_id VARCHAR PRIMARY KEY,
+    status VARCHAR,
+    market_place_status VARCHAR,
+    market_place_status_complement VARCHAR,
+    market_place_shipment_status VARCHAR,
+    tracking_carrier VARCHAR,
+    tracking_date TIMESTAMP WITHOUT TIME ZONE,
+    tracking_delivered_date TIMESTAMP WITHOUT TIME ZONE,
+    tracking_estimate_date TIMESTAMP WITHOUT TIME ZONE,
+    tracking_number VARCHAR,
+    tracking_shipped_date TIMESTAMP WITHOUT TIME ZONE,
+    tracking_url VARCHAR,
+    tracking_carrier_document VARCHAR,
+    tracking_buffering_date TIMESTAMP WITHOUT TIME ZONE,
+    tracking_delivery_status VARCHAR,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+) WITH (fillfactor = 70);
+
+ALTER TABLE order_states SET (fillfactor = 70);
+CREATE INDEX IF NOT EXISTS ix_order_states_status ON order_states (status);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'orders' AND column_name = 'status'
+    ) THEN
+        INSERT INTO order_states (
+            order_anymarket_id, status, market_place_status, market_place_status_complement,
+            market_place_shipment_status, tracking_carrier, tracking_date, tracking_delivered_date,
+            tracking_estimate_date, tracking_number, tracking_shipped_date, tracking_url,
+            tracking_carrier_document, tracking_buffering_date, tracking_delivery_status, updated_at
+        )
+        SELECT
+            anymarket_id, status, market_place_status, market_place_status_complement,
+            market_place_shipment_status, tracking_carrier, tracking_date, tracking_delivered_date,
+            tracking_estimate_date, tracking_number, tracking_shipped_date, tracking_url,
+            tracking_carrier_document, tracking_buffering_date, tracking_delivery_status,
+            coalesce(updated_at, created_at)
+        FROM orders
+        WHERE anymarket_id IS NOT NULL
+        ON CONFLICT (order_anymarket_id) DO NOTHING;
+
+        ALTER TABLE orders
+            DROP COLUMN status,
+            DROP COLUMN market_place_status,
+            DROP COLUMN market_place_status_complement,
+            DROP COLUMN market_place_shipment_status,
+            DROP COLUMN tracking_carrier,
+            DROP COLUMN tracking_date,
+            DROP COLUMN tracking_delivered_date,
+            DROP COLUMN tracking_estimate_date,
+            DROP COLUMN tracking_number,
+            DROP COLUMN tracking_shipped_date,
+            DROP COLUMN tracking_url,
+            DROP COLUMN tracking_carrier_document,
+            DROP COLUMN tracking_buffering_date,
+            DROP COLUMN tracking_delivery_status;
+    END IF;
+END $$;
+
+-- ix_orders_status e ix_orders_marketplace_status_created caem junto com a coluna
+CREATE INDEX IF NOT EXISTS ix_orders_marketplace_created ON orders (marketplace, created_at_anymarket);
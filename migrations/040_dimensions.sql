@@ -0,0 +1,82 @@
+-- Tabelas de dimensão brands, categories, nbms e origins (user-040),
+-- populadas a partir dos valores já gravados em products e transmissions.
+-- Idempotente: não sobrescreve linhas existentes.
+
+CREATE TABLE IF NOT EXISTS brands (
+    anymarket_id VARCHAR PRIMARY KEY,
+    name VARCHAR,
+    reduced_name VARCHAR,
+    partner_id VARCHAR,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_brands_name ON brands (name);
+
+CREATE TABLE IF NOT EXISTS categories (
+    anymarket_id VARCHAR PRIMARY KEY,
+    name VARCHAR,
+    path VARCHAR,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_categories_name ON categories (name);
+
+CREATE TABLE IF NOT EXISTS nbms (
+    anymarket_id VARCHAR PRIMARY KEY,
+    description TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS origins (
+    anymarket_id VARCHAR PRIMARY KEY,
+    description VARCHAR,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_products_brand_id ON products (brand_id);
+CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id);
+
+INSERT INTO brands (anymarket_id, name, reduced_name, partner_id)
+SELECT DISTINCT ON (brand_id) brand_id, brand_name, brand_reduced_name, brand_partner_id
+FROM products
+WHERE brand_id IS NOT NULL AND brand_id <> ''
+ORDER BY brand_id, updated_at DESC NULLS LAST
+ON CONFLICT (anymarket_id) DO NOTHING;
+
+INSERT INTO brands (anymarket_id, name)
+SELECT DISTINCT ON (brand_id) brand_id, brand_name
+FROM transmissions
+WHERE brand_id IS NOT NULL AND brand_id <> ''
+ORDER BY brand_id, updated_at DESC NULLS LAST
+ON CONFLICT (anymarket_id) DO NOTHING;
+
+INSERT INTO categories (anymarket_id, name, path)
+SELECT DISTINCT ON (category_id) category_id, category_name, category_path
+FROM (
+    SELECT category_id, category_name, category_path, updated_at FROM products
+    UNION ALL
+    SELECT category_id, category_name, category_path, updated_at FROM transmissions
+) s
+WHERE category_id IS NOT NULL AND category_id <> ''
+ORDER BY category_id, updated_at DESC NULLS LAST
+ON CONFLICT (anymarket_id) DO NOTHING;
+
+INSERT INTO nbms (anymarket_id, description)
+SELECT DISTINCT ON (nbm_id) nbm_id, nbm_description
+FROM (
+    SELECT nbm_id, nbm_description, updated_at FROM products
+    UNION ALL
+    SELECT nbm_id, nbm_description, updated_at FROM transmissions
+) s
+WHERE nbm_id IS NOT NULL AND nbm_id <> ''
+ORDER BY nbm_id, updated_at DESC NULLS LAST
+ON CONFLICT (anymarket_id) DO NOTHING;
+
+INSERT INTO origins (anymarket_id, description)
+SELECT DISTINCT ON (origin_id) origin_id, origin_description
+FROM (
+    SELECT origin_id, origin_description, updated_at FROM products
+    UNION ALL
+    SELECT origin_id, origin_description, updated_at FROM transmissions
+) s
+WHERE origin_id IS NOT NULL AND origin_id <> ''
+ORDER BY origin_id, updated_at DESC NULLS LAST
+ON CONFLICT (anymarket_id) DO NOTHING;
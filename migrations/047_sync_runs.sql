@@ -0,0 +1,37 @@
+-- Histórico das execuções do daily_update.py (user-047): uma linha por
+-- execução em sync_runs e uma por entidade em sync_run_entities.
+-- Idempotente; o create_all do daily_update.py também cria as tabelas.
+
+CREATE TABLE IF NOT EXISTS sync_runs (
+    id SERIAL PRIMARY KEY,
+    started_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    finished_at TIMESTAMP WITHOUT TIME ZONE,
+    status VARCHAR(20) NOT NULL,
+    error TEXT,
+    duration_seconds DOUBLE PRECISION,
+    total_records INTEGER NOT NULL DEFAULT 0,
+    stage_seconds JSON
+);
+CREATE INDEX IF NOT EXISTS ix_sync_runs_started_at ON sync_runs (started_at);
+
+CREATE TABLE IF NOT EXISTS sync_run_entities (
+    id SERIAL PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    entity VARCHAR(50) NOT NULL,
+    pages INTEGER NOT NULL DEFAULT 0,
+    api_calls INTEGER NOT NULL DEFAULT 0,
+    api_bytes BIGINT NOT NULL DEFAULT 0,
+    rate_limited INTEGER NOT NULL DEFAULT 0,
+    fetched INTEGER NOT NULL DEFAULT 0,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    updated INTEGER NOT NULL DEFAULT 0,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    fetch_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    transform_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    write_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    duration_seconds DOUBLE PRECISION,
+    records_per_second DOUBLE PRECISION,
+    CONSTRAINT uq_sync_run_entities_key UNIQUE (run_id, entity)
+);
+CREATE INDEX IF NOT EXISTS ix_sync_run_entities_run_id ON sync_run_entities (run_id);
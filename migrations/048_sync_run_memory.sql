@@ -0,0 +1,3 @@
+-- Maior RSS medido nas páginas de cada entidade (user-048).
+
+ALTER TABLE sync_run_entities ADD COLUMN IF NOT EXISTS peak_rss_bytes BIGINT;
@@ -0,0 +1,18 @@
+-- Registros da API recusados na sincronização (user-050): payload original
+-- e erro, reprocessados com daily_update.py --retry-dead-letters.
+-- Idempotente; o create_all do daily_update.py também cria a tabela.
+
+CREATE TABLE IF NOT EXISTS sync_dead_letters (
+    id SERIAL PRIMARY KEY,
+    entity VARCHAR(50) NOT NULL,
+    anymarket_id VARCHAR,
+    payload JSON NOT NULL,
+    error TEXT,
+    error_type VARCHAR(100),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_failed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    last_failed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    resolved_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_sync_dead_letters_anymarket_id ON sync_dead_letters (anymarket_id);
+CREATE INDEX IF NOT EXISTS ix_sync_dead_letters_pending ON sync_dead_letters (entity, resolved_at);